@@ -0,0 +1,238 @@
+from datetime import datetime, timedelta
+import os
+from os.path import join
+import random
+import shutil
+import tempfile
+from benchmarks.harness import Benchmark
+from dht22_controller.capped_queue import CappedQueue
+from dht22_controller.config import Config
+from dht22_controller.datastore import index_filename, load
+from dht22_controller.humidity import Humidity
+from dht22_controller.model import ChamberModel
+from dht22_controller.recorder import BufferedCsvWriter
+from dht22_controller.rollup import Rollups
+from dht22_controller.simulator import Simulator, VirtualClock
+from dht22_controller.temperature import Temperature
+from dht22_controller.timeseries import SegmentWriter
+from dht22_controller.utils import now
+
+
+__all__ = [
+    "BENCHMARKS"
+]
+
+
+# rows in the learn file that datastore.load is benchmarked on
+LEARN_ROWS = 200000
+
+
+def _config(directory=None):
+    c = Config()
+    c.config['target_temp_f'] = 60
+    c.config['temp_pad'] = 1
+    c.config['target_humidity'] = 65
+    c.config['humidity_pad'] = 2
+    if directory is not None:
+        c.config['data_dir'] = directory
+    return c
+
+
+def _readings(center, spread, count=1024, seed=1):
+    # a noisy sawtooth through the band, so the controllers switch
+    rng = random.Random(seed)
+    return [center + spread * (abs((i % 200) - 100) / 50. - 1.) +
+        rng.gauss(0., .1) for i in range(count)]
+
+
+# ----------------------------------------------------------------------------
+# CappedQueue
+# ----------------------------------------------------------------------------
+
+
+def _queue_setup():
+    queue = CappedQueue(cap=10)
+    values = _readings(60., 2.)
+    for value in values[:10]:
+        queue.put(value)
+    return queue, values
+
+
+def _queue_put(state, n):
+    queue, values = state
+    put = queue.put
+    for i in range(n):
+        put(values[i & 1023])
+
+
+def _queue_tolist(state, n):
+    tolist = state[0].tolist
+    for i in range(n):
+        tolist()
+
+
+# ----------------------------------------------------------------------------
+# Temperature / Humidity
+# ----------------------------------------------------------------------------
+
+
+def _controller_setup(make, center, spread):
+    def setup():
+        directory = tempfile.mkdtemp()
+        clock = VirtualClock(datetime(2000, 1, 1))
+        clock.install()
+        controller = make(_config(directory))
+        values = _readings(center, spread)
+        for value in values[:10]:
+            controller.add(value)
+        return directory, clock, controller, values
+    return setup
+
+
+def _controller_teardown(state):
+    directory, clock = state[:2]
+    clock.uninstall()
+    shutil.rmtree(directory)
+
+
+def _update(state, n):
+    # a reading every 2 seconds, then the decision on it
+    directory, clock, controller, values = state
+    add, update, sleep = controller.add, controller.update, clock.sleep
+    for i in range(n):
+        sleep(2.)
+        add(values[i & 1023])
+        update()
+
+
+# ----------------------------------------------------------------------------
+# record_data (dht22_controller.py): the rollups plus the csv or binary
+# recorder
+# ----------------------------------------------------------------------------
+
+
+def _record_setup(binary):
+    def setup():
+        directory = tempfile.mkdtemp()
+        rollups = Rollups(join(directory, 'rollups'))
+        if binary:
+            recorder = SegmentWriter(join(directory, 'segments'))
+        else:
+            recorder = BufferedCsvWriter(join(directory, 'data.csv'))
+        return directory, rollups, recorder, binary, _readings(60., 2.)
+    return setup
+
+
+def _record_teardown(state):
+    directory, rollups, recorder = state[:3]
+    recorder.close()
+    rollups.close()
+    shutil.rmtree(directory)
+
+
+def _record(state, n):
+    directory, rollups, recorder, binary, values = state
+    for i in range(n):
+        t = values[i & 1023]
+        timestamp = now()
+        rollups.add(timestamp, t, 65.)
+        if binary:
+            recorder.append(timestamp, t, t, 65., 65.)
+            continue
+        recorder.writerow([
+            timestamp.strftime('%Y-%m-%dT%H:%M:%S'),
+            '{:.2f}'.format(t),
+            '{:.2f}'.format(t),
+            '{:.2f}'.format(65.),
+            '{:.2f}'.format(65.)])
+
+
+# ----------------------------------------------------------------------------
+# datastore.load on a large learn file
+# ----------------------------------------------------------------------------
+
+
+def _learn_setup():
+    directory = tempfile.mkdtemp()
+    filename = join(directory, 'lcool.csv')
+    rng = random.Random(1)
+    start = datetime(2000, 1, 1)
+    with open(filename, 'w') as f:
+        for i in range(LEARN_ROWS):
+            f.write('{},{:.1f},{:.1f},{:.2f},{:.1f}\n'.format(
+                (start + timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S'),
+                rng.uniform(60., 63.), rng.choice([58., 59., 60.]),
+                rng.uniform(57., 61.), rng.uniform(10., 300.)))
+    return directory, filename
+
+
+def _learn_teardown(state):
+    shutil.rmtree(state[0])
+
+
+def _load_indexed(state, n):
+    filename = state[1]
+    for i in range(n):
+        load(filename, 45., 59.)
+
+
+def _load_rebuild(state, n):
+    # a missing index means a full scan of the learn file
+    filename = state[1]
+    for i in range(n):
+        if os.path.exists(index_filename(filename)):
+            os.remove(index_filename(filename))
+        load(filename, 45., 59.)
+
+
+# ----------------------------------------------------------------------------
+# a full simulated control tick
+# ----------------------------------------------------------------------------
+
+
+def _simulator_setup():
+    simulator = Simulator(_config(),
+        model=ChamberModel(temp_f=62., ambient_f=68., seed=1))
+    simulator.clock.install()
+    simulator.build()
+    # get past the initial pull down
+    for i in range(2000):
+        simulator.step()
+    return simulator
+
+
+def _simulator_teardown(simulator):
+    simulator.clock.uninstall()
+
+
+def _simulator_step(simulator, n):
+    step = simulator.step
+    for i in range(n):
+        step()
+
+
+BENCHMARKS = [
+    Benchmark('capped_queue_put', _queue_put, _queue_setup),
+    Benchmark('capped_queue_tolist', _queue_tolist, _queue_setup),
+    Benchmark('temperature_update', _update,
+        _controller_setup(
+            lambda c: Temperature(c, debug=True, has_cooler=True,
+                has_heater=True), 60., 2.),
+        _controller_teardown),
+    Benchmark('humidity_update', _update,
+        _controller_setup(
+            lambda c: Humidity(c, debug=True, has_humidifier=True,
+                has_dehumidifier=True), 65., 4.),
+        _controller_teardown),
+    # fsyncs make these noisy
+    Benchmark('record_data_csv', _record, _record_setup(False),
+        _record_teardown, threshold=.5),
+    Benchmark('record_data_binary', _record, _record_setup(True),
+        _record_teardown, threshold=.5),
+    Benchmark('datastore_load_indexed', _load_indexed, _learn_setup,
+        _learn_teardown),
+    Benchmark('datastore_load_rebuild', _load_rebuild, _learn_setup,
+        _learn_teardown, number=3),
+    Benchmark('simulated_tick', _simulator_step, _simulator_setup,
+        _simulator_teardown),
+]
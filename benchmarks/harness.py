@@ -0,0 +1,200 @@
+from datetime import datetime
+import gc
+import json
+import platform
+import sys
+from timeit import default_timer
+
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2, where only the garbage collector's counts are available
+    tracemalloc = None
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "Benchmark",
+    "measure",
+    "run_benchmarks",
+    "compare",
+    "load_results",
+    "save_results"
+]
+
+
+# how long one timed run should take when the number of operations is
+# calibrated automatically
+MIN_RUN_S = .2
+
+
+class Benchmark(object):
+    """
+    A named operation to time.
+
+    ``setup()`` returns the state that's passed to ``run(state, n)``, which
+    performs the operation ``n`` times, and ``teardown(state)`` cleans up
+    after it. ``number`` is how many operations to time per run (calibrated
+    so a run takes about :data:`MIN_RUN_S` if None) and ``threshold`` the
+    fraction it can slow down by before it counts as a regression (the
+    default threshold if None).
+    """
+
+    def __init__(self, name, run, setup=None, teardown=None, number=None,
+        threshold=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+        self.number = number
+        self.threshold = threshold
+
+
+def _calibrate(benchmark, state):
+    n = 1
+    while True:
+        started = default_timer()
+        benchmark.run(state, n)
+        if default_timer() - started >= MIN_RUN_S or n >= 10 ** 7:
+            return n
+        n *= 10
+
+
+def _allocations(benchmark, state, n):
+    """
+    Allocations per operation. With tracemalloc these are the bytes still
+    allocated after the run and the peak during it, otherwise the net number
+    of objects the garbage collector started tracking.
+    """
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            benchmark.run(state, n)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'alloc_net_bytes_per_op': current / float(n),
+            'alloc_peak_bytes': peak,
+        }
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        before = gc.get_count()[0]
+        benchmark.run(state, n)
+        after = gc.get_count()[0]
+    finally:
+        if enabled:
+            gc.enable()
+    return {'gc_net_objects_per_op': (after - before) / float(n)}
+
+
+def measure(benchmark, repeat=5, number=None):
+    """
+    Time ``benchmark`` ``repeat`` times and count its allocations once.
+    Returns a dict with the best (``per_op_s``) and median time per
+    operation along with the allocation counts.
+    """
+    state = benchmark.setup() if benchmark.setup is not None else None
+    try:
+        n = number or benchmark.number or _calibrate(benchmark, state)
+        times = []
+        for i in range(repeat):
+            started = default_timer()
+            benchmark.run(state, n)
+            times.append((default_timer() - started) / n)
+        result = _allocations(benchmark, state, n)
+    except Exception as e:
+        log.exception("exception occurred. benchmark=%s", benchmark.name)
+        raise
+    finally:
+        if benchmark.teardown is not None:
+            benchmark.teardown(state)
+
+    times.sort()
+    result.update({
+        'ops': n,
+        'repeat': repeat,
+        'per_op_s': times[0],
+        'median_s': times[len(times) // 2],
+    })
+    return result
+
+
+def run_benchmarks(benchmarks, repeat=5, number=None, include=None,
+    exclude=None, threshold=.25):
+    """
+    Measure each benchmark whose name contains one of ``include`` (every one
+    by default) and none of ``exclude``. Returns the results document that's
+    saved as JSON.
+    """
+    results = {}
+    for benchmark in benchmarks:
+        if include and not any(i in benchmark.name for i in include):
+            continue
+        if exclude and any(e in benchmark.name for e in exclude):
+            continue
+        log.info('running %s', benchmark.name)
+        result = measure(benchmark, repeat, number)
+        result['threshold'] = threshold if benchmark.threshold is None \
+            else benchmark.threshold
+        results[benchmark.name] = result
+
+    return {
+        'created': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=None):
+    """
+    Compare a results document against a baseline one. Returns a list of
+    ``(name, metric, baseline, current, ratio, regressed)`` tuples for every
+    benchmark in both.
+
+    A benchmark regresses when its best time per operation, or its
+    allocations per operation (which barely vary between runs), grow by more
+    than its threshold (or ``threshold`` if given).
+    """
+    rows = []
+    for name in sorted(results['results']):
+        current = results['results'][name]
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        limit = current.get('threshold', .25) if threshold is None \
+            else threshold
+        for metric in ('per_op_s', 'alloc_net_bytes_per_op',
+                'gc_net_objects_per_op'):
+            if metric not in current or metric not in previous:
+                continue
+            old, new = previous[metric], current[metric]
+            ratio = new / old if old else (1. if not new else float('inf'))
+            if metric == 'per_op_s':
+                regressed = new > old * (1. + limit)
+            else:
+                # allow an object (or a small block) per operation of slack
+                slack = 1. if metric == 'gc_net_objects_per_op' else 64.
+                regressed = new > old * (1. + limit) + slack
+            rows.append((name, metric, old, new, ratio, regressed))
+    return rows
+
+
+def load_results(filename):
+    with open(filename) as jsonfile:
+        return json.load(jsonfile)
+
+
+def save_results(filename, results):
+    with open(filename, 'w') as jsonfile:
+        json.dump(results, jsonfile, indent=2, sort_keys=True)
+        jsonfile.write('\n')
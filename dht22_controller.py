@@ -3,28 +3,52 @@ from dht22_controller._logging import setup_logging
 setup_logging(default_path="/home/pi/dht22_controller/logging.json")
 
 
-import csv
-from datetime import datetime
+import atexit
+from os.path import join
+import signal
 import sys
 import time
-import Adafruit_DHT
-import RPi.GPIO as g
+from dht22_controller.checkpoint import Checkpointer, warm_start
 from dht22_controller.config import Config
-from dht22_controller.temperature import Temperature, c_to_f
+from dht22_controller.config_watcher import ConfigWatcher
+from dht22_controller.controller import Controller, InlineSink, Sink
+from dht22_controller.exporter import MetricsExporter
+from dht22_controller.hardware import create_backends
+from dht22_controller.temperature import Temperature
 from dht22_controller.humidity import Humidity
-from dht22_controller.utils import clip
+from dht22_controller.instrumentation import Instruments
+from dht22_controller.profiling import Profiler
+from dht22_controller.recorder import BufferedCsvWriter
+from dht22_controller.rollup import Rollups
+from dht22_controller.timeseries import SegmentWriter
+from dht22_controller.utils import clip, now
 
 
 import logging
 log = logging.getLogger(__name__)
 
 
-g.setmode(g.BCM)
-SENSOR = Adafruit_DHT.DHT22
-
 conf = Config()
 conf.load()
 
+# the sensor and relays (real, simulated or replayed) chosen by the config
+read_sensor, cool_relay, dehumidify_relay = create_backends(conf)
+
+if conf.data_format == 'binary':
+    recorder = SegmentWriter(
+        join(conf.data_dir, 'segments'),
+        max_rows=conf.data_flush_rows,
+        max_interval_s=conf.data_flush_interval_s)
+else:
+    recorder = BufferedCsvWriter(
+        join(conf.data_dir, 'data.csv'),
+        max_rows=conf.data_flush_rows,
+        max_interval_s=conf.data_flush_interval_s)
+atexit.register(recorder.close)
+
+rollups = Rollups(join(conf.data_dir, 'rollups'))
+atexit.register(rollups.close)
+
 temperature = Temperature(
     conf,
     queue_size=10,
@@ -43,93 +67,135 @@ humidity = Humidity(
     recently_minutes=5.)
 
 
-# Reversed since that's what's working for me (must have reversed polarity
-# on current socket?)
-ON = False
-OFF = True
-
-
-# #### SETUP PINS ####
-if conf.cool_pin is not None:
-    g.setup(conf.cool_pin, g.OUT)
-
-if conf.dehumidity_pin is not None:
-    g.setup(conf.dehumidity_pin, g.OUT)
-
-
 #### HELPER FUNCTIONS ####
 def record_data(t, tavg, h, havg):
-    with open('/home/pi/controller_data/data.csv', 'a') as csvfile:
-        writer = csv.writer(csvfile, delimiter=",")
-        writer.writerow([
-            # current datetime
-            datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S'),
-            # current temperature
-            '{:.2f}'.format(t),
-            # average temperature
-            '{:.2f}'.format(tavg),
-            # current humidity
-            '{:.2f}'.format(h),
-            # average humidity
-            '{:.2f}'.format(havg)])
-
-
-def _get_data():
-    h, t = Adafruit_DHT.read(SENSOR, conf.pin)
-    if h is None or t is None:
-        return (None, None)
-    else:
-        return (float(h), c_to_f(float(t)))
-
-
-def get_data_wait():
-    while True:
-        h, t = _get_data()
-        if h is None or t is None:
-            # couldn't get a reading, so just skip
-            time.sleep(1)
-            continue
-
-        # update our variables
-        humidity.add(h)
-        humidity.update()
-
-        temperature.add(t)
-        temperature.update()
-
-        # record the data to csv
-        record_data(t, temperature.temperature_average_f(), h, humidity.average())
-        break
-
-    return h, t
+    timestamp = now()
+    rollups.add(timestamp, t, h)
+
+    if conf.data_format == 'binary':
+        recorder.append(timestamp, t, tavg, h, havg)
+        return
+
+    recorder.writerow([
+        # current datetime
+        timestamp.strftime('%Y-%m-%dT%H:%M:%S'),
+        # current temperature
+        '{:.2f}'.format(t),
+        # average temperature
+        '{:.2f}'.format(tavg),
+        # current humidity
+        '{:.2f}'.format(h),
+        # average humidity
+        '{:.2f}'.format(havg)])
+
+
+def shutdown(signum, frame):
+    # exit normally so atexit handlers (e.g. the recorder flush) still run
+    log.info("received signal %s, shutting down", signum)
+    sys.exit(0)
+
+
+def dump_timings(signum, frame):
+    # logging from a signal handler could deadlock, so the loop does it
+    instruments.request_dump()
+
+
+def start_profiling(signum, frame):
+    profiler.request_start()
+
+
+def dump_profile(signum, frame):
+    profiler.request_dump()
+
+
+def log_state(state):
+    log.debug(
+        'h=%.02f (avg=%.02f med=%.02f min=%.02f max=%.02f) dehumid=%s | '
+        't=%.02f (avg=%.02f med=%.02f min=%.02f max=%.02f) cool=%s',
+        state.h, state.havg, state.hmed, state.hmin, state.hmax,
+        'on' if state.dehumidifier_on else 'off',
+        state.t, state.tavg, state.tmed, state.tmin, state.tmax,
+        'on' if state.cooling_on else 'off',
+        )
+
+
+def set_pins(state):
+    if cool_relay is not None:
+        cool_relay.set(state.cooling_on)
+
+    if dehumidify_relay is not None:
+        dehumidify_relay.set(state.dehumidifier_on)
+
+
+# how long each phase of the loop takes, logged periodically and on SIGQUIT
+instruments = Instruments(dump_interval_s=conf.timing_dump_interval_s)
+
+# profiles the loop between SIGUSR1 and SIGUSR2
+profiler = Profiler(conf.profile_dir)
+
+# picks up where the last run left off, and checkpoints for the next one
+checkpointer = Checkpointer(
+    conf.state_file,
+    temperature,
+    humidity,
+    interval_s=conf.checkpoint_interval_s,
+    max_age_s=conf.state_max_age_s,
+    window_max_age_s=conf.warm_start_max_age_s)
+checkpointer.restore()
+if not len(temperature.queue) and conf.data_format == 'csv':
+    # no recent window to pick up, but the latest readings beat none
+    warm_start(
+        temperature,
+        humidity,
+        join(conf.data_dir, 'data.csv'),
+        max_age_s=conf.warm_start_max_age_s)
+
+# swaps config.json changes into the controllers between ticks
+watcher = ConfigWatcher(
+    conf, [temperature, humidity], interval_s=conf.config_poll_interval_s)
+
+controller = Controller(
+    temperature,
+    humidity,
+    read_sensor,
+    tick_s=conf.tick_s,
+    sample_interval_s=conf.sample_interval_s,
+    on_reading=[Sink('csv', record_data, instruments)],
+    on_tick=[
+        Sink('log', log_state, instruments),
+        Sink('gpio', set_pins, instruments)],
+    instruments=instruments,
+    on_loop=[profiler.poll, watcher.poll, checkpointer.poll])
+
+if temperature.cooling_on or temperature.heating_on:
+    # restored mid-run, so switch off on time
+    controller.schedule_shutoff()
+atexit.register(checkpointer.save)
+
+if conf.metrics_address is not None:
+    exporter = MetricsExporter(
+        controller, conf.metrics_address, instruments=instruments)
+    # keeping the latest state is cheap, so do it on the loop's thread
+    controller.on_tick.append(InlineSink('metrics', exporter.update))
+    exporter.start()
+    atexit.register(exporter.stop)
 
 
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGHUP, shutdown)
+    signal.signal(signal.SIGQUIT, dump_timings)
+    signal.signal(signal.SIGUSR1, start_profiling)
+    signal.signal(signal.SIGUSR2, dump_profile)
+
     try:
         log.info(80*"=")
         log.info("starting dht22_controller")
         log.info(80*"=")
         log.info("")
-        
-        # loop forever
-        while True:
-            h, t = get_data_wait()
-
-            log.debug(
-                'h=%.02f (avg=%.02f) dehumid=%s | t=%.02f (avg=%.02f) cool=%s',
-                h, humidity.average(),
-                'on' if humidity.dehumidifier_on else 'off',
-                t, temperature.temperature_average_f(),
-                'on' if temperature.cooling_on else 'off',
-                )
 
-            if conf.cool_pin is not None:
-                g.output(conf.cool_pin, ON if temperature.cooling_on else OFF)
-
-            if conf.dehumidity_pin is not None:
-                g.output(conf.dehumidity_pin, ON if humidity.dehumidifier_on else OFF)
-
-            time.sleep(1)
+        # loop forever
+        controller.run()
     except Exception as e:
         log.exception("an exception occurred in the main loop")
         raise
@@ -1,7 +1,26 @@
 from utils import *
 from config import *
+from config_watcher import *
 from humidity import *
 from temperature import *
 from learn import *
 from datastore import *
 from capped_queue import *
+from recorder import *
+from timeseries import *
+from query import *
+from rollup import *
+from compact import *
+from controller import *
+from scheduler import *
+from sensor import *
+from model import *
+from hardware import *
+from simulator import *
+from sweep import *
+from replay import *
+from fleet import *
+from instrumentation import *
+from exporter import *
+from profiling import *
+from checkpoint import *
@@ -1,19 +1,196 @@
+from array import array
+from collections import deque
+import heapq
+
+
+__all__ = [
+    "CappedQueue"
+]
+
+
+class _SlidingMedian(object):
+    """
+    Median of a sliding window using two heaps with lazy deletion.
+
+    ``low`` is a max-heap (stored negated) holding the smaller half of the
+    window and ``high`` a min-heap holding the larger half. Items are tagged
+    with the sequence number they were added with, so removing an item only
+    marks its sequence number and the heaps are cleaned up once it reaches
+    the top.
+    """
+
+    __slots__ = ('_low', '_high', '_side', '_removed', '_nlow', '_nhigh')
+
+    def __init__(self):
+        self._low = []
+        self._high = []
+        # which heap each live sequence number is in (True = low)
+        self._side = {}
+        self._removed = set()
+        self._nlow = 0
+        self._nhigh = 0
+
+    def add(self, seq, value):
+        if self._nlow == 0 or value <= -self._low[0][0]:
+            heapq.heappush(self._low, (-value, seq))
+            self._side[seq] = True
+            self._nlow += 1
+        else:
+            heapq.heappush(self._high, (value, seq))
+            self._side[seq] = False
+            self._nhigh += 1
+        self._rebalance()
+
+    def remove(self, seq):
+        if self._side.pop(seq):
+            self._nlow -= 1
+        else:
+            self._nhigh -= 1
+        self._removed.add(seq)
+        self._prune()
+        self._rebalance()
+
+    def median(self):
+        if self._nlow == 0:
+            return None
+        if self._nlow > self._nhigh:
+            return -self._low[0][0]
+        return (-self._low[0][0] + self._high[0][0]) / 2.
+
+    def _prune(self):
+        removed = self._removed
+        low, high = self._low, self._high
+        while low and low[0][1] in removed:
+            removed.discard(heapq.heappop(low)[1])
+        while high and high[0][1] in removed:
+            removed.discard(heapq.heappop(high)[1])
+
+        # items that never make it to the top of their heap (e.g. the oldest
+        # values of a steadily rising series) would otherwise pile up, so
+        # rebuild once the dead entries outnumber the live ones
+        if len(low) + len(high) > 2 * (self._nlow + self._nhigh) + 16:
+            self._low = [i for i in low if i[1] not in removed]
+            self._high = [i for i in high if i[1] not in removed]
+            heapq.heapify(self._low)
+            heapq.heapify(self._high)
+            removed.clear()
+
+    def _rebalance(self):
+        # keep len(low) == len(high) or len(low) == len(high) + 1
+        if self._nlow > self._nhigh + 1:
+            value, seq = heapq.heappop(self._low)
+            heapq.heappush(self._high, (-value, seq))
+            self._side[seq] = False
+            self._nlow -= 1
+            self._nhigh += 1
+            self._prune()
+        elif self._nlow < self._nhigh:
+            value, seq = heapq.heappop(self._high)
+            heapq.heappush(self._low, (-value, seq))
+            self._side[seq] = True
+            self._nhigh -= 1
+            self._nlow += 1
+            self._prune()
 
-import Queue
 
 class CappedQueue(object):
     """
     A queue that only holds the last ``cap`` items that were added.
+
+    The items are stored in a fixed-size ring of doubles, and a running sum is
+    kept alongside them so that the average can be read without copying or
+    re-summing the window. Monotonic deques track the window's minimum and
+    maximum (amortized O(1) per put) and a pair of heaps tracks its median
+    (O(log n) per put).
     """
 
+    __slots__ = ('cap', 'count', 'total', '_values', '_head', '_puts', '_seq',
+        '_mins', '_maxs', '_median')
+
     def __init__(self, cap=10):
         self.cap = cap
-        self.queue = Queue.Queue()
+        self.count = 0
+        self.total = 0.
+        self._values = array('d', [0.] * cap)
+        # index of the slot the next item will be written to
+        self._head = 0
+        # puts since the running sum was last recomputed from scratch
+        self._puts = 0
+        # sequence number of the next item; the oldest item in the window is
+        # always ``_seq - count``
+        self._seq = 0
+        # (seq, value) pairs with increasing / decreasing values
+        self._mins = deque()
+        self._maxs = deque()
+        self._median = _SlidingMedian()
 
     def put(self, item):
-        self.queue.put(item)
-        if self.queue.qsize() > self.cap:
-            self.queue.get()
+        item = float(item)
+        head = self._head
+        seq = self._seq
+        if self.count == self.cap:
+            self.total -= self._values[head]
+            evicted = seq - self.cap
+            if self._mins[0][0] == evicted: self._mins.popleft()
+            if self._maxs[0][0] == evicted: self._maxs.popleft()
+            self._median.remove(evicted)
+        else:
+            self.count += 1
+        self._values[head] = item
+        self.total += item
+        self._head = (head + 1) % self.cap
+        self._seq = seq + 1
+
+        mins = self._mins
+        while mins and mins[-1][1] >= item: mins.pop()
+        mins.append((seq, item))
+        maxs = self._maxs
+        while maxs and maxs[-1][1] <= item: maxs.pop()
+        maxs.append((seq, item))
+        self._median.add(seq, item)
+
+        # re-sum once per lap of the ring so floating point error from the
+        # running adds and subtracts can't accumulate forever (unused slots
+        # are still 0, so summing the whole ring is always correct)
+        self._puts += 1
+        if self._puts >= self.cap:
+            self._puts = 0
+            self.total = sum(self._values)
 
     def tolist(self):
-        return list(self.queue.queue)
+        """
+        The items in the queue, oldest first.
+        """
+        if self.count < self.cap:
+            return self._values[:self.count].tolist()
+        head = self._head
+        return self._values[head:].tolist() + self._values[:head].tolist()
+
+    def average(self):
+        """
+        The average of the items in the queue, or None if it's empty.
+        """
+        if not self.count:
+            return None
+        return self.total / float(self.count)
+
+    def minimum(self):
+        """
+        The smallest item in the queue, or None if it's empty.
+        """
+        return self._mins[0][1] if self._mins else None
+
+    def maximum(self):
+        """
+        The largest item in the queue, or None if it's empty.
+        """
+        return self._maxs[0][1] if self._maxs else None
+
+    def median(self):
+        """
+        The median of the items in the queue, or None if it's empty.
+        """
+        return self._median.median()
+
+    def __len__(self):
+        return self.count
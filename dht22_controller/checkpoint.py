@@ -0,0 +1,191 @@
+from datetime import timedelta
+import json
+import os
+from os.path import dirname, isdir
+from dht22_controller.query import tail_rows
+from dht22_controller.utils import clock, now
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "STATE_VERSION",
+    "write_state",
+    "read_state",
+    "Checkpointer",
+    "warm_start"
+]
+
+
+STATE_VERSION = 1
+
+
+def write_state(filename, state):
+    """
+    Replace ``filename`` with ``state`` as json. The new file is fsync'd
+    before it's renamed over the old one (and the directory after), so a
+    crash leaves either the old checkpoint or the new one, never half of one.
+    """
+    directory = dirname(filename) or '.'
+    if not isdir(directory):
+        os.makedirs(directory)
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'w') as statefile:
+        json.dump(state, statefile, separators=(',', ':'), sort_keys=True)
+        statefile.flush()
+        os.fsync(statefile.fileno())
+    os.rename(tmpname, filename)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_state(filename):
+    """
+    The state in ``filename``, or None if there isn't a usable one.
+    """
+    try:
+        with open(filename, 'r') as statefile:
+            state = json.load(statefile)
+    except (IOError, OSError) as e:
+        return None
+    except ValueError as e:
+        log.warning("ignoring unreadable state file %s: %s", filename, e)
+        return None
+    if not isinstance(state, dict) or \
+            state.get('version') != STATE_VERSION or \
+            not isinstance(state.get('saved_at'), (int, float)) or \
+            not isinstance(state.get('temperature'), dict) or \
+            not isinstance(state.get('humidity'), dict):
+        log.warning("ignoring state file %s with an unknown layout",
+            filename)
+        return None
+    return state
+
+
+class Checkpointer(object):
+    """
+    Checkpoints the state of ``temperature`` and ``humidity`` (see their
+    ``get_state``) to ``filename`` every ``interval_s`` seconds and restores
+    it on startup, so a restart picks up mid-cycle with the sample window,
+    the learned run times and any pending learning intact.
+
+    Timestamps are saved as they are (seconds from
+    :func:`~dht22_controller.utils.clock`), so time spent down counts towards
+    "recently" and run times just like time spent running. A checkpoint older
+    than ``max_age_s`` is ignored, and so is one saved in the future (the
+    clock went backwards, e.g. a Pi without an RTC booting on fake-hwclock),
+    since its age is unknown and its timestamps would read as recent for as
+    long as the clock is behind. One older than ``window_max_age_s`` only
+    restores the learned run times and the timings: the sample window, the
+    min / max tracking and any pending learning (each class's
+    ``WINDOW_STATE``) describe readings too old to act on.
+
+    :meth:`poll` is meant to be a
+    :class:`~dht22_controller.controller.Controller` ``on_loop`` function, so
+    the state is read between ticks. A checkpoint that can't be written is
+    logged and tried again after another ``interval_s``, rather than stopping
+    the loop.
+    """
+
+    def __init__(self, filename, temperature, humidity, interval_s=60.,
+        max_age_s=60. * 60., window_max_age_s=5. * 60.):
+        self.filename = filename
+        self.temperature = temperature
+        self.humidity = humidity
+        self.interval_s = interval_s
+        self.max_age_s = max_age_s
+        self.window_max_age_s = window_max_age_s
+        self.last_save = clock()
+
+    def state(self):
+        return {
+            'version': STATE_VERSION,
+            'saved_at': clock(),
+            'temperature': self.temperature.get_state(),
+            'humidity': self.humidity.get_state()
+        }
+
+    def save(self):
+        try:
+            write_state(self.filename, self.state())
+        except Exception as e:
+            log.exception("exception occurred. filename=%s", self.filename)
+            raise
+        self.last_save = clock()
+
+    def poll(self):
+        """
+        Save if the interval has passed. Returns True if it saved.
+        """
+        if self.interval_s is None or \
+                clock() - self.last_save < self.interval_s:
+            return False
+        try:
+            self.save()
+        except Exception as e:
+            # already logged; the checkpoint is best effort, control isn't
+            self.last_save = clock()
+            return False
+        return True
+
+    def restore(self):
+        """
+        Load the checkpoint into the controllers if there's a recent enough
+        one. Returns True if it was restored.
+        """
+        state = read_state(self.filename)
+        if state is None:
+            return False
+        age_s = clock() - state['saved_at']
+        if age_s < 0:
+            log.warning("not restoring the state in %s, it was saved %.0fs "
+                "in the future", self.filename, -age_s)
+            return False
+        if self.max_age_s is not None and age_s > self.max_age_s:
+            log.info("not restoring the state in %s, it's %.0fs old",
+                self.filename, age_s)
+            return False
+        stale = self.window_max_age_s is not None and \
+            age_s > self.window_max_age_s
+        for controller, name in ((self.temperature, 'temperature'),
+                (self.humidity, 'humidity')):
+            saved = state[name]
+            if stale:
+                saved = dict((key, value) for key, value in saved.items()
+                    if key != 'window' and key not in controller.WINDOW_STATE)
+            controller.set_state(saved)
+        log.info("restored the state saved %.0fs ago from %s%s", age_s,
+            self.filename, " (without the sample window)" if stale else "")
+        return True
+
+
+def warm_start(temperature, humidity, filename, max_age_s=5. * 60.):
+    """
+    Fill the sample windows of ``temperature`` and ``humidity`` with the
+    readings at the end of the data.csv ``filename`` that are at most
+    ``max_age_s`` old, so the first decisions after a start average over a
+    full window instead of a single reading. Only the tail of the file is
+    read. Returns how many readings were added.
+    """
+    count = max(temperature.queue.cap, humidity.queue.cap)
+    try:
+        rows = tail_rows(filename, count)
+    except (IOError, OSError) as e:
+        return 0
+    except (ValueError, IndexError) as e:
+        log.warning("not warm starting from %s: %s", filename, e)
+        return 0
+
+    oldest = now() - timedelta(seconds=max_age_s)
+    rows = [row for row in rows if row[0] >= oldest]
+    for at, t, tavg, h, havg in rows:
+        temperature.add(t)
+        humidity.add(h)
+    if rows:
+        log.info("warm started with %d readings from %s", len(rows), filename)
+    return len(rows)
@@ -0,0 +1,195 @@
+import argparse
+from collections import defaultdict, deque
+import csv
+import os
+from dht22_controller.datastore import refresh_index
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "history_filename",
+    "compact",
+    "maybe_compact"
+]
+
+
+def history_filename(filename):
+    """
+    Where the summary of the rows dropped from a learn file is kept.
+    """
+    return filename + '.history.csv'
+
+
+def _read_history(filename):
+    """
+    Map each target to ``[first, last, count, start_sum, result_sum,
+    seconds_sum]`` for the rows that were already compacted away.
+    """
+    history = {}
+    if not os.path.isfile(filename):
+        return history
+
+    with open(filename, 'r') as csvfile:
+        for row in csv.reader(csvfile):
+            if not row: continue
+            count = int(row[3])
+            history[float(row[0])] = [row[1], row[2], count,
+                float(row[4]) * count, float(row[5]) * count,
+                float(row[6]) * count]
+    return history
+
+
+def _marker_filename(filename):
+    # exists while a compaction of ``filename`` is being committed, and holds
+    # the inode of the learn file it's replacing ``filename`` with
+    return filename + '.compacting'
+
+
+def _write_tmp(filename, rows):
+    """
+    Write ``rows`` to ``filename``.tmp and fsync it. Returns its inode,
+    which a rename keeps.
+    """
+    with open(filename + '.tmp', 'w') as csvfile:
+        writer = csv.writer(csvfile, delimiter=",")
+        writer.writerows(rows)
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+        return os.fstat(csvfile.fileno()).st_ino
+
+
+def _finish(filename):
+    """
+    Complete a compaction of ``filename`` that was interrupted after the
+    learn file was replaced, or drop one that was interrupted before.
+    """
+    marker = _marker_filename(filename)
+    if not os.path.isfile(marker):
+        return
+    with open(marker, 'r') as markerfile:
+        inode = int(markerfile.read())
+    histname = history_filename(filename)
+    if os.path.isfile(histname + '.tmp') and \
+            os.path.isfile(filename) and os.stat(filename).st_ino == inode:
+        os.rename(histname + '.tmp', histname)
+    os.remove(marker)
+
+
+def compact(filename, keep=10):
+    """
+    Rewrite the learn file ``filename`` keeping only the newest ``keep`` rows
+    for each target. The rows that are dropped are folded into a per-target
+    summary (count, first/last timestamp and mean starting value, result and
+    seconds) in :func:`history_filename`.
+
+    Both files are written in full before either is replaced, and replacing
+    the learn file is the commit point: a crash before it leaves both as they
+    were, and the history is swapped in by the next call after it. Either
+    way, rows are folded into the history exactly once.
+
+    Returns the number of rows that were dropped.
+    """
+    if keep < 1:
+        raise ValueError("keep must be at least 1, got {}".format(keep))
+    _finish(filename)
+    if not os.path.isfile(filename):
+        return 0
+
+    with open(filename, 'r') as csvfile:
+        rows = [row for row in csv.reader(csvfile) if row]
+
+    # the (row number) of the newest ``keep`` rows for each target
+    newest = defaultdict(lambda: deque(maxlen=keep))
+    for i, row in enumerate(rows):
+        newest[float(row[2])].append(i)
+    kept = set()
+    for indexes in newest.values():
+        kept.update(indexes)
+
+    dropped = len(rows) - len(kept)
+    if dropped == 0:
+        return 0
+
+    histname = history_filename(filename)
+    history = _read_history(histname)
+    for i, row in enumerate(rows):
+        if i in kept: continue
+        target = float(row[2])
+        summary = history.get(target)
+        if summary is None:
+            summary = history[target] = [row[0], row[0], 0, 0., 0., 0.]
+        summary[0] = min(summary[0], row[0])
+        summary[1] = max(summary[1], row[0])
+        summary[2] += 1
+        summary[3] += float(row[1])
+        summary[4] += float(row[3])
+        summary[5] += float(row[4])
+
+    _write_tmp(histname, [
+        ['{:.1f}'.format(target), first, last, count,
+            '{:.2f}'.format(start_sum / count),
+            '{:.2f}'.format(result_sum / count),
+            '{:.2f}'.format(seconds_sum / count)]
+        for target, (first, last, count, start_sum, result_sum, seconds_sum)
+        in sorted(history.items())])
+    inode = _write_tmp(filename,
+        [row for i, row in enumerate(rows) if i in kept])
+    marker = _marker_filename(filename)
+    with open(marker + '.tmp', 'w') as markerfile:
+        markerfile.write(str(inode))
+        markerfile.flush()
+        os.fsync(markerfile.fileno())
+    os.rename(marker + '.tmp', marker)
+    os.rename(filename + '.tmp', filename)
+    _finish(filename)
+    refresh_index(filename)
+
+    log.info("compacted %s, dropped %s of %s rows",
+        filename, dropped, len(rows))
+    return dropped
+
+
+def maybe_compact(filename, max_bytes, keep=10):
+    """
+    Compact ``filename`` if it's grown past ``max_bytes``. This runs from
+    the control loop right after a learn row is saved, so a failure is
+    logged and 0 returned rather than raised: the row is already safe and
+    compaction is tried again after the next one.
+    """
+    try:
+        _finish(filename)
+        if max_bytes is None or not os.path.isfile(filename):
+            return 0
+        if os.path.getsize(filename) <= max_bytes:
+            return 0
+        return compact(filename, keep)
+    except Exception as e:
+        log.exception(
+            "exception occurred. filename=%s, max_bytes=%s, keep=%s",
+            filename, max_bytes, keep)
+        return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compact learn files (e.g. lcool.csv, lheat.csv).")
+    parser.add_argument('filenames', nargs='+', help="learn files to compact")
+    parser.add_argument('--keep', type=int, default=10,
+        help="rows to keep for each target (default: %(default)s)")
+    parser.add_argument('--max-bytes', type=int, default=None,
+        help="only compact files larger than this")
+    args = parser.parse_args(argv)
+
+    for filename in args.filenames:
+        if args.max_bytes is None:
+            dropped = compact(filename, args.keep)
+        else:
+            dropped = maybe_compact(filename, args.max_bytes, args.keep)
+        print('{}: dropped {} rows'.format(filename, dropped))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import json
+from numbers import Number
 from os.path import dirname, join
 import os
 
@@ -23,6 +24,7 @@ class Config(object):
         default_target_humidity=70,
         default_humidity_pad=2):
         self.config = {}
+        self.filepath = None
         self.default_pin = default_pin
         self.default_target_temp_f = default_target_temp_f
         self.default_temp_pad = default_temp_pad
@@ -79,7 +81,213 @@ class Config(object):
     def max_humidity(self):
         return self.target_humidity + self.humidity_pad
 
-    def load(self):
-        filepath = join(dirname(dirname(__file__)), "config.json")
+    @property
+    def data_dir(self):
+        return self.config.get('data_dir', '/home/pi/controller_data')
+
+    @property
+    def data_format(self):
+        """
+        How readings are recorded: 'csv' (data.csv) or 'binary' (daily
+        segments in ``data_dir``/segments).
+        """
+        return self.config.get('data_format', 'csv')
+
+    @property
+    def data_flush_rows(self):
+        return self.config.get('data_flush_rows', 60)
+
+    @property
+    def data_flush_interval_s(self):
+        return self.config.get('data_flush_interval_s', 60.)
+
+    @property
+    def learn_max_bytes(self):
+        """
+        Compact a learn file once it grows past this many bytes.
+        """
+        return self.config.get('learn_max_bytes', 256 * 1024)
+
+    @property
+    def learn_keep_rows(self):
+        return self.config.get('learn_keep_rows', 10)
+
+    @property
+    def sensor_backend(self):
+        """
+        'dht22', 'simulated' or 'replay'.
+        """
+        return self.config.get('sensor_backend', 'dht22')
+
+    @property
+    def relay_backend(self):
+        """
+        'gpio', 'simulated' or 'null'.
+        """
+        return self.config.get('relay_backend', 'gpio')
+
+    @property
+    def replay_file(self):
+        return self.config.get('replay_file', join(self.data_dir, 'data.csv'))
+
+    @property
+    def simulation(self):
+        """
+        Keyword arguments for the simulated chamber model.
+        """
+        return self.config.get('simulation', {})
+
+    @property
+    def sample_interval_s(self):
+        return self.config.get('sample_interval_s', 2.)
+
+    @property
+    def tick_s(self):
+        return self.config.get('tick_s', 1.)
+
+    @property
+    def metrics_address(self):
+        """
+        Where to serve Prometheus metrics: '[host:]port' (localhost by
+        default), 'unix:/path/to/socket' or None to not serve them.
+        """
+        return self.config.get('metrics_address', None)
+
+    @property
+    def profile_dir(self):
+        """
+        Where the reports from profiling on SIGUSR1 / SIGUSR2 are written.
+        """
+        return self.config.get('profile_dir', join(self.data_dir, 'profiles'))
+
+    @property
+    def timing_dump_interval_s(self):
+        """
+        How often the loop's phase timings are logged (None to only log them
+        on SIGQUIT).
+        """
+        return self.config.get('timing_dump_interval_s', 600.)
+
+    @property
+    def state_file(self):
+        """
+        Where the controllers' state is checkpointed to and restored from on
+        startup.
+        """
+        return self.config.get('state_file', join(self.data_dir, 'state.json'))
+
+    @property
+    def checkpoint_interval_s(self):
+        """
+        How often the state is checkpointed (None to only do it on exit).
+        """
+        return self.config.get('checkpoint_interval_s', 60.)
+
+    @property
+    def state_max_age_s(self):
+        """
+        A checkpoint older than this is ignored on startup.
+        """
+        return self.config.get('state_max_age_s', 60. * 60.)
+
+    @property
+    def warm_start_max_age_s(self):
+        """
+        Readings older than this aren't used to fill the sample windows on
+        startup, whether from a checkpoint or (with no usable window in the
+        checkpoint) from the rows at the end of data.csv.
+        """
+        return self.config.get('warm_start_max_age_s', 5. * 60.)
+
+    @property
+    def config_poll_interval_s(self):
+        """
+        How often config.json is checked for changes (None to never reload
+        it).
+        """
+        return self.config.get('config_poll_interval_s', 5.)
+
+    def load(self, filepath=None):
+        if filepath is None:
+            filepath = join(dirname(dirname(__file__)), "config.json")
         with open(filepath) as jsonfile:
             self.config = json.load(jsonfile)
+        self.filepath = filepath
+
+    def snapshot(self):
+        """
+        The settings as a :class:`ConfigSnapshot`. Take one per load and keep
+        it, since changes to :attr:`config` after this aren't seen by it.
+        """
+        return ConfigSnapshot(self)
+
+    def validate(self):
+        """
+        Raise a ValueError if the settings can't be run with.
+        """
+        if not isinstance(self.config, dict):
+            raise ValueError("the config must be a json object")
+        for name in ('target_temp_f', 'temp_pad', 'target_humidity',
+                'humidity_pad', 'sample_interval_s', 'tick_s'):
+            value = getattr(self, name)
+            if isinstance(value, bool) or not isinstance(value, Number):
+                raise ValueError("{} must be a number, got {!r}".format(
+                    name, value))
+        for name in ('temp_pad', 'humidity_pad'):
+            if getattr(self, name) < 0:
+                raise ValueError("{} can't be negative".format(name))
+        for name in ('sample_interval_s', 'tick_s'):
+            if getattr(self, name) <= 0:
+                raise ValueError("{} must be positive".format(name))
+        if not 0 <= self.min_humidity <= self.max_humidity <= 100:
+            raise ValueError("the humidity band {}-{} isn't within 0-100"
+                .format(self.min_humidity, self.max_humidity))
+        for name, allowed in (
+                ('data_format', ('csv', 'binary')),
+                ('sensor_backend', ('dht22', 'simulated', 'replay')),
+                ('relay_backend', ('gpio', 'simulated', 'null'))):
+            if getattr(self, name) not in allowed:
+                raise ValueError("unknown {}: {}".format(
+                    name, getattr(self, name)))
+
+
+class ConfigSnapshot(object):
+    """
+    An immutable copy of a :class:`Config`'s settings, with the derived ones
+    (``min_temp_f``, ``max_humidity`` and so on) worked out once, so reading
+    one on every tick is a plain slot lookup instead of dict lookups and
+    arithmetic.
+    """
+
+    # every setting Config has a property for
+    __slots__ = tuple(sorted(
+        name for name, value in vars(Config).items()
+        if isinstance(value, property)))
+
+    def __init__(self, config):
+        for name in self.__slots__:
+            value = getattr(config, name)
+            if isinstance(value, dict):
+                value = dict(value)
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("a config snapshot can't be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("a config snapshot can't be changed")
+
+    def snapshot(self):
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, ConfigSnapshot):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name)
+            for name in self.__slots__)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
@@ -0,0 +1,129 @@
+import os
+from dht22_controller.config import Config
+from dht22_controller.utils import now
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "RESTART_KEYS",
+    "changed_keys",
+    "ConfigWatcher"
+]
+
+
+# settings that are only read at startup, so changing them needs a restart
+RESTART_KEYS = frozenset([
+    'pin', 'humidity_pin', 'dehumidity_pin', 'cool_pin', 'data_dir',
+    'data_format', 'data_flush_rows', 'data_flush_interval_s',
+    'sensor_backend', 'relay_backend', 'replay_file', 'simulation',
+    'sample_interval_s', 'tick_s', 'metrics_address', 'profile_dir',
+    'timing_dump_interval_s', 'config_poll_interval_s', 'state_file',
+    'checkpoint_interval_s', 'state_max_age_s', 'warm_start_max_age_s'])
+
+
+def changed_keys(old, new):
+    """
+    The keys whose values differ between two config dicts, including ones
+    only in one of them.
+    """
+    missing = object()
+    return sorted(key for key in set(old) | set(new)
+        if old.get(key, missing) != new.get(key, missing))
+
+
+def _signature(filepath):
+    # the inode catches editors that save by renaming a new file into place
+    st = os.stat(filepath)
+    return st.st_mtime, st.st_size, st.st_ino
+
+
+class ConfigWatcher(object):
+    """
+    Reloads ``config``'s file when it changes and hands the new
+    :class:`~dht22_controller.config.Config` to each of ``targets`` (the
+    temperature and humidity controllers) through ``prepare_config``.
+
+    The file's mtime, size and inode are checked at most every
+    ``interval_s`` seconds by :meth:`poll`, which is meant to be a
+    :class:`~dht22_controller.controller.Controller` ``on_loop`` function:
+    it runs between ticks on the loop's thread, so every target sees the new
+    config from the same tick on. A file that can't be parsed or doesn't
+    :meth:`~dht22_controller.config.Config.validate` is logged and ignored,
+    and the current config stays in place.
+
+    The swap is all or nothing: every target prepares the new config (which
+    is where loading the learned run times can fail) before any of them
+    switches to it. If one can't, the current config stays in place on every
+    target and the file is tried again at the next check.
+    """
+
+    def __init__(self, config, targets, interval_s=5.):
+        self.config = config
+        self.targets = list(targets)
+        self.interval_s = interval_s
+        self.last_check = now()
+        self.signature = self._signature()
+
+    def _signature(self):
+        try:
+            return _signature(self.config.filepath)
+        except OSError:
+            return None
+
+    def poll(self):
+        """
+        Reload the config if it's time to check and the file has changed.
+        Returns True if a new config was swapped in.
+        """
+        if self.interval_s is None:
+            return False
+        if (now() - self.last_check).total_seconds() < self.interval_s:
+            return False
+        self.last_check = now()
+        signature = self._signature()
+        if signature is None or signature == self.signature:
+            return False
+        previous, self.signature = self.signature, signature
+        try:
+            return self.reload()
+        except Exception as e:
+            # already logged; keep running on the current config and retry
+            self.signature = previous
+            return False
+
+    def reload(self):
+        """
+        Load, validate and swap in the config file. Returns True if it was
+        swapped in. Raises if a target can't prepare it, with every target
+        still on the current config.
+        """
+        filepath = self.config.filepath
+        config = Config()
+        try:
+            config.load(filepath)
+            config.validate()
+        except (IOError, OSError, ValueError) as e:
+            log.error("not reloading %s: %s", filepath, e)
+            return False
+
+        changed = changed_keys(self.config.config, config.config)
+        if not changed:
+            return False
+        for key in changed:
+            log.info("config %s: %r -> %r%s", key, self.config.config.get(key),
+                config.config.get(key),
+                " (takes effect after a restart)" if key in RESTART_KEYS
+                else "")
+
+        try:
+            swaps = [target.prepare_config(config) for target in self.targets]
+        except Exception as e:
+            log.exception("exception occurred. filepath=%s", filepath)
+            raise
+        for swap in swaps:
+            swap()
+        self.config = config
+        return True
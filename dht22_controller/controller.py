@@ -0,0 +1,309 @@
+from collections import namedtuple
+from datetime import timedelta
+import Queue
+import threading
+from timeit import default_timer
+from dht22_controller.scheduler import Scheduler
+from dht22_controller.sensor import SensorReader, DHT22_MIN_INTERVAL_S
+from dht22_controller.utils import from_seconds, now
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "TickState",
+    "Sink",
+    "InlineSink",
+    "Controller"
+]
+
+
+# what the outputs need to know after a control tick. h and t are the latest
+# readings, havg and tavg the averages the decisions were based on and the
+# rest the statistics of the sample windows.
+TickState = namedtuple('TickState', ['h', 'havg', 'hmed', 'hmin', 'hmax',
+    'humidifier_on', 'dehumidifier_on', 't', 'tavg', 'tmed', 'tmin', 'tmax',
+    'cooling_on', 'heating_on'])
+
+
+class Sink(object):
+    """
+    Runs ``func`` on its own thread for every item submitted to it, so slow
+    outputs (csv, logging, GPIO) don't hold up the control loop or each other.
+
+    With ``instruments``, how long each item waited in the queue and how long
+    ``func`` took are recorded as 'lag.<name>' and 'sink.<name>'.
+    """
+
+    def __init__(self, name, func, instruments=None):
+        self.name = name
+        self.func = func
+        self.instruments = instruments
+        self.items = Queue.Queue()
+        self.thread = threading.Thread(target=self.run, name=name)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, *args):
+        self.items.put((default_timer(), args))
+
+    def stop(self):
+        self.items.put(None)
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def run(self):
+        instruments = self.instruments
+        lag, phase = 'lag.' + self.name, 'sink.' + self.name
+        while True:
+            item = self.items.get()
+            if item is None:
+                return
+            submitted, args = item
+            started = default_timer()
+            try:
+                self.func(*args)
+            except Exception as e:
+                log.exception("exception occurred in the %s sink", self.name)
+            if instruments is not None:
+                instruments.record(lag, started - submitted)
+                instruments.stop(phase, started)
+
+
+class InlineSink(object):
+    """
+    A sink that calls ``func`` right away on the caller's thread, for
+    simulations and tests where the outputs need to happen in order.
+    """
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+
+    def start(self):
+        pass
+
+    def submit(self, *args):
+        self.func(*args)
+
+    def stop(self):
+        pass
+
+    def join(self, timeout=None):
+        pass
+
+
+class Controller(object):
+    """
+    Ties the sensor, the temperature and humidity controllers and the outputs
+    together.
+
+    Readings are taken from the latest-value cache of a
+    :class:`~dht22_controller.sensor.SensorReader` whenever it has a new one,
+    and each one triggers a control tick. Turning the cooler or
+    heater on schedules a tick for the exact moment it should be switched off,
+    and otherwise a tick runs at least every ``tick_s`` seconds, so actuators
+    are switched off on time even while the sensor is failing.
+
+    ``on_reading`` sinks are called with ``(t, tavg, h, havg)`` for every new
+    reading and ``on_tick`` sinks with a :class:`TickState` after every
+    control tick.
+
+    ``instruments`` (an
+    :class:`~dht22_controller.instrumentation.Instruments`) times the
+    sensor reads, each tick ('tick') and its decisions ('update'), and how
+    late each shutoff ran ('shutoff_late'), and is dumped to the log
+    periodically by :meth:`run`.
+
+    ``on_loop`` functions are called on the loop's thread after every
+    iteration of :meth:`run`, e.g. to act on work requested by signal
+    handlers.
+    """
+
+    def __init__(self, temperature, humidity, read, tick_s=1.,
+        sample_interval_s=DHT22_MIN_INTERVAL_S, stale_after_s=60.,
+        on_reading=(), on_tick=(), instruments=None, on_loop=()):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.tick_s = tick_s
+        self.stale_after_s = stale_after_s
+        self.instruments = instruments
+        self.sensor = SensorReader(read, min_interval_s=sample_interval_s,
+            instruments=instruments)
+        self.on_reading = list(on_reading)
+        self.on_tick = list(on_tick)
+        self.on_loop = list(on_loop)
+        self.last_reading = None
+        self.last_h = None
+        self.last_t = None
+        self.stale = False
+        self.scheduler = Scheduler()
+        self.shutoff = None
+        self.running = False
+
+    def add_readings(self):
+        """
+        Move the sensor's latest reading into the sample windows if it hasn't
+        been seen yet. Returns True if there was a new reading.
+        """
+        self.sensor.fresh.clear()
+        reading = self.sensor.latest
+        if reading is None or reading is self.last_reading:
+            self.check_stale()
+            return False
+
+        self.last_reading = reading
+        self.add_reading(reading[0], reading[1])
+        if self.stale:
+            log.info("sensor readings resumed")
+            self.stale = False
+        return True
+
+    def check_stale(self):
+        staleness = self.sensor.staleness_s()
+        if staleness is None or staleness < self.stale_after_s or self.stale:
+            return
+        self.stale = True
+        log.warning(
+            "no sensor reading for %.0fs (failure rate %.0f%%)",
+            staleness, 100. * self.sensor.failure_rate())
+
+    def add_reading(self, h, t):
+        self.humidity.add(h)
+        self.temperature.add(t)
+        self.last_h, self.last_t = h, t
+        if len(self.temperature.queue) and len(self.humidity.queue):
+            for sink in self.on_reading:
+                sink.submit(
+                    t, self.temperature.temperature_average_f(),
+                    h, self.humidity.average())
+
+    def tick(self):
+        """
+        Run one control tick.
+        """
+        instruments = self.instruments
+        if instruments is None:
+            self._tick()
+            return
+        started = instruments.start()
+        self._tick()
+        instruments.stop('tick', started)
+
+    def _tick(self):
+        self.add_readings()
+        if not len(self.temperature.queue) or not len(self.humidity.queue):
+            # nothing to control on until the first reading arrives
+            return
+
+        instruments = self.instruments
+        temperature = self.temperature
+        was_on = temperature.cooling_on or temperature.heating_on
+        if instruments is not None:
+            started = instruments.start()
+        self.humidity.update()
+        temperature.update()
+        if instruments is not None:
+            instruments.stop('update', started)
+        is_on = temperature.cooling_on or temperature.heating_on
+        if is_on and not was_on:
+            self.schedule_shutoff()
+        elif was_on and not is_on and self.shutoff is not None:
+            # switched off early (e.g. overshooting)
+            self.scheduler.cancel(self.shutoff)
+            self.shutoff = None
+
+        if not self.on_tick:
+            return
+
+        humidity, temperature = self.humidity, self.temperature
+        state = TickState(
+            self.last_h, humidity.average(), humidity.median(),
+            humidity.minimum(), humidity.maximum(),
+            humidity.humidifier_on, humidity.dehumidifier_on,
+            self.last_t, temperature.temperature_average_f(),
+            temperature.temperature_median_f(),
+            temperature.temperature_min_f(), temperature.temperature_max_f(),
+            temperature.cooling_on, temperature.heating_on)
+        for sink in self.on_tick:
+            sink.submit(state)
+
+    def schedule_shutoff(self):
+        """
+        Schedule a tick for when the cooler or heater that was just turned on
+        has run for as long as it should.
+        """
+        temperature = self.temperature
+        # the same sum update() compares the clock with, rounded up to the
+        # microsecond so the tick at the deadline is never too early
+        if temperature.cooling_on:
+            at = from_seconds(
+                temperature.cooler_enabled_at + temperature.cool_for_s)
+        else:
+            at = from_seconds(
+                temperature.heater_enabled_at + temperature.heat_for_s)
+        self.shutoff = self.scheduler.schedule(at, self._shutoff, at)
+
+    def _shutoff(self, at):
+        if self.instruments is not None:
+            self.instruments.record(
+                'shutoff_late', (now() - at).total_seconds())
+        self.tick()
+
+    def next_wakeup(self):
+        """
+        When the loop should wake up next if no reading arrives first.
+        """
+        wakeup = now() + timedelta(seconds=self.tick_s)
+        deadline = self.scheduler.next_deadline()
+        if deadline is not None and deadline < wakeup:
+            return deadline
+        return wakeup
+
+    def wait(self, until):
+        """
+        Sleep until ``until`` or until the sensor publishes a reading,
+        whichever comes first.
+        """
+        timeout = (until - now()).total_seconds()
+        if timeout <= 0:
+            return
+        self.sensor.fresh.wait(timeout)
+
+    def start(self):
+        for sink in self.on_reading + self.on_tick:
+            sink.start()
+        self.sensor.start()
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self.sensor.stop()
+        for sink in self.on_reading + self.on_tick:
+            sink.stop()
+        self.sensor.join(5.)
+        for sink in self.on_reading + self.on_tick:
+            sink.join(5.)
+
+    def run(self):
+        """
+        Tick forever (or until :meth:`stop` is called).
+        """
+        self.start()
+        try:
+            while self.running:
+                # a due shutoff timer ticks itself
+                if not self.scheduler.run_due(now()):
+                    self.tick()
+                if self.instruments is not None:
+                    self.instruments.maybe_dump()
+                for func in self.on_loop:
+                    func()
+                self.wait(self.next_wakeup())
+        finally:
+            self.stop()
@@ -1,6 +1,7 @@
 import csv
 from dht22_controller.utils import now
 from datetime import datetime
+import json
 import os
 
 
@@ -10,22 +11,76 @@ log = logging.getLogger(__name__)
 
 __all__ = [
     "load",
-    "save"
+    "save",
+    "index_filename",
+    "refresh_index"
 ]
 
 
+def index_filename(filename):
+    """
+    The sidecar index kept next to a learn file.
+    """
+    return filename + '.idx'
+
+
+def _read_index(filename):
+    """
+    Returns ``(size, targets)`` where ``size`` is how much of the learn file
+    has been indexed and ``targets`` maps each target to the seconds from its
+    latest row.
+    """
+    try:
+        with open(index_filename(filename), 'r') as idxfile:
+            index = json.load(idxfile)
+        return index['size'], dict(
+            (target, seconds) for target, seconds in index['targets'])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        # missing or unreadable, so it'll be rebuilt from scratch
+        return 0, {}
+
+
+def _write_index(filename, size, targets):
+    idxname = index_filename(filename)
+    tmpname = idxname + '.tmp'
+    with open(tmpname, 'w') as idxfile:
+        json.dump({
+            'size': size,
+            'targets': sorted(targets.items())
+        }, idxfile)
+    os.rename(tmpname, idxname)
+
+
+def refresh_index(filename):
+    """
+    Bring the index for ``filename`` up to date and return the target to
+    seconds mapping. Only rows appended since the index was last written are
+    read, unless the learn file shrank (e.g. it was compacted) in which case
+    the whole file is re-indexed.
+    """
+    size, targets = _read_index(filename)
+    file_size = os.path.getsize(filename)
+    if size == file_size:
+        return targets
+    if size > file_size:
+        size, targets = 0, {}
+
+    with open(filename, 'rb') as csvfile:
+        csvfile.seek(size)
+        for row in csv.reader(csvfile):
+            if not row: continue
+            targets[float(row[2])] = float(row[4])
+
+    _write_index(filename, file_size, targets)
+    return targets
+
+
 def load(filename, default_seconds, target):
     try:
         if not os.path.isfile(filename):
             return default_seconds
 
-        seconds = default_seconds
-        with open(filename, 'r') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                file_target = float(row[2])
-                if file_target == target:
-                    seconds = float(row[4])
+        seconds = refresh_index(filename).get(target, default_seconds)
     except Exception as e:
         log.exception(
             "exception occurred. filename=%s, default_seconds=%s, target=%s",
@@ -45,6 +100,7 @@ def save(filename, starting_value, target, result, seconds):
                 '{:.1f}'.format(target),
                 '{:.2f}'.format(result),
                 '{:.1f}'.format(seconds)])
+        refresh_index(filename)
     except Exception as e:
         log.exception(
             "exception occurred. filename=%s, starting_value=%s, target=%s, " +
@@ -0,0 +1,222 @@
+import BaseHTTPServer
+import os
+import SocketServer
+import threading
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "MetricsExporter",
+    "parse_address"
+]
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (metric, TickState field, help)
+STATE_GAUGES = [
+    ('dht22_temperature_f', 't', "Latest temperature reading."),
+    ('dht22_temperature_average_f', 'tavg',
+        "Average temperature over the sample window."),
+    ('dht22_humidity_percent', 'h', "Latest humidity reading."),
+    ('dht22_humidity_average_percent', 'havg',
+        "Average humidity over the sample window."),
+    ('dht22_cooling_on', 'cooling_on', "Whether the cooler is on."),
+    ('dht22_heating_on', 'heating_on', "Whether the heater is on."),
+    ('dht22_humidifier_on', 'humidifier_on', "Whether the humidifier is on."),
+    ('dht22_dehumidifier_on', 'dehumidifier_on',
+        "Whether the dehumidifier is on."),
+]
+
+
+def parse_address(address):
+    """
+    ``'unix:/path/to/socket'`` or ``'[host:]port'`` (the host defaults to
+    localhost), or a bare port number as json gives it. Returns
+    ``('unix', path)`` or ``('tcp', (host, port))``.
+    """
+    address = str(address)
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def _format(value):
+    if value is True or value is False:
+        return '1' if value else '0'
+    return repr(float(value))
+
+
+class _Metrics(object):
+    # builds the exposition text, one metric family at a time
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help):
+        self.lines.append('# HELP {} {}'.format(name, help))
+        self.lines.append('# TYPE {} {}'.format(name, kind))
+
+    def sample(self, name, value, labels=None):
+        if value is None:
+            return
+        if labels:
+            name = '{}{{{}}}'.format(name, ','.join(
+                '{}="{}"'.format(key, value) for key, value in labels))
+        self.lines.append('{} {}'.format(name, _format(value)))
+
+    def gauge(self, name, value, help):
+        if value is None:
+            return
+        self.family(name, 'gauge', help)
+        self.sample(name, value)
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+class MetricsExporter(object):
+    """
+    Serves the controller's state in the Prometheus text format at
+    ``/metrics``, over HTTP on a local TCP port or a Unix socket (see
+    :func:`parse_address`).
+
+    Everything comes from memory: the latest
+    :class:`~dht22_controller.controller.TickState` (add :meth:`update` as an
+    ``on_tick`` sink; keeping it is a single assignment), the temperature
+    controller's run times, the sensor's counters and, if given, the
+    :class:`~dht22_controller.instrumentation.Instruments` histograms.
+    """
+
+    def __init__(self, controller, address='127.0.0.1:9122', instruments=None):
+        self.controller = controller
+        self.address = address
+        self.instruments = instruments
+        self.state = None
+        self.server = None
+        self.thread = None
+
+    def update(self, state):
+        self.state = state
+
+    def render(self):
+        """
+        The metrics as exposition text.
+        """
+        metrics = _Metrics()
+        state = self.state
+        if state is not None:
+            for name, field, help in STATE_GAUGES:
+                metrics.gauge(name, getattr(state, field), help)
+
+        temperature = self.controller.temperature
+        metrics.gauge('dht22_cool_for_seconds', temperature.cool_for_s,
+            "How long the cooler runs for each time it's turned on.")
+        metrics.gauge('dht22_heat_for_seconds', temperature.heat_for_s,
+            "How long the heater runs for each time it's turned on.")
+
+        stats = self.controller.sensor.stats()
+        metrics.family('dht22_sensor_reads_total', 'counter',
+            "Sensor reads attempted.")
+        metrics.sample('dht22_sensor_reads_total', stats['reads'])
+        metrics.family('dht22_sensor_failures_total', 'counter',
+            "Sensor reads that failed.")
+        metrics.sample('dht22_sensor_failures_total', stats['failures'])
+        metrics.gauge('dht22_sensor_consecutive_failures',
+            stats['consecutive_failures'],
+            "Sensor reads that have failed in a row.")
+        metrics.gauge('dht22_sensor_staleness_seconds', stats['staleness_s'],
+            "Seconds since the last valid reading.")
+
+        if self.instruments is not None:
+            summary = self.instruments.summary()
+            metrics.family('dht22_phase_seconds', 'summary',
+                "How long each phase of the control loop took (quantiles "
+                "over the recent window).")
+            for phase in sorted(summary):
+                s = summary[phase]
+                labels = [('phase', phase)]
+                for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'),
+                        ('0.99', 'p99')):
+                    metrics.sample('dht22_phase_seconds', s[key],
+                        labels + [('quantile', quantile)])
+                metrics.sample('dht22_phase_seconds_sum', s['sum'], labels)
+                metrics.sample('dht22_phase_seconds_count', s['count'], labels)
+            metrics.family('dht22_phase_max_seconds', 'gauge',
+                "The longest each phase took over the recent window.")
+            for phase in sorted(summary):
+                metrics.sample('dht22_phase_max_seconds', summary[phase]['max'],
+                    [('phase', phase)])
+
+        return metrics.text()
+
+    def start(self):
+        kind, address = parse_address(self.address)
+        handler = _handler(self)
+        if kind == 'unix':
+            if os.path.exists(address):
+                # left over from a previous run
+                os.remove(address)
+            self.server = _UnixHTTPServer(address, handler)
+        else:
+            self.server = _HTTPServer(address, handler)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name='metrics')
+        self.thread.daemon = True
+        self.thread.start()
+        log.info("serving metrics on %s", self.address)
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(5.)
+        kind, address = parse_address(self.address)
+        if kind == 'unix' and os.path.exists(address):
+            os.remove(address)
+        self.server = None
+
+
+class _HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixHTTPServer(SocketServer.ThreadingMixIn,
+        SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+def _handler(exporter):
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            try:
+                body = exporter.render().encode('utf-8')
+            except Exception as e:
+                log.exception("exception occurred rendering the metrics")
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            # unix socket clients don't have an address
+            return self.client_address[0] if self.client_address else 'unix'
+
+        def log_message(self, format, *args):
+            log.debug("%s %s", self.address_string(), format % args)
+
+    return Handler
@@ -0,0 +1,401 @@
+from dht22_controller.utils import clock
+
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "WindowArray",
+    "TemperatureFleet",
+    "HumidityFleet",
+    "Fleet"
+]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for fleet simulations")
+
+
+def _per_zone(n, value, dtype=None):
+    """
+    ``value`` (a scalar or a sequence with one value per zone) as a new
+    array of ``n`` values.
+    """
+    array = np.empty(n, dtype=np.float64 if dtype is None else dtype)
+    array[...] = value
+    return array
+
+
+def _configs(n, config):
+    # a single config shared by every zone, or one per zone
+    if isinstance(config, (list, tuple)):
+        if len(config) != n:
+            raise ValueError(
+                "expected {} configs, got {}".format(n, len(config)))
+        return list(config)
+    return [config] * n
+
+
+class WindowArray(object):
+    """
+    :class:`~dht22_controller.capped_queue.CappedQueue`'s ring and running
+    sum for ``n`` zones at once, as ``(n, cap)`` and ``(n,)`` arrays.
+
+    The adds, subtracts and periodic re-sums happen in the same order as
+    CappedQueue's, so the averages are bit for bit the same.
+    """
+
+    def __init__(self, n, cap=10):
+        _require_numpy()
+        self.n = n
+        self.cap = cap
+        self.values = np.zeros((n, cap), dtype=np.float64)
+        self.total = np.zeros(n, dtype=np.float64)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.head = np.zeros(n, dtype=np.int64)
+        self.puts = np.zeros(n, dtype=np.int64)
+
+    def put(self, items, mask=None):
+        """
+        Add one item to the window of each zone in ``mask`` (all of them by
+        default).
+        """
+        items = np.asarray(items, dtype=np.float64)
+        zones = np.arange(self.n) if mask is None else np.flatnonzero(mask)
+        if not zones.size:
+            return
+        items = items[zones] if items.ndim else np.repeat(items, zones.size)
+
+        head = self.head[zones]
+        full = self.count[zones] == self.cap
+        total = self.total[zones]
+        total[full] -= self.values[zones[full], head[full]]
+        self.count[zones[~full]] += 1
+        self.values[zones, head] = items
+        self.total[zones] = total + items
+        self.head[zones] = (head + 1) % self.cap
+
+        puts = self.puts[zones] + 1
+        resum = puts >= self.cap
+        puts[resum] = 0
+        self.puts[zones] = puts
+        if resum.any():
+            # sum(array) adds the slots in order, starting from 0
+            zones = zones[resum]
+            total = np.zeros(zones.size, dtype=np.float64)
+            for slot in range(self.cap):
+                total += self.values[zones, slot]
+            self.total[zones] = total
+
+    def average(self):
+        """
+        The average of each window (nan for an empty one).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.total / self.count
+
+
+class _ZoneArrays(object):
+
+    def __init__(self, n, queue_size):
+        _require_numpy()
+        self.n = n
+        self.queue = WindowArray(n, cap=queue_size)
+
+    def _ago(self, minutes):
+        # times are float seconds from utils.clock(), and the sums and
+        # differences are the scalar classes' so they compare exactly alike
+        return clock() - minutes * 60.
+
+
+class TemperatureFleet(_ZoneArrays):
+    """
+    :class:`~dht22_controller.temperature.Temperature`'s bang-bang,
+    cooldown and learning rules over ``n`` zones held as arrays, stepped
+    together by :meth:`update`.
+
+    Every setting can be a scalar or a sequence with a value per zone, and
+    ``config`` a single config or a list of them. Like a Temperature with
+    ``debug=True`` nothing is learned from or written to the learn files, so
+    ``cool_for_s`` and ``heat_for_s`` are used as given.
+    """
+
+    def __init__(self, n, config, queue_size=10, cool_for_s=20.,
+        heat_for_s=20., has_cooler=False, has_heater=False,
+        recently_minutes=5., learn_multiplier=3.0, min_cool_time_s=10.,
+        max_cool_time_s=60. * 5., min_heat_time_s=3., max_heat_time_s=60. * 5.):
+        super(TemperatureFleet, self).__init__(n, queue_size)
+        configs = _configs(n, config)
+        self.min_temp_f = _per_zone(n, [c.min_temp_f for c in configs])
+        self.max_temp_f = _per_zone(n, [c.max_temp_f for c in configs])
+        self.temp_pad = _per_zone(n, [c.temp_pad for c in configs])
+
+        self.cool_for_s = _per_zone(n, cool_for_s)
+        self.heat_for_s = _per_zone(n, heat_for_s)
+        self.has_cooler = _per_zone(n, has_cooler, dtype=bool)
+        self.has_heater = _per_zone(n, has_heater, dtype=bool)
+        self.recently_minutes = _per_zone(n, recently_minutes)
+        self.learn_multiplier = _per_zone(n, learn_multiplier)
+        self.min_cool_time_s = _per_zone(n, min_cool_time_s)
+        self.max_cool_time_s = _per_zone(n, max_cool_time_s)
+        self.min_heat_time_s = _per_zone(n, min_heat_time_s)
+        self.max_heat_time_s = _per_zone(n, max_heat_time_s)
+
+        self.cooling_on = np.zeros(n, dtype=bool)
+        self.heating_on = np.zeros(n, dtype=bool)
+        self.cooler_enabled_at = np.zeros(n, dtype=np.float64)
+        self.heater_enabled_at = np.zeros(n, dtype=np.float64)
+        self.last_cooling = self._ago(self.recently_minutes)
+        self.last_heating = self._ago(self.recently_minutes)
+        # nan until the first update, like the scalar class's None
+        self.last_minimum = np.full(n, np.nan)
+        self.last_maximum = np.full(n, np.nan)
+        self.waiting_for_temp_increase = np.zeros(n, dtype=bool)
+        self.waiting_for_temp_decrease = np.zeros(n, dtype=bool)
+        self.start_cool_temp = np.full(n, np.nan)
+        self.start_heat_temp = np.full(n, np.nan)
+
+    def add(self, temperatures, mask=None):
+        """
+        Add a temperature for each zone in ``mask``, skipping readings that
+        are out of range.
+        """
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            valid = (temperatures >= 0.) & (temperatures <= 110.)
+        if mask is not None:
+            valid &= mask
+        self.queue.put(temperatures, valid)
+
+    def temperature_average_f(self):
+        return self.queue.average()
+
+    def _recently(self, at, last, minutes):
+        return (at - last) <= minutes * 60.
+
+    def update(self, mask=None):
+        """
+        Update the flags of each zone in ``mask`` (every zone with readings by
+        default) from its window, as Temperature.update() would.
+        """
+        # zones without readings are nan, and are masked out anyway
+        with np.errstate(invalid='ignore'):
+            self._update(mask)
+
+    def _update(self, mask):
+        at = clock()
+        active = self.queue.count > 0
+        if mask is not None:
+            active &= mask
+        t = self.temperature_average_f()
+
+        last_max = self.last_maximum
+        last_min = self.last_minimum
+        last_max[active & np.isnan(last_max)] = t[active & np.isnan(last_max)]
+        last_min[active & np.isnan(last_min)] = t[active & np.isnan(last_min)]
+        last_max[active] = np.maximum(t[active], last_max[active])
+        last_min[active] = np.minimum(t[active], last_min[active])
+
+        cooling = active & self.cooling_on
+        heating = active & ~self.cooling_on & self.heating_on
+        idle = active & ~self.cooling_on & ~self.heating_on
+
+        # running: switch off once the time is up or when overshooting
+        overshooting = t < self.min_temp_f
+        off = cooling & ((at >= self.cooler_enabled_at + self.cool_for_s) |
+            overshooting)
+        self.last_cooling[off] = at
+        self.cooling_on[off] = False
+        self.waiting_for_temp_increase[off] = True
+        over = off & overshooting
+        self.cool_for_s[over] = at - self.cooler_enabled_at[over]
+
+        overshooting = t > self.max_temp_f
+        off = heating & ((at >= self.heater_enabled_at + self.heat_for_s) |
+            overshooting)
+        self.last_heating[off] = at
+        self.heating_on[off] = False
+        self.waiting_for_temp_decrease[off] = True
+        over = off & overshooting
+        self.heat_for_s[over] = at - self.heater_enabled_at[over]
+
+        # just ran the cooler: learn once the temperature is increasing
+        waiting_up = idle & self.waiting_for_temp_increase
+        learn = waiting_up & \
+            ~self._recently(at, self.last_cooling, 1.) & \
+            ~(t < last_min + .2)
+        self.waiting_for_temp_increase[learn] = False
+        diff = self.learn_multiplier * (self.min_temp_f - last_min)
+        self.cool_for_s[learn] = np.minimum(self.max_cool_time_s,
+            np.maximum(self.min_cool_time_s, self.cool_for_s - diff))[learn]
+
+        # just ran the heater: learn once the temperature is decreasing
+        waiting_down = idle & ~waiting_up & self.waiting_for_temp_decrease
+        learn = waiting_down & \
+            ~self._recently(at, self.last_heating, 1.) & \
+            ~(t > last_max - .2)
+        self.waiting_for_temp_decrease[learn] = False
+        diff = self.learn_multiplier * (self.max_temp_f - last_max)
+        self.heat_for_s[learn] = np.minimum(self.max_heat_time_s,
+            np.maximum(self.min_heat_time_s, self.heat_for_s + diff))[learn]
+
+        ready = idle & ~waiting_up & ~waiting_down
+        heated_recently = self._recently(
+            at, self.last_heating, self.recently_minutes)
+        cooled_recently = self._recently(
+            at, self.last_cooling, self.recently_minutes)
+
+        # warm: cool, unless a heater or cooler just ran
+        warm = ready & (t >= self.max_temp_f)
+        cool = warm & ~heated_recently & \
+            ~self._recently(at, self.last_cooling, 2.5) & self.has_cooler
+        self.cooling_on[cool] = True
+        self.cooler_enabled_at[cool] = at
+        last_min[cool] = t[cool]
+        self.start_cool_temp[cool] = t[cool]
+        self.cool_for_s[cool] = np.minimum(self.max_cool_time_s,
+            np.maximum(self.min_cool_time_s, self._boost(
+                self.cool_for_s, t - self.max_temp_f)))[cool]
+
+        # cold: heat, unless a heater or cooler just ran
+        cold = ready & ~warm & (t <= self.min_temp_f)
+        heat = cold & ~self._recently(at, self.last_heating, 2.5) & \
+            ~cooled_recently & self.has_heater
+        self.heating_on[heat] = True
+        self.heater_enabled_at[heat] = at
+        last_max[heat] = t[heat]
+        self.start_heat_temp[heat] = t[heat]
+        self.heat_for_s[heat] = np.minimum(self.max_heat_time_s,
+            np.maximum(self.min_heat_time_s, self._boost(
+                self.heat_for_s, self.min_temp_f - t)))[heat]
+
+    def _boost(self, run_s, diff, max_difference=0.25):
+        # learn.time_boost: run longer when starting far outside the band
+        return np.where(diff >= max_difference,
+            run_s + diff * (run_s / (self.temp_pad * 2.)), run_s)
+
+
+class HumidityFleet(_ZoneArrays):
+    """
+    :class:`~dht22_controller.humidity.Humidity`'s rules over ``n`` zones
+    held as arrays. See :class:`TemperatureFleet`.
+    """
+
+    def __init__(self, n, config, queue_size=10, has_humidifier=False,
+        has_dehumidifier=False, recently_minutes=5.):
+        super(HumidityFleet, self).__init__(n, queue_size)
+        configs = _configs(n, config)
+        self.min_humidity = _per_zone(n, [c.min_humidity for c in configs])
+        self.max_humidity = _per_zone(n, [c.max_humidity for c in configs])
+
+        self.has_humidifier = _per_zone(n, has_humidifier, dtype=bool)
+        self.has_dehumidifier = _per_zone(n, has_dehumidifier, dtype=bool)
+        self.recently_minutes = _per_zone(n, recently_minutes)
+
+        self.humidifier_on = np.zeros(n, dtype=bool)
+        self.dehumidifier_on = np.zeros(n, dtype=bool)
+        self.humidifier_enabled_at = np.zeros(n, dtype=np.float64)
+        self.dehumidifier_enabled_at = np.zeros(n, dtype=np.float64)
+        self.last_humidified = self._ago(self.recently_minutes)
+        self.last_dehumidified = self._ago(self.recently_minutes)
+        self.last_minimum = np.full(n, np.nan)
+        self.last_maximum = np.full(n, np.nan)
+        self.start_humidifier_value = np.full(n, np.nan)
+        self.start_dehumidifier_value = np.full(n, np.nan)
+
+    def add(self, humidities, mask=None):
+        humidities = np.asarray(humidities, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            valid = (humidities >= 0.) & (humidities <= 100.)
+        if mask is not None:
+            valid &= mask
+        self.queue.put(humidities, valid)
+
+    def average(self):
+        return self.queue.average()
+
+    def update(self, mask=None):
+        """
+        Update the flags of each zone in ``mask`` (every zone with readings by
+        default) from its window, as Humidity.update() would.
+        """
+        with np.errstate(invalid='ignore'):
+            self._update(mask)
+
+    def _update(self, mask):
+        at = clock()
+        active = self.queue.count > 0
+        if mask is not None:
+            active &= mask
+        h = self.average()
+
+        last_max = self.last_maximum
+        last_min = self.last_minimum
+        last_max[active & np.isnan(last_max)] = h[active & np.isnan(last_max)]
+        last_min[active & np.isnan(last_min)] = h[active & np.isnan(last_min)]
+        last_max[active] = np.maximum(h[active], last_max[active])
+        last_min[active] = np.minimum(h[active], last_min[active])
+
+        humidifying = active & self.humidifier_on
+        dehumidifying = active & ~self.humidifier_on & self.dehumidifier_on
+        idle = active & ~self.humidifier_on & ~self.dehumidifier_on
+        recently = self.recently_minutes * 60.
+
+        off = humidifying & ~(h < self.max_humidity)
+        self.last_humidified[off] = at
+        self.humidifier_on[off] = False
+
+        off = dehumidifying & ~(h > self.min_humidity)
+        self.last_dehumidified[off] = at
+        self.dehumidifier_on[off] = False
+
+        dry = idle & (h <= self.min_humidity)
+        on = dry & ~((at - self.last_dehumidified) <= recently) & \
+            self.has_humidifier
+        self.humidifier_on[on] = True
+        self.humidifier_enabled_at[on] = at
+        last_max[on] = h[on]
+        self.start_humidifier_value[on] = h[on]
+
+        humid = idle & ~dry & (h >= self.max_humidity)
+        on = humid & ~((at - self.last_humidified) <= recently) & \
+            self.has_dehumidifier
+        self.dehumidifier_on[on] = True
+        self.dehumidifier_enabled_at[on] = at
+        last_min[on] = h[on]
+        self.start_dehumidifier_value[on] = h[on]
+
+
+class Fleet(object):
+    """
+    Steps ``n`` zones the way :class:`~dht22_controller.controller.Controller`
+    steps one: a zone is only controlled once both of its windows have a
+    reading, and humidity is updated before temperature.
+    """
+
+    def __init__(self, temperature, humidity):
+        if temperature.n != humidity.n:
+            raise ValueError("the fleets have different numbers of zones")
+        self.n = temperature.n
+        self.temperature = temperature
+        self.humidity = humidity
+
+    def add(self, h, t, mask=None):
+        self.humidity.add(h, mask)
+        self.temperature.add(t, mask)
+
+    def tick(self, mask=None):
+        ready = (self.temperature.queue.count > 0) & \
+            (self.humidity.queue.count > 0)
+        if mask is not None:
+            ready &= mask
+        self.humidity.update(ready)
+        self.temperature.update(ready)
@@ -0,0 +1,176 @@
+from dht22_controller.model import ChamberModel
+from dht22_controller.query import read_range
+from dht22_controller.temperature import c_to_f
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "DHT22Sensor",
+    "SimulatedSensor",
+    "ReplaySensor",
+    "GpioRelay",
+    "SimulatedRelay",
+    "NullRelay",
+    "create_backends"
+]
+
+
+# ----------------------------------------------------------------------------
+# sensors: callables returning (humidity, temperature in F), or (None, None)
+# when a reading couldn't be taken
+# ----------------------------------------------------------------------------
+
+
+class DHT22Sensor(object):
+    """
+    A real DHT22 on a Raspberry Pi.
+    """
+
+    def __init__(self, pin):
+        # only importable on a Pi, so don't require it until it's used
+        import Adafruit_DHT
+        self.dht = Adafruit_DHT
+        self.pin = pin
+
+    def __call__(self):
+        h, t = self.dht.read(self.dht.DHT22, self.pin)
+        if h is None or t is None:
+            return (None, None)
+        else:
+            return (float(h), c_to_f(float(t)))
+
+
+class SimulatedSensor(object):
+    """
+    Reads a :class:`~dht22_controller.model.ChamberModel`.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self):
+        return self.model.read()
+
+
+class ReplaySensor(object):
+    """
+    Replays the readings recorded in a data.csv file, one per call. Once the
+    file runs out it either starts over (``loop``) or fails every read.
+    """
+
+    def __init__(self, filename, start=None, end=None, loop=False):
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.loop = loop
+        self.rows = self._rows()
+
+    def _rows(self):
+        return read_range(self.filename, self.start, self.end)
+
+    def __call__(self):
+        try:
+            row = next(self.rows)
+        except StopIteration:
+            if not self.loop:
+                return (None, None)
+            self.rows = self._rows()
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                return (None, None)
+        # (timestamp, t, tavg, h, havg)
+        return (row[3], row[1])
+
+
+# ----------------------------------------------------------------------------
+# relays: objects with a set(on) method
+# ----------------------------------------------------------------------------
+
+
+class GpioRelay(object):
+    """
+    A relay on a Raspberry Pi GPIO pin (BCM numbering).
+
+    ``active_low`` relays are switched on by driving the pin low, which is
+    what's working for the current sockets (reversed polarity?).
+    """
+
+    def __init__(self, pin, active_low=True):
+        import RPi.GPIO as g
+        self.g = g
+        self.pin = pin
+        self.active_low = active_low
+        g.setmode(g.BCM)
+        g.setup(pin, g.OUT)
+
+    def set(self, on):
+        self.g.output(self.pin, bool(on) != self.active_low)
+
+
+class SimulatedRelay(object):
+    """
+    Switches an actuator of a :class:`~dht22_controller.model.ChamberModel`.
+    """
+
+    def __init__(self, model, actuator):
+        self.model = model
+        self.actuator = actuator
+
+    def set(self, on):
+        self.model.set(self.actuator, on)
+
+
+class NullRelay(object):
+    """
+    A relay that isn't connected to anything.
+    """
+
+    def set(self, on):
+        pass
+
+
+def create_backends(conf, model=None):
+    """
+    Create the sensor and the cooler and dehumidifier relays chosen by the
+    config's ``sensor_backend`` and ``relay_backend``. Returns
+    ``(sensor, cool_relay, dehumidify_relay)``; a relay is None when its pin
+    isn't configured.
+
+    The simulated backends share ``model`` (a new
+    :class:`~dht22_controller.model.ChamberModel` by default) so that the
+    relays affect what the sensor reads.
+    """
+    if model is None and 'simulated' in (conf.sensor_backend,
+            conf.relay_backend):
+        model = ChamberModel(**conf.simulation)
+
+    if conf.sensor_backend == 'dht22':
+        sensor = DHT22Sensor(conf.pin)
+    elif conf.sensor_backend == 'simulated':
+        sensor = SimulatedSensor(model)
+    elif conf.sensor_backend == 'replay':
+        sensor = ReplaySensor(conf.replay_file, loop=True)
+    else:
+        raise ValueError(
+            "unknown sensor_backend: {}".format(conf.sensor_backend))
+
+    def relay(pin, actuator):
+        if pin is None:
+            return None
+        if conf.relay_backend == 'gpio':
+            return GpioRelay(pin)
+        elif conf.relay_backend == 'simulated':
+            return SimulatedRelay(model, actuator)
+        elif conf.relay_backend == 'null':
+            return NullRelay()
+        raise ValueError(
+            "unknown relay_backend: {}".format(conf.relay_backend))
+
+    return (
+        sensor,
+        relay(conf.cool_pin, 'cooling'),
+        relay(conf.dehumidity_pin, 'dehumidifying'))
@@ -1,6 +1,5 @@
 from dht22_controller.capped_queue import CappedQueue
-from dht22_controller.utils import now, clip
-from datetime import timedelta
+from dht22_controller.utils import clock, clip
 
 
 import logging
@@ -13,6 +12,8 @@ class Humidity(object):
         has_dehumidifier=False, recently_minutes=5.):
         self.queue = CappedQueue(cap=queue_size)
         self.config = config
+        # what update() reads its thresholds from
+        self.settings = config.snapshot()
         self.humidifier_on = False
         self.dehumidifier_on = False
         self.has_humidifier = has_humidifier
@@ -22,77 +23,126 @@ class Humidity(object):
         self.dehumidifier_enabled_at = None
         self.start_humidifier_value = None
         self.start_dehumidifier_value = None
-        self.last_humidified = now() - timedelta(minutes=recently_minutes)
-        self.last_dehumidified = now() - timedelta(minutes=recently_minutes)
+        # times are float seconds from utils.clock()
+        self.last_humidified = clock() - recently_minutes * 60.
+        self.last_dehumidified = clock() - recently_minutes * 60.
         self.last_minimum = None
         self.last_maximum = None
         self.debug = debug
 
+    # what get_state() saves besides the sample window
+    STATE = ('humidifier_on', 'dehumidifier_on', 'humidifier_enabled_at',
+        'dehumidifier_enabled_at', 'start_humidifier_value',
+        'start_dehumidifier_value', 'last_humidified', 'last_dehumidified',
+        'last_minimum', 'last_maximum')
+
+    # the part of the state that only means anything while the readings it
+    # came from are recent
+    WINDOW_STATE = ('last_minimum', 'last_maximum', 'start_humidifier_value',
+        'start_dehumidifier_value')
+
+    def get_state(self):
+        state = dict((name, getattr(self, name)) for name in self.STATE)
+        state['window'] = self.queue.tolist()
+        return state
+
+    def set_state(self, state):
+        for name in self.STATE:
+            if name in state:
+                setattr(self, name, state[name])
+        self.queue = CappedQueue(cap=self.queue.cap)
+        for value in state.get('window', [])[-self.queue.cap:]:
+            self.queue.put(value)
+
     def add(self, humidity):
         if humidity < 0. or humidity > 100.:
             return
 
         self.queue.put(humidity)
 
-    def change_config(config):
-        self.config = config
+    def change_config(self, config):
+        self.prepare_config(config)()
+
+    def prepare_config(self, config):
+        settings = config.snapshot()
+
+        def apply():
+            self.config = config
+            self.settings = settings
+        return apply
 
     def average(self):
-        l = self.queue.tolist()
-        return sum(l) / float(len(l))
+        return self.queue.average()
+
+    def minimum(self):
+        return self.queue.minimum()
+
+    def maximum(self):
+        return self.queue.maximum()
 
-    def humidified_recently(self):
+    def median(self):
+        return self.queue.median()
+
+    def humidified_recently(self, at=None):
         """
         Have we humidified recently?
         """
-        return (now() - self.last_humidified) <= timedelta(
-            minutes=self.recently_minutes)
+        return (clock() if at is None else at) - self.last_humidified <= \
+            self.recently_minutes * 60.
 
-    def dehumidified_recently(self):
+    def dehumidified_recently(self, at=None):
         """
         Have we dehumidified recently?
         """
-        return (now() - self.last_dehumidified) <= timedelta(minutes=
-            self.recently_minutes)
+        return (clock() if at is None else at) - self.last_dehumidified <= \
+            self.recently_minutes * 60.
 
     def update(self):
+        at = clock()
+        settings = self.settings
         h = self.average()
+        if h is None:
+            # no readings yet
+            return
         if self.last_maximum is None: self.last_maximum = h
         if self.last_minimum is None: self.last_minimum = h
         self.last_maximum = max(h, self.last_maximum)
         self.last_minimum = min(h, self.last_minimum)
 
-        log.debug('h=%.02f max=%.02f', h, self.config.max_humidity)
+        log.debug('h=%.02f max=%.02f', h, settings.max_humidity)
         if self.humidifier_on:
-            if h < self.config.max_humidity:
+            if h < settings.max_humidity:
                 return
-            self.last_humidified = now()
+            self.last_humidified = at
             self.humidifier_on = False
         elif self.dehumidifier_on:
-            if h > self.config.min_humidity:
+            if h > settings.min_humidity:
                 return
-            self.last_dehumidified = now()
+            self.last_dehumidified = at
             self.dehumidifier_on = False
-        elif h <= self.config.min_humidity:
-            if self.dehumidified_recently(): return
+        elif h <= settings.min_humidity:
+            if self.dehumidified_recently(at): return
             if not self.has_humidifier: return
             # if it's dry and we weren't just running the dehumidifier, turn
             # our humidifier on
             self.humidifier_on = True
-            self.humidifier_enabled_at = now()
+            self.humidifier_enabled_at = at
             self.last_maximum = h
             self.start_humidifier_value = h
-        elif h >= self.config.max_humidity:
-            if self.humidified_recently(): return
+        elif h >= settings.max_humidity:
+            if self.humidified_recently(at): return
             if not self.has_dehumidifier: return
             # if it's humid and we weren't just running the humidifier, turn
             # our dehumidifier on
             self.dehumidifier_on = True
-            self.dehumidifier_enabled_at = now()
+            self.dehumidifier_enabled_at = at
             self.last_minimum = h
             self.start_dehumidifier_value = h
         else:
             pass
 
     def __str__(self):
-        return "humidity={:.1f}%".format(self.average())
+        h = self.average()
+        if h is None:
+            return "humidity=None"
+        return "humidity={:.1f}%".format(h)
@@ -0,0 +1,143 @@
+from array import array
+import math
+from timeit import default_timer
+from dht22_controller.utils import now
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "RollingHistogram",
+    "Instruments"
+]
+
+
+class RollingHistogram(object):
+    """
+    The last ``size`` durations of a phase, kept in a ring of doubles.
+    Recording is just a store into the ring, and the percentiles are only
+    worked out (by sorting a copy) when they're asked for.
+    """
+
+    __slots__ = ('size', 'count', 'total', 'max_ever', '_values', '_head')
+
+    def __init__(self, size=1024):
+        self.size = size
+        # every sample ever recorded, not just the window
+        self.count = 0
+        self.total = 0.
+        self.max_ever = 0.
+        self._values = array('d', [0.] * size)
+        self._head = 0
+
+    def add(self, value):
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.size
+        self.count += 1
+        self.total += value
+        if value > self.max_ever:
+            self.max_ever = value
+
+    def values(self):
+        """
+        The samples in the window, in no particular order.
+        """
+        if self.count < self.size:
+            return self._values[:self.count].tolist()
+        return self._values.tolist()
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """
+        ``count``, ``sum`` and ``max_ever`` of every sample along with ``max``,
+        ``p50``, ``p95`` and ``p99`` (nearest rank) of the window. The
+        percentiles and max are None until something is recorded.
+        """
+        values = sorted(self.values())
+        result = {'count': self.count, 'sum': self.total,
+            'max_ever': self.max_ever}
+        for p in percentiles:
+            key = 'p{}'.format(p)
+            if not values:
+                result[key] = None
+                continue
+            rank = int(math.ceil(p / 100. * len(values))) - 1
+            result[key] = values[max(0, rank)]
+        result['max'] = values[-1] if values else None
+        return result
+
+
+class Instruments(object):
+    """
+    Rolling histograms of how long each phase of the control loop takes,
+    e.g. 'sensor_read', 'update', 'tick', 'sink.csv' and 'shutoff_late'.
+
+    Each phase is recorded from a single thread, so recording needs no lock.
+    :meth:`dump` logs the percentiles, and :meth:`maybe_dump` does so every
+    ``dump_interval_s`` seconds or once :meth:`request_dump` (which is safe to
+    call from a signal handler) has been called.
+    """
+
+    def __init__(self, window=1024, dump_interval_s=600.):
+        self.window = window
+        self.dump_interval_s = dump_interval_s
+        self.phases = {}
+        self.last_dump = now()
+        self.dump_requested = False
+
+    def histogram(self, phase):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases.setdefault(
+                phase, RollingHistogram(self.window))
+        return histogram
+
+    def record(self, phase, seconds):
+        self.histogram(phase).add(seconds)
+
+    def start(self):
+        """
+        A start time for :meth:`stop`.
+        """
+        return default_timer()
+
+    def stop(self, phase, started):
+        """
+        Record the time since ``started`` (from :meth:`start`) against
+        ``phase``.
+        """
+        self.histogram(phase).add(default_timer() - started)
+
+    def summary(self):
+        return dict((phase, histogram.summary())
+            for phase, histogram in list(self.phases.items()))
+
+    def dump(self):
+        self.last_dump = now()
+        self.dump_requested = False
+        summary = self.summary()
+        for phase in sorted(summary):
+            s = summary[phase]
+            if s['max'] is None:
+                continue
+            log.info(
+                'timing %-14s n=%-8d p50=%.3fms p95=%.3fms p99=%.3fms '
+                'max=%.3fms max_ever=%.3fms',
+                phase, s['count'], s['p50'] * 1e3, s['p95'] * 1e3,
+                s['p99'] * 1e3, s['max'] * 1e3, s['max_ever'] * 1e3)
+
+    def request_dump(self):
+        self.dump_requested = True
+
+    def maybe_dump(self):
+        """
+        Dump if it was requested or the dump interval has passed. Returns True
+        if it dumped.
+        """
+        if not self.dump_requested:
+            if self.dump_interval_s is None or (now() - self.last_dump
+                    ).total_seconds() < self.dump_interval_s:
+                return False
+        self.dump()
+        return True
@@ -0,0 +1,125 @@
+import math
+import random
+import threading
+from dht22_controller.utils import now
+
+
+__all__ = [
+    "ChamberModel"
+]
+
+
+class ChamberModel(object):
+    """
+    A simple physical model of a chamber (e.g. a chest freezer) with a cooler,
+    heater, humidifier and dehumidifier.
+
+    The chamber's temperature and humidity relax exponentially towards the
+    ambient values. Each actuator drives them at a fixed rate, but with a lag:
+    an actuator's effect ramps up with time constant ``lag_s`` after it's
+    turned on and decays the same way after it's turned off, which is what
+    makes a freezer keep cooling for a while after the compressor stops.
+
+    The model follows :func:`~dht22_controller.utils.now`, so it runs in real
+    time normally and at whatever pace a virtual clock sets in simulations.
+    It's safe to read from the sensor thread while the relays' sink thread
+    switches actuators.
+    """
+
+    def __init__(self, temp_f=68., humidity=70., ambient_f=68.,
+        ambient_humidity=60., leak_s=3600., cool_f_per_s=.02,
+        heat_f_per_s=.02, humidify_per_s=.02, dehumidify_per_s=.02,
+        lag_s=60., noise_f=.05, noise_humidity=.2, seed=None):
+        self.temp_f = temp_f
+        self.humidity = humidity
+        self.ambient_f = ambient_f
+        self.ambient_humidity = ambient_humidity
+        self.leak_s = leak_s
+        self.cool_f_per_s = cool_f_per_s
+        self.heat_f_per_s = heat_f_per_s
+        self.humidify_per_s = humidify_per_s
+        self.dehumidify_per_s = dehumidify_per_s
+        self.lag_s = lag_s
+        self.noise_f = noise_f
+        self.noise_humidity = noise_humidity
+        self.random = random.Random(seed)
+
+        # whether each actuator is on, and how far its effect has ramped up
+        self.cooling = self.heating = False
+        self.humidifying = self.dehumidifying = False
+        self.cool_drive = self.heat_drive = 0.
+        self.humidify_drive = self.dehumidify_drive = 0.
+        self.time = None
+        # reentrant since set() and read() advance while holding it
+        self.lock = threading.RLock()
+
+    def advance(self, until=None):
+        """
+        Step the model forward to ``until`` (defaults to now()).
+        """
+        with self.lock:
+            self._advance(now() if until is None else until)
+
+    def _advance(self, until):
+        if self.time is None:
+            self.time = until
+            return
+        dt = (until - self.time).total_seconds()
+        if dt <= 0:
+            return
+        self.time = until
+
+        # the model is linear, so step it exactly (large steps give the same
+        # result as many small ones)
+        leak = math.exp(-dt / self.leak_s)
+        decay = math.exp(-dt / self.lag_s)
+        k = 1. / self.leak_s - 1. / self.lag_s
+        # integral over the step of exp(-(dt - s) / leak_s) * exp(-s / lag_s)
+        if abs(k) < 1e-12:
+            lagged = dt * leak
+        else:
+            lagged = (decay - leak) / k
+        steady = self.leak_s * (1. - leak)
+
+        def step(drive, on):
+            # returns the new drive and its leak-weighted integral over the
+            # step
+            target = 1. if on else 0.
+            return target + (drive - target) * decay, \
+                target * steady + (drive - target) * lagged
+
+        self.cool_drive, cool = step(self.cool_drive, self.cooling)
+        self.heat_drive, heat = step(self.heat_drive, self.heating)
+        self.humidify_drive, humidify = step(
+            self.humidify_drive, self.humidifying)
+        self.dehumidify_drive, dehumidify = step(
+            self.dehumidify_drive, self.dehumidifying)
+
+        self.temp_f = self.ambient_f + (self.temp_f - self.ambient_f) * leak + \
+            heat * self.heat_f_per_s - cool * self.cool_f_per_s
+        self.humidity = self.ambient_humidity + \
+            (self.humidity - self.ambient_humidity) * leak + \
+            humidify * self.humidify_per_s - dehumidify * self.dehumidify_per_s
+        self.humidity = min(100., max(0., self.humidity))
+
+    def set(self, actuator, on):
+        """
+        Turn an actuator ('cooling', 'heating', 'humidifying' or
+        'dehumidifying') on or off.
+        """
+        on = bool(on)
+        with self.lock:
+            if getattr(self, actuator) == on:
+                return
+            self.advance()
+            setattr(self, actuator, on)
+
+    def read(self):
+        """
+        A noisy ``(h, t)`` reading of the chamber right now.
+        """
+        with self.lock:
+            self.advance()
+            return (
+                self.humidity + self.random.gauss(0., self.noise_humidity),
+                self.temp_f + self.random.gauss(0., self.noise_f))
@@ -0,0 +1,156 @@
+import collections
+import cProfile
+import gc
+import os
+from os.path import isdir, join
+import pstats
+from dht22_controller.utils import now
+
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2, where object counts by type stand in for it
+    tracemalloc = None
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "Profiler"
+]
+
+
+# how many functions / allocation sites / types to list in the reports
+TOP = 40
+
+
+def _type_counts():
+    return collections.Counter(
+        type(obj).__name__ for obj in gc.get_objects())
+
+
+class Profiler(object):
+    """
+    Profiles a running controller on demand.
+
+    :meth:`start` begins a cProfile session on the calling thread (the
+    control loop) and takes a memory baseline: a tracemalloc snapshot, or
+    where tracemalloc isn't available a count of live objects by type.
+    :meth:`dump` stops it and writes to ``directory``:
+
+    - ``profile-<time>.pstats``, the raw stats for ``pstats`` / snakeviz
+    - ``profile-<time>.txt``, the top functions by cumulative time
+    - ``memory-<time>.txt``, what grew since the baseline
+
+    Signal handlers should only call :meth:`request_start` /
+    :meth:`request_dump`, and the loop calls :meth:`poll` to act on them.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.profile = None
+        self.baseline = None
+        self.started_at = None
+        self.requested = None
+
+    def request_start(self):
+        self.requested = 'start'
+
+    def request_dump(self):
+        self.requested = 'dump'
+
+    def poll(self):
+        """
+        Act on a pending request. A profile that can't be started or written
+        is logged and dropped rather than stopping the loop.
+        """
+        requested, self.requested = self.requested, None
+        try:
+            if requested == 'start':
+                self.start()
+            elif requested == 'dump':
+                self.dump()
+        except Exception as e:
+            # dump already logged it; profiling is a diagnostic, not control
+            if requested != 'dump':
+                log.exception("exception occurred. requested=%s", requested)
+
+    @property
+    def running(self):
+        return self.profile is not None
+
+    def start(self):
+        if self.running:
+            log.info("already profiling since %s", self.started_at)
+            return
+        if tracemalloc is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+            self.baseline = tracemalloc.take_snapshot()
+        else:
+            self.baseline = _type_counts()
+        self.started_at = now()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        log.info("profiling started")
+
+    def dump(self):
+        """
+        Stop profiling and write the reports. Returns the paths written, or
+        None if profiling wasn't started.
+        """
+        if not self.running:
+            log.warning("not profiling, nothing to dump")
+            return None
+        profile, self.profile = self.profile, None
+        profile.disable()
+
+        try:
+            if not isdir(self.directory):
+                os.makedirs(self.directory)
+            stamp = now().strftime('%Y%m%dT%H%M%S')
+            paths = [
+                join(self.directory, 'profile-{}.pstats'.format(stamp)),
+                join(self.directory, 'profile-{}.txt'.format(stamp)),
+                join(self.directory, 'memory-{}.txt'.format(stamp))]
+
+            # memory first, so writing the profile doesn't show up in it
+            with open(paths[2], 'w') as report:
+                self._write_memory(report)
+            profile.dump_stats(paths[0])
+            with open(paths[1], 'w') as report:
+                report.write('profiled from {} to {}\n\n'.format(
+                    self.started_at, now()))
+                stats = pstats.Stats(profile, stream=report)
+                stats.sort_stats('cumulative').print_stats(TOP)
+        except Exception as e:
+            log.exception("exception occurred. directory=%s", self.directory)
+            raise
+        finally:
+            self.baseline = None
+            if tracemalloc is not None and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+        log.info("profile written to %s", ', '.join(paths))
+        return paths
+
+    def _write_memory(self, report):
+        if tracemalloc is not None:
+            report.write('top allocation growth by line since {}\n\n'.format(
+                self.started_at))
+            snapshot = tracemalloc.take_snapshot()
+            for stat in snapshot.compare_to(self.baseline, 'lineno')[:TOP]:
+                report.write('{}\n'.format(stat))
+            return
+
+        report.write('tracemalloc is not available; live objects by type '
+            'since {}\n\n'.format(self.started_at))
+        counts = _type_counts()
+        growth = sorted(((counts[name] - self.baseline.get(name, 0), name)
+            for name in counts), reverse=True)
+        for change, name in growth[:TOP]:
+            report.write('{:<40} {:>10} ({:+d})\n'.format(
+                name, counts[name], change))
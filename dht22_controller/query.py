@@ -0,0 +1,171 @@
+import argparse
+from datetime import datetime
+import os
+import sys
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "find_offset",
+    "read_range",
+    "read_chunks",
+    "tail_rows"
+]
+
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# rows start with a fixed-width timestamp, so they sort as plain strings
+TIME_WIDTH = 19
+
+
+def _key(value):
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    return value
+
+
+def _line_start(datafile, offset):
+    """
+    The offset of the first line that starts at or after ``offset``.
+    """
+    if offset == 0:
+        datafile.seek(0)
+        return 0
+    datafile.seek(offset - 1)
+    datafile.readline()
+    return datafile.tell()
+
+
+def find_offset(datafile, key, size=None):
+    """
+    Binary search the time sorted, open (binary mode) ``datafile`` for the
+    offset of the first row whose timestamp is >= ``key``. Returns the file
+    size if there is no such row.
+    """
+    key = _key(key)
+    if size is None:
+        datafile.seek(0, os.SEEK_END)
+        size = datafile.tell()
+
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        _line_start(datafile, mid)
+        line = datafile.readline()
+        if not line or line[:TIME_WIDTH] >= key:
+            hi = mid
+        else:
+            lo = mid + 1
+    return _line_start(datafile, lo)
+
+
+def _parse_time(text):
+    # several times faster than strptime, which matters when replaying months
+    # of rows
+    if len(text) != TIME_WIDTH:
+        return datetime.strptime(text, TIME_FORMAT)
+    return datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+        int(text[11:13]), int(text[14:16]), int(text[17:19]))
+
+
+def parse_row(line):
+    """
+    Parse a data.csv row into ``(datetime, t, tavg, h, havg)``.
+    """
+    fields = line.rstrip('\r\n').split(',')
+    return (_parse_time(fields[0]),) + tuple(float(f) for f in fields[1:])
+
+
+def read_range(filename, start=None, end=None, parse=True):
+    """
+    Stream the rows of ``filename`` whose timestamp is in ``[start, end)``.
+
+    ``start`` and ``end`` are datetimes (or timestamp strings in the data.csv
+    format) and either can be None for an open range. Only the rows in the
+    range are read, so this is cheap even for a very large history. Rows are
+    parsed with :func:`parse_row` unless ``parse`` is False, in which case the
+    raw lines are yielded.
+    """
+    end = _key(end)
+    with open(filename, 'rb') as datafile:
+        if start is not None:
+            datafile.seek(find_offset(datafile, start))
+        for line in datafile:
+            if end is not None and line[:TIME_WIDTH] >= end:
+                break
+            if not line.strip():
+                continue
+            yield parse_row(line) if parse else line
+
+
+def read_chunks(filename, start=None, end=None, chunk_bytes=1 << 20,
+    parse=True):
+    """
+    Like :func:`read_range`, but yields lists of rows read about
+    ``chunk_bytes`` at a time, which is much cheaper per row when a large
+    history is streamed.
+    """
+    end = _key(end)
+    with open(filename, 'rb') as datafile:
+        if start is not None:
+            datafile.seek(find_offset(datafile, start))
+        while True:
+            lines = datafile.readlines(chunk_bytes)
+            if not lines:
+                return
+            if end is not None and lines[-1][:TIME_WIDTH] >= end:
+                lines = [line for line in lines if line[:TIME_WIDTH] < end]
+                done = True
+            else:
+                done = False
+            lines = [line for line in lines if line.strip()]
+            if lines:
+                yield [parse_row(line) for line in lines] if parse else lines
+            if done:
+                return
+
+
+def tail_rows(filename, count, block_bytes=8192, parse=True):
+    """
+    The last ``count`` rows of ``filename``, oldest first, read backwards from
+    the end a block at a time so only the tail of the file is touched. A
+    final row without a newline (torn by a crash mid-write) is skipped.
+    """
+    with open(filename, 'rb') as datafile:
+        datafile.seek(0, os.SEEK_END)
+        offset = datafile.tell()
+        data = b''
+        # one more newline than rows, so the first row is known to be whole
+        while offset > 0 and data.count(b'\n') <= count:
+            size = min(block_bytes, offset)
+            offset -= size
+            datafile.seek(offset)
+            data = datafile.read(size) + data
+
+    lines = data.split(b'\n')[:-1]
+    if offset > 0:
+        lines = lines[1:]
+    lines = [line + b'\n' for line in lines if line.strip()]
+    lines = lines[-count:] if count > 0 else []
+    return [parse_row(line) for line in lines] if parse else lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Print the rows of data.csv within a time range.")
+    parser.add_argument('filename', help="time sorted data.csv file")
+    parser.add_argument('--start', default=None,
+        help="first timestamp to include, e.g. 2016-01-01T00:00:00")
+    parser.add_argument('--end', default=None,
+        help="first timestamp to exclude")
+    args = parser.parse_args(argv)
+
+    for line in read_range(args.filename, args.start, args.end, parse=False):
+        sys.stdout.write(line)
+
+
+if __name__ == '__main__':
+    main()
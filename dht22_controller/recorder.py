@@ -0,0 +1,79 @@
+import csv
+import os
+from dht22_controller.utils import now
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "BufferedCsvWriter"
+]
+
+
+class BufferedCsvWriter(object):
+    """
+    Appends rows to a csv file, buffering them in memory and committing them
+    as a group.
+
+    Rows are committed once ``max_rows`` rows are buffered or ``max_interval_s``
+    seconds have passed since the last commit, whichever comes first. The file
+    is only fsync'd at commit points, so at most one group of rows can be lost
+    if the power goes out.
+    """
+
+    def __init__(self, filename, max_rows=60, max_interval_s=60.):
+        self.filename = filename
+        self.max_rows = max_rows
+        self.max_interval_s = max_interval_s
+        self.rows = []
+        self.last_commit = now()
+        self.csvfile = None
+        self.writer = None
+
+    def open(self):
+        if self.csvfile is None:
+            self.csvfile = open(self.filename, 'a')
+            self.writer = csv.writer(self.csvfile, delimiter=",")
+
+    def writerow(self, row):
+        """
+        Buffer a row, committing the buffer if it's full or old enough.
+        """
+        self.rows.append(row)
+        if len(self.rows) >= self.max_rows or \
+                (now() - self.last_commit).total_seconds() >= self.max_interval_s:
+            self.commit()
+
+    def commit(self):
+        """
+        Write the buffered rows and fsync the file.
+        """
+        self.last_commit = now()
+        if not self.rows:
+            return
+
+        try:
+            self.open()
+            self.writer.writerows(self.rows)
+            self.csvfile.flush()
+            os.fsync(self.csvfile.fileno())
+        except Exception as e:
+            log.exception(
+                "exception occurred. filename=%s, rows=%s",
+                self.filename, len(self.rows))
+            raise
+        del self.rows[:]
+
+    def close(self):
+        """
+        Commit anything that's buffered and close the file.
+        """
+        try:
+            self.commit()
+        finally:
+            if self.csvfile is not None:
+                self.csvfile.close()
+                self.csvfile = None
+                self.writer = None
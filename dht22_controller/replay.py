@@ -0,0 +1,211 @@
+import argparse
+import csv
+import json
+import sys
+from timeit import default_timer
+from dht22_controller.config import Config
+from dht22_controller.controller import Controller
+from dht22_controller.humidity import Humidity
+from dht22_controller.query import read_chunks
+from dht22_controller.simulator import VirtualClock
+from dht22_controller.temperature import Temperature
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "ACTUATORS",
+    "Replay"
+]
+
+
+ACTUATORS = ('cooling', 'heating', 'humidifying', 'dehumidifying')
+
+
+def _failed_read():
+    # the replay feeds the readings in itself, the sensor is never read
+    return (None, None)
+
+
+class Replay(object):
+    """
+    Replays recorded data.csv readings through the controller under a
+    candidate config, to see what it would have decided.
+
+    The file is streamed in chunks of ``chunk_bytes`` and each reading is
+    handled at its recorded time on a virtual clock, with the shutoff timers
+    run at their exact deadlines in between. Only the decisions are traced:
+    ``trace`` is called with ``(timestamp, actuator, on, tavg, havg)`` each
+    time an actuator is switched.
+
+    ``temperature`` and ``humidity`` are keyword arguments for the
+    controllers, which default to the cooler and dehumidifier that
+    dht22_controller.py runs (always with ``debug=True`` so the learn files
+    aren't read or written).
+    """
+
+    def __init__(self, conf, temperature=None, humidity=None,
+        chunk_bytes=1 << 20, trace=None):
+        self.conf = conf
+        self.temperature_kwargs = dict(
+            has_cooler=True, has_heater=False, cool_for_s=20., heat_for_s=20.)
+        self.temperature_kwargs.update(temperature or {})
+        self.humidity_kwargs = dict(
+            has_humidifier=False, has_dehumidifier=True)
+        self.humidity_kwargs.update(humidity or {})
+        self.chunk_bytes = chunk_bytes
+        self.trace = trace
+        self.clock = VirtualClock()
+        self.controller = None
+        self.switched = None
+        self.states = (False, False, False, False)
+
+        self.rows = 0
+        self.first = None
+        self.on_s = dict((actuator, 0.) for actuator in ACTUATORS)
+        self.cycles = dict((actuator, 0) for actuator in ACTUATORS)
+
+    def build(self):
+        self.controller = Controller(
+            Temperature(self.conf, debug=True, **self.temperature_kwargs),
+            Humidity(self.conf, debug=True, **self.humidity_kwargs),
+            _failed_read)
+        self.first = self.clock.time
+        self.switched = dict((actuator, self.clock.time)
+            for actuator in ACTUATORS)
+
+    def check(self, at):
+        """
+        Trace the actuators that were switched since the last check.
+        """
+        temperature = self.controller.temperature
+        humidity = self.controller.humidity
+        states = (temperature.cooling_on, temperature.heating_on,
+            humidity.humidifier_on, humidity.dehumidifier_on)
+        if states == self.states:
+            return
+        for actuator, was, on in zip(ACTUATORS, self.states, states):
+            if was == on:
+                continue
+            if on:
+                self.cycles[actuator] += 1
+            else:
+                self.on_s[actuator] += \
+                    (at - self.switched[actuator]).total_seconds()
+            self.switched[actuator] = at
+            if self.trace is not None:
+                self.trace(at, actuator, on,
+                    temperature.temperature_average_f(), humidity.average())
+        self.states = states
+
+    def add(self, row):
+        """
+        Handle one ``(timestamp, t, tavg, h, havg)`` row.
+        """
+        at = row[0]
+        if self.controller is None:
+            self.clock.time = at
+            self.build()
+        controller = self.controller
+        scheduler = controller.scheduler
+
+        # shutoffs due before this reading happen at their deadlines
+        deadline = scheduler.next_deadline()
+        while deadline is not None and deadline <= at:
+            self.clock.time = deadline
+            scheduler.run_due(deadline)
+            self.check(deadline)
+            deadline = scheduler.next_deadline()
+
+        self.clock.time = at
+        # straight into the windows; going through the sensor's cache would
+        # only add locking
+        controller.add_reading(row[3], row[1])
+        controller.tick()
+        self.check(at)
+        self.rows += 1
+
+    def run(self, filename, start=None, end=None):
+        """
+        Replay the rows of ``filename`` in ``[start, end)`` (continuing from
+        where the last run stopped). Returns a summary of the decisions.
+        """
+        self.clock.install()
+        try:
+            started = default_timer()
+            rows = self.rows
+            for chunk in read_chunks(filename, start, end, self.chunk_bytes):
+                for row in chunk:
+                    self.add(row)
+            elapsed = default_timer() - started
+        finally:
+            self.clock.uninstall()
+        return self.summary(self.rows - rows, elapsed)
+
+    def summary(self, rows=None, elapsed=None):
+        if self.controller is None:
+            return {'rows': 0}
+        at = self.clock.time
+        span_s = (at - self.first).total_seconds()
+        on_s = dict(self.on_s)
+        for actuator, on in zip(ACTUATORS, self.states):
+            if on:
+                on_s[actuator] += (at - self.switched[actuator]).total_seconds()
+
+        result = {
+            'rows': self.rows if rows is None else rows,
+            'first': self.first.isoformat(),
+            'last': at.isoformat(),
+            'span_days': span_s / 86400.,
+            'cycles': dict(self.cycles),
+            'duty': dict((actuator, on_s[actuator] / span_s if span_s else 0.)
+                for actuator in ACTUATORS),
+            'cool_for_s': self.controller.temperature.cool_for_s,
+        }
+        if elapsed is not None:
+            result['wall_s'] = elapsed
+            result['rows_per_s'] = rows / elapsed if elapsed > 0 else None
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay recorded readings through the controller.")
+    parser.add_argument('filename', help="time sorted data.csv file")
+    parser.add_argument('--config', default=None,
+        help="candidate config.json (default: the controller's)")
+    parser.add_argument('--start', default=None,
+        help="first timestamp to replay, e.g. 2016-01-01T00:00:00")
+    parser.add_argument('--end', default=None,
+        help="first timestamp not to replay")
+    parser.add_argument('--trace', default=None,
+        help="write the switching decisions to this csv ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    conf = Config()
+    conf.load(args.config)
+
+    tracefile = None
+    trace = None
+    if args.trace is not None:
+        tracefile = sys.stdout if args.trace == '-' else open(args.trace, 'w')
+        writer = csv.writer(tracefile)
+        writer.writerow(['timestamp', 'actuator', 'on', 'tavg', 'havg'])
+
+        def trace(at, actuator, on, tavg, havg):
+            writer.writerow([at.isoformat(), actuator, int(on),
+                '{:.2f}'.format(tavg), '{:.2f}'.format(havg)])
+
+    try:
+        result = Replay(conf, trace=trace).run(
+            args.filename, args.start, args.end)
+    finally:
+        if tracefile is not None and tracefile is not sys.stdout:
+            tracefile.close()
+    sys.stderr.write(json.dumps(result, indent=2, sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+from collections import namedtuple
+import os
+from os.path import getsize, isdir, isfile, join
+import struct
+from dht22_controller.timeseries import to_epoch
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "TIERS",
+    "Rollup",
+    "RollupTier",
+    "Rollups",
+    "read_rollups"
+]
+
+
+# (name, bucket size in seconds)
+TIERS = (
+    ('1min', 60),
+    ('30min', 60 * 30),
+    ('1day', 60 * 60 * 24),
+)
+
+# bucket start (epoch seconds), count, then sum/min/max for temperature and
+# humidity. sums are doubles since a day of readings overflows a float's
+# precision.
+BUCKET = struct.Struct('<IIdffdff')
+
+
+Rollup = namedtuple('Rollup', ['start', 'count', 't_sum', 't_min', 't_max',
+    'h_sum', 'h_min', 'h_max'])
+
+
+class RollupTier(object):
+    """
+    Aggregates readings into fixed-size time buckets and appends each bucket
+    to ``filename`` once it's complete.
+
+    Each bucket is fsync'd as it's written (at most once a minute for the
+    finest tier). The bucket still being filled only lives in memory until it
+    completes or the tier is closed, so a crash loses the readings since the
+    start of the current bucket in each tier (up to a day's for '1day'), but
+    never earlier buckets.
+    """
+
+    def __init__(self, filename, bucket_s):
+        self.filename = filename
+        self.bucket_s = bucket_s
+        self.start = None
+        self.count = 0
+        self.t_sum = self.t_min = self.t_max = 0.
+        self.h_sum = self.h_min = self.h_max = 0.
+        self.rollfile = None
+
+    def add(self, epoch, t, h):
+        start = epoch - epoch % self.bucket_s
+        if start != self.start:
+            self.write()
+            self.start = start
+            self.count = 1
+            self.t_sum = self.t_min = self.t_max = t
+            self.h_sum = self.h_min = self.h_max = h
+            return
+
+        self.count += 1
+        self.t_sum += t
+        self.h_sum += h
+        if t < self.t_min: self.t_min = t
+        elif t > self.t_max: self.t_max = t
+        if h < self.h_min: self.h_min = h
+        elif h > self.h_max: self.h_max = h
+
+    def open(self):
+        self.rollfile = open(self.filename, 'ab')
+        size = getsize(self.filename)
+        # drop a partially written bucket left behind by a crash, which would
+        # otherwise shift every bucket appended after it
+        whole = size // BUCKET.size * BUCKET.size
+        if whole != size:
+            log.warning("truncating partial bucket. filename=%s, size=%s",
+                self.filename, size)
+            self.rollfile.truncate(whole)
+
+    def write(self):
+        """
+        Append the current bucket (complete or not) to the tier file.
+        """
+        if self.start is None or self.count == 0:
+            return
+
+        try:
+            if self.rollfile is None:
+                self.open()
+            self.rollfile.write(BUCKET.pack(
+                self.start, self.count,
+                self.t_sum, self.t_min, self.t_max,
+                self.h_sum, self.h_min, self.h_max))
+            self.rollfile.flush()
+            os.fsync(self.rollfile.fileno())
+        except Exception as e:
+            log.exception(
+                "exception occurred. filename=%s, start=%s",
+                self.filename, self.start)
+            raise
+        self.count = 0
+
+    def close(self):
+        """
+        Write the partial bucket and close the tier file. Readers merge the
+        partial bucket with the rest of it if the controller restarts within
+        the same bucket.
+        """
+        try:
+            self.write()
+        finally:
+            if self.rollfile is not None:
+                self.rollfile.close()
+                self.rollfile = None
+
+
+class Rollups(object):
+    """
+    Keeps every tier in ``TIERS`` up to date as readings arrive. Each tier is
+    stored in ``<directory>/<name>.roll``.
+    """
+
+    def __init__(self, directory, tiers=TIERS):
+        if not isdir(directory):
+            os.makedirs(directory)
+        self.tiers = [
+            RollupTier(join(directory, name + '.roll'), bucket_s)
+            for name, bucket_s in tiers]
+
+    def add(self, timestamp, t, h):
+        """
+        Add a reading taken at the (UTC) datetime ``timestamp``.
+        """
+        epoch = to_epoch(timestamp)
+        for tier in self.tiers:
+            tier.add(epoch, t, h)
+
+    def close(self):
+        for tier in self.tiers:
+            tier.close()
+
+
+def read_rollups(filename):
+    """
+    Yield the :class:`Rollup` buckets stored in a tier file, oldest first.
+    Consecutive records for the same bucket are merged.
+    """
+    if not isfile(filename):
+        return
+
+    count = getsize(filename) // BUCKET.size
+    last = None
+    with open(filename, 'rb') as rollfile:
+        while count > 0:
+            n = min(count, 4096)
+            data = rollfile.read(n * BUCKET.size)
+            count -= n
+            for offset in range(0, n * BUCKET.size, BUCKET.size):
+                bucket = Rollup(*BUCKET.unpack_from(data, offset))
+                if last is None:
+                    last = bucket
+                elif last.start == bucket.start:
+                    last = Rollup(
+                        last.start, last.count + bucket.count,
+                        last.t_sum + bucket.t_sum,
+                        min(last.t_min, bucket.t_min),
+                        max(last.t_max, bucket.t_max),
+                        last.h_sum + bucket.h_sum,
+                        min(last.h_min, bucket.h_min),
+                        max(last.h_max, bucket.h_max))
+                else:
+                    yield last
+                    last = bucket
+    if last is not None:
+        yield last
@@ -0,0 +1,72 @@
+import heapq
+import itertools
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "Scheduler"
+]
+
+
+class Scheduler(object):
+    """
+    A heap of timers. Each timer runs an action once its deadline has passed.
+
+    Cancelling a timer only marks it, and cancelled timers are dropped when
+    they reach the top of the heap.
+    """
+
+    def __init__(self):
+        self.heap = []
+        # breaks ties between timers with the same deadline, in the order they
+        # were scheduled
+        self.counter = itertools.count()
+
+    def schedule(self, at, action, *args):
+        """
+        Run ``action(*args)`` once ``at`` has passed. Returns the timer, which
+        can be passed to :meth:`cancel`.
+        """
+        timer = [at, next(self.counter), action, args, False]
+        heapq.heappush(self.heap, timer)
+        return timer
+
+    def cancel(self, timer):
+        timer[4] = True
+
+    def _prune(self):
+        while self.heap and self.heap[0][4]:
+            heapq.heappop(self.heap)
+
+    def next_deadline(self):
+        """
+        The deadline of the next timer, or None if nothing is scheduled.
+        """
+        self._prune()
+        return self.heap[0][0] if self.heap else None
+
+    def run_due(self, now):
+        """
+        Run every timer whose deadline is at or before ``now``. Returns how
+        many were run.
+        """
+        ran = 0
+        while True:
+            self._prune()
+            if not self.heap or self.heap[0][0] > now:
+                return ran
+            timer = heapq.heappop(self.heap)
+            timer[4] = True
+            ran += 1
+            try:
+                timer[2](*timer[3])
+            except Exception as e:
+                log.exception("exception occurred running a timer")
+                raise
+
+    def __len__(self):
+        self._prune()
+        return sum(1 for timer in self.heap if not timer[4])
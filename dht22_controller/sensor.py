@@ -0,0 +1,141 @@
+import threading
+from timeit import default_timer
+from dht22_controller.utils import now
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "DHT22_MIN_INTERVAL_S",
+    "SensorReader"
+]
+
+
+# the DHT22 can't be sampled more often than once every 2 seconds
+DHT22_MIN_INTERVAL_S = 2.
+
+
+class SensorReader(object):
+    """
+    Reads the sensor on a background thread and keeps the newest valid
+    reading in :attr:`latest` as an ``(h, t, timestamp)`` tuple (or None until
+    the first reading).
+
+    :attr:`latest` is a single slot that's replaced with a new tuple on every
+    reading, so readers never need a lock and never block on the sensor.
+    Consecutive failures back off exponentially from ``min_interval_s`` up to
+    ``max_backoff_s``. Read latency, failures and staleness are tracked so the
+    control loop can tell when the data has gone stale. Each read's latency
+    (failed ones included) is also recorded as 'sensor_read' in
+    ``instruments`` if given.
+    """
+
+    def __init__(self, read, min_interval_s=DHT22_MIN_INTERVAL_S,
+        max_backoff_s=30., instruments=None):
+        self.read = read
+        self.instruments = instruments
+        self.min_interval_s = min_interval_s
+        self.max_backoff_s = max_backoff_s
+        self.latest = None
+        # set whenever a new reading is published
+        self.fresh = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='sensor')
+        self.thread.daemon = True
+
+        self.reads = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_latency_s = None
+        self.max_latency_s = 0.
+        self.total_latency_s = 0.
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def publish(self, h, t):
+        """
+        Make ``(h, t)`` the latest reading.
+        """
+        self.latest = (h, t, now())
+        self.fresh.set()
+
+    def read_once(self):
+        """
+        Take one reading, updating the statistics. Returns True if it was
+        valid.
+        """
+        started = default_timer()
+        try:
+            h, t = self.read()
+        except Exception as e:
+            log.exception("exception occurred reading the sensor")
+            h = t = None
+        latency = default_timer() - started
+
+        self.reads += 1
+        self.last_latency_s = latency
+        self.total_latency_s += latency
+        if latency > self.max_latency_s:
+            self.max_latency_s = latency
+        if self.instruments is not None:
+            self.instruments.record('sensor_read', latency)
+
+        if h is None or t is None:
+            self.failures += 1
+            self.consecutive_failures += 1
+            return False
+
+        self.consecutive_failures = 0
+        self.publish(h, t)
+        return True
+
+    def backoff_s(self):
+        """
+        How long to wait before the next read.
+        """
+        if self.consecutive_failures == 0:
+            return self.min_interval_s
+        return min(self.max_backoff_s,
+            self.min_interval_s * 2 ** (self.consecutive_failures - 1))
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.read_once()
+            self.stopped.wait(self.backoff_s())
+
+    def staleness_s(self):
+        """
+        Seconds since the latest valid reading, or None if there hasn't been
+        one.
+        """
+        latest = self.latest
+        if latest is None:
+            return None
+        return (now() - latest[2]).total_seconds()
+
+    def failure_rate(self):
+        return self.failures / float(self.reads) if self.reads else 0.
+
+    def mean_latency_s(self):
+        return self.total_latency_s / self.reads if self.reads else None
+
+    def stats(self):
+        return {
+            'reads': self.reads,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'failure_rate': self.failure_rate(),
+            'last_latency_s': self.last_latency_s,
+            'mean_latency_s': self.mean_latency_s(),
+            'max_latency_s': self.max_latency_s,
+            'staleness_s': self.staleness_s(),
+        }
@@ -0,0 +1,192 @@
+import argparse
+from datetime import datetime, timedelta
+import json
+from timeit import default_timer
+from dht22_controller.config import Config
+from dht22_controller.controller import Controller, InlineSink
+from dht22_controller.hardware import SimulatedRelay, SimulatedSensor
+from dht22_controller.humidity import Humidity
+from dht22_controller.model import ChamberModel
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import _time, set_clock, set_now, set_sleep
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "VirtualClock",
+    "Simulator"
+]
+
+
+class VirtualClock(object):
+    """
+    A clock that only moves when it's told to. Installing it points
+    :func:`~dht22_controller.utils.now` (and so
+    :func:`~dht22_controller.utils.clock`) and
+    :func:`~dht22_controller.utils.sleep` at it, and uninstalling it puts
+    back whatever they pointed at before.
+    """
+
+    def __init__(self, start=datetime(2000, 1, 1)):
+        self.time = start
+        # the hooks to put back, one entry per install()
+        self.previous = []
+
+    def now(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.time += timedelta(seconds=duration)
+
+    def install(self):
+        self.previous.append((_time.NOW, _time.CLOCK, _time.SLEEP))
+        set_now(self.now)
+        set_sleep(self.sleep)
+
+    def uninstall(self):
+        if not self.previous:
+            return
+        previous_now, previous_clock, previous_sleep = self.previous.pop()
+        set_now(previous_now)
+        set_clock(previous_clock)
+        set_sleep(previous_sleep)
+
+
+class Simulator(object):
+    """
+    Runs the controller against a
+    :class:`~dht22_controller.model.ChamberModel` on a virtual clock, jumping
+    straight from one event (a sensor sample, a shutoff timer or the
+    controller's heartbeat tick) to the next.
+
+    ``temperature`` and ``humidity`` are keyword arguments for the
+    :class:`~dht22_controller.temperature.Temperature` and
+    :class:`~dht22_controller.humidity.Humidity` controllers (they always run
+    with ``debug=True`` so the learn files in ``conf.data_dir`` are neither
+    read nor written).
+    ``on_tick`` functions are called with the
+    :class:`~dht22_controller.controller.TickState` after every tick.
+    """
+
+    def __init__(self, conf, model=None, start=datetime(2000, 1, 1),
+        temperature=None, humidity=None, sample_interval_s=None, tick_s=60.,
+        on_tick=()):
+        self.conf = conf
+        self.model = ChamberModel(**conf.simulation) if model is None \
+            else model
+        self.clock = VirtualClock(start)
+        self.temperature_kwargs = dict(
+            has_cooler=True, has_heater=False, cool_for_s=20., heat_for_s=20.)
+        self.temperature_kwargs.update(temperature or {})
+        self.humidity_kwargs = dict(
+            has_humidifier=False, has_dehumidifier=True)
+        self.humidity_kwargs.update(humidity or {})
+        self.sample_interval_s = conf.sample_interval_s \
+            if sample_interval_s is None else sample_interval_s
+        self.tick_s = tick_s
+        self.on_tick = list(on_tick)
+        self.controller = None
+        self.next_sample = None
+        self.events = 0
+
+    def build(self):
+        """
+        Create the controller. Must be called with the clock installed, since
+        the controllers note the time they were created at.
+        """
+        relays = [
+            SimulatedRelay(self.model, 'cooling'),
+            SimulatedRelay(self.model, 'heating'),
+            SimulatedRelay(self.model, 'humidifying'),
+            SimulatedRelay(self.model, 'dehumidifying')]
+
+        def set_relays(state):
+            relays[0].set(state.cooling_on)
+            relays[1].set(state.heating_on)
+            relays[2].set(state.humidifier_on)
+            relays[3].set(state.dehumidifier_on)
+
+        self.model.advance()
+        self.controller = Controller(
+            Temperature(self.conf, debug=True, **self.temperature_kwargs),
+            Humidity(self.conf, debug=True, **self.humidity_kwargs),
+            SimulatedSensor(self.model),
+            tick_s=self.tick_s,
+            sample_interval_s=self.sample_interval_s,
+            on_tick=[InlineSink('relays', set_relays)] + [
+                InlineSink('on_tick', func) for func in self.on_tick])
+        self.next_sample = self.clock.time
+
+    def step(self):
+        """
+        Jump to the next event and handle it.
+        """
+        controller = self.controller
+        wake = controller.next_wakeup()
+        if self.next_sample < wake:
+            wake = self.next_sample
+        self.clock.time = wake
+
+        if wake >= self.next_sample:
+            controller.sensor.read_once()
+            self.next_sample = wake + timedelta(
+                seconds=controller.sensor.backoff_s())
+        # a due shutoff timer ticks itself
+        if not controller.scheduler.run_due(wake):
+            controller.tick()
+        self.events += 1
+
+    def run(self, days):
+        """
+        Simulate ``days`` days of operation (continuing from where the last
+        run stopped). Returns a summary including how many simulated days
+        were reached per second of wall time.
+        """
+        self.clock.install()
+        try:
+            if self.controller is None:
+                self.build()
+            end = self.clock.time + timedelta(days=days)
+            events = self.events
+            started = default_timer()
+            while self.clock.time < end:
+                self.step()
+            elapsed = default_timer() - started
+        finally:
+            self.clock.uninstall()
+
+        return {
+            'days': days,
+            'events': self.events - events,
+            'wall_s': elapsed,
+            'days_per_s': days / elapsed if elapsed > 0 else float('inf'),
+            'temp_f': self.model.temp_f,
+            'humidity': self.model.humidity,
+            'cool_for_s': self.controller.temperature.cool_for_s,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Simulate the controller on a virtual clock.")
+    parser.add_argument('--days', type=float, default=7.,
+        help="simulated days to run (default: %(default)s)")
+    parser.add_argument('--config', default=None,
+        help="config.json to simulate (default: the controller's)")
+    parser.add_argument('--sample-interval', type=float, default=None,
+        help="seconds between sensor samples (default: from the config)")
+    args = parser.parse_args(argv)
+
+    conf = Config()
+    conf.load(args.config)
+
+    simulator = Simulator(conf, sample_interval_s=args.sample_interval)
+    result = simulator.run(args.days)
+    print(json.dumps(result, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
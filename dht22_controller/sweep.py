@@ -0,0 +1,419 @@
+import argparse
+import csv
+from datetime import timedelta
+import inspect
+import itertools
+import multiprocessing
+import random
+from dht22_controller.config import Config
+from dht22_controller.humidity import Humidity
+from dht22_controller.model import ChamberModel
+from dht22_controller.simulator import Simulator
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import now
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "Metrics",
+    "route_params",
+    "run_one",
+    "grid",
+    "random_search",
+    "sweep",
+    "write_results"
+]
+
+
+SECTIONS = ('config', 'temperature', 'humidity', 'model')
+
+
+def _arg_names(func):
+    spec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    return set(spec(func).args[1:])
+
+
+# keyword arguments that aren't tunable (the simulator sets them itself)
+_FIXED = set(['config', 'debug', 'queue_size'])
+TEMPERATURE_ARGS = _arg_names(Temperature.__init__) - _FIXED
+HUMIDITY_ARGS = _arg_names(Humidity.__init__) - _FIXED
+MODEL_ARGS = _arg_names(ChamberModel.__init__)
+# config settings read from the json; the derived ones (worked out from the
+# target and pad) can't be set
+_DERIVED = set(['min_temp_f', 'max_temp_f', 'min_humidity', 'max_humidity'])
+CONFIG_KEYS = set(name for name, value in vars(Config).items()
+    if isinstance(value, property)) - _DERIVED
+SECTION_KEYS = {
+    'config': CONFIG_KEYS,
+    'temperature': TEMPERATURE_ARGS,
+    'humidity': HUMIDITY_ARGS,
+    'model': MODEL_ARGS
+}
+
+
+class Metrics(object):
+    """
+    Scores a simulated run. Called with each
+    :class:`~dht22_controller.controller.TickState`, it weights what the
+    chamber was doing by how long (in virtual time) it kept doing it, and
+    ignores the first ``warmup_s`` seconds while the chamber pulls down to
+    target.
+
+    The band is measured on the model's true temperature and humidity, not
+    the noisy readings the controller sees.
+    """
+
+    def __init__(self, conf, model, warmup_s=0.):
+        self.conf = conf
+        self.model = model
+        self.warmup_s = warmup_s
+        self.start = None
+        self.last_at = None
+        self.last_state = None
+        self.last_temp_f = None
+        self.last_humidity = None
+
+        self.time_s = 0.
+        self.in_band_s = 0.
+        self.humidity_in_band_s = 0.
+        self.abs_error_f_s = 0.
+        self.cooling_s = 0.
+        self.heating_s = 0.
+        self.humidifying_s = 0.
+        self.dehumidifying_s = 0.
+        self.cool_cycles = 0
+        self.heat_cycles = 0
+        self.humidify_cycles = 0
+        self.dehumidify_cycles = 0
+        self.max_above_f = 0.
+        self.max_below_f = 0.
+
+    def __call__(self, state):
+        at = now()
+        if self.start is None:
+            self.start = at + timedelta(seconds=self.warmup_s)
+        previous = self.last_state
+        self.last_state = state
+        if at < self.start:
+            return
+
+        conf = self.conf
+        self.model.advance(at)
+        temp_f = self.model.temp_f
+        humidity = self.model.humidity
+
+        if self.last_at is not None:
+            # what was true at the last tick held until this one
+            dt = (at - self.last_at).total_seconds()
+            self.time_s += dt
+            if conf.min_temp_f <= self.last_temp_f <= conf.max_temp_f:
+                self.in_band_s += dt
+            if conf.min_humidity <= self.last_humidity <= conf.max_humidity:
+                self.humidity_in_band_s += dt
+            self.abs_error_f_s += abs(
+                self.last_temp_f - conf.target_temp_f) * dt
+            if previous.cooling_on: self.cooling_s += dt
+            if previous.heating_on: self.heating_s += dt
+            if previous.humidifier_on: self.humidifying_s += dt
+            if previous.dehumidifier_on: self.dehumidifying_s += dt
+
+        if previous is not None:
+            if state.cooling_on and not previous.cooling_on:
+                self.cool_cycles += 1
+            if state.heating_on and not previous.heating_on:
+                self.heat_cycles += 1
+            if state.humidifier_on and not previous.humidifier_on:
+                self.humidify_cycles += 1
+            if state.dehumidifier_on and not previous.dehumidifier_on:
+                self.dehumidify_cycles += 1
+
+        self.max_above_f = max(self.max_above_f, temp_f - conf.max_temp_f)
+        self.max_below_f = max(self.max_below_f, conf.min_temp_f - temp_f)
+        self.last_at = at
+        self.last_temp_f = temp_f
+        self.last_humidity = humidity
+
+    def summary(self):
+        """
+        The metrics as a flat dict. Fractions are of the scored time, and
+        cycles are counted per simulated day.
+        """
+        time_s = self.time_s
+        days = time_s / 86400.
+
+        def fraction(seconds):
+            return seconds / time_s if time_s else None
+
+        def per_day(cycles):
+            return cycles / days if days else None
+
+        return {
+            'scored_s': time_s,
+            'in_band': fraction(self.in_band_s),
+            'humidity_in_band': fraction(self.humidity_in_band_s),
+            'mean_abs_error_f': fraction(self.abs_error_f_s),
+            'max_above_f': self.max_above_f,
+            'max_below_f': self.max_below_f,
+            'cool_duty': fraction(self.cooling_s),
+            'heat_duty': fraction(self.heating_s),
+            'humidify_duty': fraction(self.humidifying_s),
+            'dehumidify_duty': fraction(self.dehumidifying_s),
+            'cool_cycles_per_day': per_day(self.cool_cycles),
+            'heat_cycles_per_day': per_day(self.heat_cycles),
+            'humidify_cycles_per_day': per_day(self.humidify_cycles),
+            'dehumidify_cycles_per_day': per_day(self.dehumidify_cycles),
+        }
+
+
+def route_params(params):
+    """
+    Split sweep parameters into ``{'config': ..., 'temperature': ...,
+    'humidity': ..., 'model': ...}`` keyword dicts.
+
+    A name can be qualified with its section (``humidity.recently_minutes``,
+    ``model.leak_s``). Unqualified names go to the first of the config,
+    :class:`~dht22_controller.temperature.Temperature`,
+    :class:`~dht22_controller.humidity.Humidity` and
+    :class:`~dht22_controller.model.ChamberModel` that takes them. Derived
+    config values like ``min_temp_f`` aren't settings, so sweep their target
+    and pad instead.
+    """
+    routed = dict((section, {}) for section in SECTIONS)
+    for name, value in params.items():
+        if '.' in name:
+            section, key = name.split('.', 1)
+            if section not in routed:
+                raise ValueError("unknown parameter section: {}".format(name))
+            if key not in SECTION_KEYS[section]:
+                raise ValueError("unknown parameter: {}".format(name))
+        elif name in CONFIG_KEYS:
+            section, key = 'config', name
+        elif name in TEMPERATURE_ARGS:
+            section, key = 'temperature', name
+        elif name in HUMIDITY_ARGS:
+            section, key = 'humidity', name
+        elif name in MODEL_ARGS:
+            section, key = 'model', name
+        else:
+            raise ValueError("unknown parameter: {}".format(name))
+        routed[section][key] = value
+    return routed
+
+
+def run_one(job):
+    """
+    Simulate one point of a sweep and return its row of results. ``job`` is a
+    dict with the ``params`` to try, the base ``config`` dict, ``days``,
+    ``warmup_s``, ``tick_s``, ``sample_interval_s`` and the model's ``seed``.
+
+    Runs in a worker process, so it's a top-level function taking a single
+    picklable argument. A run that fails is logged and reported with an
+    ``error`` instead of stopping the whole sweep.
+    """
+    params = job['params']
+    row = dict(params)
+    row['index'] = job['index']
+    try:
+        routed = route_params(params)
+        conf = Config()
+        conf.config = dict(job['config'])
+        conf.config.update(routed['config'])
+
+        model_kwargs = dict(conf.simulation)
+        model_kwargs.setdefault('seed', job['seed'])
+        model_kwargs.update(routed['model'])
+        model = ChamberModel(**model_kwargs)
+
+        metrics = Metrics(conf, model, job['warmup_s'])
+        simulator = Simulator(conf, model=model,
+            temperature=routed['temperature'],
+            humidity=routed['humidity'],
+            sample_interval_s=job['sample_interval_s'],
+            tick_s=job['tick_s'],
+            on_tick=[metrics])
+        result = simulator.run(job['days'])
+    except Exception as e:
+        log.exception("exception occurred. params=%s", params)
+        row['error'] = repr(e)
+        return row
+
+    row.update(metrics.summary())
+    row['wall_s'] = result['wall_s']
+    row['cool_for_s'] = result['cool_for_s']
+    return row
+
+
+def grid(space):
+    """
+    Every combination of ``space``, a dict of parameter name to a list of
+    values.
+    """
+    names = sorted(space)
+    for name in names:
+        if not isinstance(space[name], list):
+            raise ValueError(
+                "grid values must be a list: {}={}".format(name, space[name]))
+    return [dict(zip(names, values))
+        for values in itertools.product(*[space[name] for name in names])]
+
+
+def random_search(space, n, seed=None):
+    """
+    ``n`` random points from ``space``, a dict of parameter name to either a
+    list of values to choose from or a ``(low, high)`` tuple to draw
+    uniformly from.
+    """
+    rng = random.Random(seed)
+    names = sorted(space)
+    points = []
+    for i in range(n):
+        point = {}
+        for name in names:
+            values = space[name]
+            if isinstance(values, tuple):
+                point[name] = rng.uniform(values[0], values[1])
+            else:
+                point[name] = rng.choice(values)
+        points.append(point)
+    return points
+
+
+def sweep(points, config=None, days=3., warmup_s=6 * 3600., tick_s=60.,
+    sample_interval_s=None, seed=0, processes=None):
+    """
+    Simulate every point (a dict of parameters, see :func:`route_params`)
+    starting from the ``config`` dict, fanning the runs out over a process
+    pool (one process per core by default). Returns the rows in the order of
+    ``points``.
+
+    Every run shares the same model ``seed``, so points are compared against
+    the same sensor noise.
+    """
+    jobs = [{
+        'index': index,
+        'params': params,
+        'config': config or {},
+        'days': days,
+        'warmup_s': warmup_s,
+        'tick_s': tick_s,
+        'sample_interval_s': sample_interval_s,
+        'seed': seed,
+    } for index, params in enumerate(points)]
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(jobs)))
+
+    rows = []
+    if processes == 1:
+        results = (run_one(job) for job in jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(run_one, jobs)
+    try:
+        for row in results:
+            rows.append(row)
+            log.info('finished %d/%d', len(rows), len(jobs))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    rows.sort(key=lambda row: row['index'])
+    return rows
+
+
+def write_results(filename, rows):
+    """
+    Write ``rows`` as a CSV table, parameter columns first.
+    """
+    metrics = set(Metrics(Config(), None).summary())
+    metrics.update(['wall_s', 'cool_for_s', 'error'])
+    columns = set()
+    for row in rows:
+        columns.update(row)
+    params = sorted(columns - metrics - set(['index']))
+    fieldnames = ['index'] + params + sorted(columns & metrics)
+
+    with open(filename, 'w') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames, restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _parse_param(text):
+    # name=a,b,c (values) or name=low:high (a range, random search only)
+    name, _, values = text.partition('=')
+    if not name or not values:
+        raise argparse.ArgumentTypeError(
+            "expected name=a,b,c or name=low:high: {}".format(text))
+    if ':' in values:
+        low, high = values.split(':', 1)
+        return name, (float(low), float(high))
+    return name, [_parse_value(value) for value in values.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sweep controller parameters over the simulator.")
+    parser.add_argument('--param', type=_parse_param, action='append',
+        default=[], help="name=a,b,c or name=low:high (repeatable)")
+    parser.add_argument('--random', type=int, default=None,
+        help="try this many random points instead of the full grid")
+    parser.add_argument('--days', type=float, default=3.,
+        help="simulated days per run (default: %(default)s)")
+    parser.add_argument('--warmup-hours', type=float, default=6.,
+        help="hours at the start of each run not scored (default: %(default)s)")
+    parser.add_argument('--sample-interval', type=float, default=None,
+        help="seconds between sensor samples (default: from the config)")
+    parser.add_argument('--config', default=None,
+        help="config.json to start from (default: the controller's)")
+    parser.add_argument('--processes', type=int, default=None,
+        help="worker processes (default: one per core)")
+    parser.add_argument('--seed', type=int, default=0,
+        help="model and random search seed (default: %(default)s)")
+    parser.add_argument('--out', default='sweep.csv',
+        help="results table (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    conf = Config()
+    conf.load(args.config)
+
+    space = dict(args.param)
+    if args.random is None:
+        points = grid(space)
+    else:
+        points = random_search(space, args.random, args.seed)
+
+    rows = sweep(points, conf.config, days=args.days,
+        warmup_s=args.warmup_hours * 3600.,
+        sample_interval_s=args.sample_interval, seed=args.seed,
+        processes=args.processes)
+    write_results(args.out, rows)
+
+    ranked = sorted((row for row in rows if row.get('in_band') is not None),
+        key=lambda row: (-row['in_band'], row['cool_cycles_per_day']))
+    for row in ranked[:10]:
+        print('in_band={:.3f} cycles/day={:.1f} {}'.format(
+            row['in_band'], row['cool_cycles_per_day'],
+            ' '.join('{}={}'.format(name, row[name]) for name in sorted(space))))
+    print('{} runs written to {}'.format(len(rows), args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
 from dht22_controller.capped_queue import CappedQueue
-from dht22_controller.utils import now, clip
+from dht22_controller.utils import clock, clip
 from dht22_controller.learn import *
 from dht22_controller.datastore import load, save
-from datetime import timedelta
+from dht22_controller.compact import maybe_compact
+from os.path import join
 
 
 import logging
@@ -16,22 +17,29 @@ def c_to_f(value):
 class Temperature(object):
 
     def __init__(self, config, queue_size=10, debug=False, cool_for_s=20.,
-        heat_for_s=20., has_cooler=False, has_heater=False, recently_minutes=5.):
+        heat_for_s=20., has_cooler=False, has_heater=False, recently_minutes=5.,
+        learn_multiplier=3.0, min_cool_time_s=10., max_cool_time_s=60. * 5.,
+        min_heat_time_s=3., max_heat_time_s=60. * 5.):
         self.queue = CappedQueue(cap=queue_size)
         self.config = config
+        # what update() reads its thresholds from
+        self.settings = config.snapshot()
         self.debug = debug
-        self.learn_cool_file = "/home/pi/controller_data/lcool.csv"
-        self.learn_heat_file = "/home/pi/controller_data/lheat.csv"
-        self.cool_for_s = self.load_cool(cool_for_s)
-        self.heat_for_s = self.load_heat(heat_for_s)
+        self.learn_cool_file = join(config.data_dir, "lcool.csv")
+        self.learn_heat_file = join(config.data_dir, "lheat.csv")
+        # with debug the learn files aren't touched at all (loading writes an
+        # index next to them), so simulations can't read or race on real data
+        self.cool_for_s = cool_for_s if debug else self.load_cool(cool_for_s)
+        self.heat_for_s = heat_for_s if debug else self.load_heat(heat_for_s)
         self.has_heater = has_heater
         self.has_cooler = has_cooler
         self.cooling_on = False
         self.heating_on = False
         self.cooler_enabled_at = None
         self.heater_enabled_at = None
-        self.last_cooling = now() - timedelta(minutes=recently_minutes)
-        self.last_heating = now() - timedelta(minutes=recently_minutes)
+        # times are float seconds from utils.clock()
+        self.last_cooling = clock() - recently_minutes * 60.
+        self.last_heating = clock() - recently_minutes * 60.
         self.last_minimum = None
         self.last_maximum = None
         self.waiting_for_temp_increase = False
@@ -39,22 +47,62 @@ class Temperature(object):
         self.start_cool_temp = None
         self.start_heat_temp = None
         self.recently_minutes = recently_minutes
+        # tuning for learn() and the limits on how long to run for
+        self.learn_multiplier = learn_multiplier
+        self.min_cool_time_s = min_cool_time_s
+        self.max_cool_time_s = max_cool_time_s
+        self.min_heat_time_s = min_heat_time_s
+        self.max_heat_time_s = max_heat_time_s
+
+    # what get_state() saves besides the sample window
+    STATE = ('cool_for_s', 'heat_for_s', 'cooling_on', 'heating_on',
+        'cooler_enabled_at', 'heater_enabled_at', 'last_cooling',
+        'last_heating', 'last_minimum', 'last_maximum',
+        'waiting_for_temp_increase', 'waiting_for_temp_decrease',
+        'start_cool_temp', 'start_heat_temp')
+
+    # the part of the state that only means anything while the readings it
+    # came from are recent
+    WINDOW_STATE = ('last_minimum', 'last_maximum',
+        'waiting_for_temp_increase', 'waiting_for_temp_decrease',
+        'start_cool_temp', 'start_heat_temp')
+
+    def get_state(self):
+        """
+        Everything update() has learned or is waiting on, as a dict that can
+        be saved as json and handed to :meth:`set_state`.
+        """
+        state = dict((name, getattr(self, name)) for name in self.STATE)
+        state['window'] = self.queue.tolist()
+        return state
+
+    def set_state(self, state):
+        for name in self.STATE:
+            if name in state:
+                setattr(self, name, state[name])
+        self.queue = CappedQueue(cap=self.queue.cap)
+        for value in state.get('window', [])[-self.queue.cap:]:
+            self.queue.put(value)
 
     def load_cool(self, default_seconds=45.):
         return load(self.learn_cool_file, default_seconds,
-            self.config.min_temp_f)
+            self.settings.min_temp_f)
 
     def save_cool(self, seconds, starting_temp, resulting_temp):
-        save(self.learn_cool_file, starting_temp, self.config.min_temp_f,
+        save(self.learn_cool_file, starting_temp, self.settings.min_temp_f,
             resulting_temp, seconds)
+        maybe_compact(self.learn_cool_file, self.settings.learn_max_bytes,
+            self.settings.learn_keep_rows)
 
     def load_heat(self, default_seconds=45.):
         return load(self.learn_heat_file, default_seconds,
-            self.config.max_temp_f)
+            self.settings.max_temp_f)
 
     def save_heat(self, seconds, starting_temp, resulting_temp):
-        save(self.learn_heat_file, starting_temp, self.config.max_temp_f,
+        save(self.learn_heat_file, starting_temp, self.settings.max_temp_f,
             resulting_temp, seconds)
+        maybe_compact(self.learn_heat_file, self.settings.learn_max_bytes,
+            self.settings.learn_keep_rows)
 
     def add(self, temperature):
         """
@@ -63,81 +111,133 @@ class Temperature(object):
         if temperature < 0. or temperature > 110.: return
         self.queue.put(temperature)
 
-    def change_config(config):
+    def change_config(self, config):
         """
-        Update the config.
+        Update the config. If the band moved, the run times are reloaded from
+        what was learned for the new thresholds (keeping the current ones if
+        nothing was, or with ``debug``).
         """
-        self.config = config
+        self.prepare_config(config)()
+
+    def prepare_config(self, config):
+        """
+        Do the part of :meth:`change_config` that can fail (reloading the run
+        times) without changing anything, and return a function that swaps
+        the result in and can't fail.
+        """
+        settings = config.snapshot()
+        cool_for_s = heat_for_s = None
+        if not self.debug and settings.min_temp_f != self.settings.min_temp_f:
+            cool_for_s = load(self.learn_cool_file, self.cool_for_s,
+                settings.min_temp_f)
+        if not self.debug and settings.max_temp_f != self.settings.max_temp_f:
+            heat_for_s = load(self.learn_heat_file, self.heat_for_s,
+                settings.max_temp_f)
+
+        def apply():
+            self.config = config
+            self.settings = settings
+            if cool_for_s is not None:
+                self.cool_for_s = cool_for_s
+            if heat_for_s is not None:
+                self.heat_for_s = heat_for_s
+        return apply
 
     def temperature_average_f(self):
         """
         Get the average temperature from the queue.
         """
-        l = self.queue.tolist()
-        return sum(l) / float(len(l))
+        return self.queue.average()
 
-    def cooling_for(self):
+    def temperature_min_f(self):
         """
-        How long we've been cooling for.
+        Get the lowest temperature in the queue.
+        """
+        return self.queue.minimum()
+
+    def temperature_max_f(self):
+        """
+        Get the highest temperature in the queue.
+        """
+        return self.queue.maximum()
+
+    def temperature_median_f(self):
+        """
+        Get the median temperature in the queue.
+        """
+        return self.queue.median()
+
+    def cooling_for(self, at=None):
+        """
+        How many seconds we've been cooling for (as of ``at``, from
+        :func:`~dht22_controller.utils.clock`).
         """
         if self.cooler_enabled_at is None: return None
-        return now() - self.cooler_enabled_at
+        return (clock() if at is None else at) - self.cooler_enabled_at
 
-    def heating_for(self):
+    def heating_for(self, at=None):
         """
-        How long we've been heating for.
+        How many seconds we've been heating for.
         """
         if self.heater_enabled_at is None: return None
-        return now() - self.heater_enabled_at
+        return (clock() if at is None else at) - self.heater_enabled_at
 
-    def cooled_recently(self, minutes=None):
+    def cooled_recently(self, minutes=None, at=None):
         """
         Have we cooled recently?
         """
         minutes = self.recently_minutes if minutes is None else minutes
-        return (now() - self.last_cooling) <= timedelta(minutes=minutes)
+        return (clock() if at is None else at) - self.last_cooling <= \
+            minutes * 60.
 
-    def heated_recently(self, minutes=None):
+    def heated_recently(self, minutes=None, at=None):
         """
         Have we heated recently?
         """
         minutes = self.recently_minutes if minutes is None else minutes
-        return (now() - self.last_heating) <= timedelta(minutes=minutes)
+        return (clock() if at is None else at) - self.last_heating <= \
+            minutes * 60.
 
     def update(self):
         """
         Update our flags. This enables / disables heating and cooling given
         our queue of temperatures.
         """
+        # one clock reading for every decision in this update
+        at = clock()
+        settings = self.settings
         t = self.temperature_average_f()
+        if t is None:
+            # no readings yet
+            return
         if self.last_maximum is None: self.last_maximum = t
         if self.last_minimum is None: self.last_minimum = t
         self.last_maximum = max(t, self.last_maximum)
         self.last_minimum = min(t, self.last_minimum)
 
         if self.cooling_on:
-            secs_reached = self.cooling_for() >= timedelta(seconds=self.cool_for_s)
-            overshooting = t < self.config.min_temp_f # overshooting the temp
+            secs_reached = at >= self.cooler_enabled_at + self.cool_for_s
+            overshooting = t < settings.min_temp_f # overshooting the temp
             if secs_reached or overshooting:
-                self.last_cooling = now()
+                self.last_cooling = at
                 self.cooling_on = False
                 self.waiting_for_temp_increase = True
                 # we're overshooting the temp, so set the time to cool for
                 # equal to the current elapsed time
                 if overshooting:
-                    self.cool_for_s = self.cooling_for()
+                    self.cool_for_s = at - self.cooler_enabled_at
                     log.info("overshooting, cool_for_s now %s", self.cool_for_s)
         elif self.heating_on:
-            secs_reached = self.heating_for() >= timedelta(seconds=self.heat_for_s)
-            overshooting = t > self.config.max_temp_f # overshooting the temp
+            secs_reached = at >= self.heater_enabled_at + self.heat_for_s
+            overshooting = t > settings.max_temp_f # overshooting the temp
             if secs_reached or overshooting:
-                self.last_heating = now()
+                self.last_heating = at
                 self.heating_on = False
                 self.waiting_for_temp_decrease = True
                 # we're overshooting the temp, so set the time to cool for
                 # equal to the current elapsed time
                 if overshooting:
-                    self.heat_for_s = self.heating_for()
+                    self.heat_for_s = at - self.heater_enabled_at
                     log.info("overshooting, heat_for_s now %s", self.heat_for_s)
         else:
             # --------------------------------
@@ -146,7 +246,7 @@ class Temperature(object):
 
             if self.waiting_for_temp_increase:
                 # we just ran the cooler and are waiting for the temp to increase
-                if self.cooled_recently(1.): return
+                if self.cooled_recently(1., at): return
                 if t < self.last_minimum + .2:
                     return
 
@@ -157,28 +257,26 @@ class Temperature(object):
                     save=self.save_cool,
                     current_time_s=self.cool_for_s,
                     starting_value=self.start_cool_temp,
-                    starting_threshold=self.config.max_temp_f,
-                    pad=self.config.temp_pad,
-                    target=self.config.min_temp_f,
+                    starting_threshold=settings.max_temp_f,
+                    pad=settings.temp_pad,
+                    target=settings.min_temp_f,
                     actual=self.last_minimum,
                     debug=self.debug,
-                    multiplier=3.0,
+                    multiplier=self.learn_multiplier,
                     increasing=False)
                 log.debug(
                     'last_s=%.01f run_s=%.01f target=%.02f actual=%.02f',
                     self.cool_for_s,
                     cool_for,
-                    self.config.min_temp_f,
+                    settings.min_temp_f,
                     self.last_minimum)
 
                 # update the number of seconds to cool for
-                min_cool_time_s = 10.
-                max_cool_time_s = 60. * 5.
                 self.cool_for_s = clip(
-                    cool_for - diff, min_cool_time_s, max_cool_time_s)
+                    cool_for - diff, self.min_cool_time_s, self.max_cool_time_s)
             elif self.waiting_for_temp_decrease:
                 # we just ran the heater and are waiting for the temp to decrease
-                if self.heated_recently(1.): return
+                if self.heated_recently(1., at): return
                 if t > self.last_maximum - .2:
                     return
 
@@ -189,66 +287,63 @@ class Temperature(object):
                     save=self.save_heat,
                     current_time_s=self.heat_for_s,
                     starting_value=self.start_heat_temp,
-                    starting_threshold=self.config.min_temp_f,
-                    pad=self.config.temp_pad,
-                    target=self.config.max_temp_f,
+                    starting_threshold=settings.min_temp_f,
+                    pad=settings.temp_pad,
+                    target=settings.max_temp_f,
                     actual=self.last_maximum,
                     debug=self.debug,
-                    multiplier=3.0,
+                    multiplier=self.learn_multiplier,
                     increasing=True)
                 log.debug(
                     'last_s=%.01f run_s=%.01f target=%.02f actual=%.02f',
                     self.heat_for_s,
                     heat_for,
-                    self.config.max_temp_f,
+                    settings.max_temp_f,
                     self.last_maximum)
 
                 # update the number of seconds to heat for
-                min_heat_time_s = 3.
-                max_heat_time_s = 60. * 5.
                 self.heat_for_s = clip(
-                    heat_for + diff, min_heat_time_s, max_heat_time_s)
-            elif t >= self.config.max_temp_f:
-                if self.heated_recently(): return
-                if self.cooled_recently(2.5): return
+                    heat_for + diff, self.min_heat_time_s, self.max_heat_time_s)
+            elif t >= settings.max_temp_f:
+                if self.heated_recently(at=at): return
+                if self.cooled_recently(2.5, at): return
                 if not self.has_cooler: return
                 # if it's warm and we weren't just running a heater, turn
                 # our cooling on
                 self.cooling_on = True
-                self.cooler_enabled_at = now()
+                self.cooler_enabled_at = at
                 self.last_minimum = t
                 self.start_cool_temp = t
 
-                min_cool_time_s = 10.
-                max_cool_time_s = 60. * 5.
                 self.cool_for_s = clip(
                     time_boost(
-                        self.cool_for_s, t, self.config.max_temp_f, self.config.temp_pad, increasing=False),
-                    min_cool_time_s,
-                    max_cool_time_s)
+                        self.cool_for_s, t, settings.max_temp_f, settings.temp_pad, increasing=False),
+                    self.min_cool_time_s,
+                    self.max_cool_time_s)
                 log.debug('cooling for %.02fs', self.cool_for_s)
-            elif t <= self.config.min_temp_f:
-                if self.heated_recently(2.5): return
-                if self.cooled_recently(): return
+            elif t <= settings.min_temp_f:
+                if self.heated_recently(2.5, at): return
+                if self.cooled_recently(at=at): return
                 if not self.has_heater: return
                 # if it's cool and we weren't just running a cooler, turn
                 # our heating on
                 self.heating_on = True
-                self.heater_enabled_at = now()
+                self.heater_enabled_at = at
                 self.last_maximum = t
                 self.start_heat_temp = t
 
-                min_heat_time_s = 3.
-                max_heat_time_s = 60. * 5.
                 self.heat_for_s = clip(
                     time_boost(
-                        self.heat_for_s, t, self.config.min_temp_f, self.config.temp_pad, increasing=True),
-                    min_heat_time_s,
-                    max_heat_time_s)
+                        self.heat_for_s, t, settings.min_temp_f, settings.temp_pad, increasing=True),
+                    self.min_heat_time_s,
+                    self.max_heat_time_s)
                 if not self.debug:
                     log.debug('heating for %.02fs', self.heat_for_s)
             else:
                 pass
 
     def __str__(self):
-        return "temp*f={:.1f}".format(self.temperature_average_f())
+        t = self.temperature_average_f()
+        if t is None:
+            return "temp*f=None"
+        return "temp*f={:.1f}".format(t)
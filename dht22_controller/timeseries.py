@@ -0,0 +1,269 @@
+"""
+Compact, append-only binary storage for sensor readings.
+
+Readings are stored as fixed-width little-endian records (uint32 epoch
+seconds followed by float32 temperature, average temperature, humidity and
+average humidity) in one segment file per UTC day. Each segment starts with a
+short magic header so that it can be memory mapped straight into a NumPy
+structured array.
+"""
+import argparse
+import calendar
+import csv
+from datetime import datetime
+from glob import glob
+import os
+from os.path import exists, getsize, isdir, isfile, join
+import struct
+import sys
+from dht22_controller.utils import now
+
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+import logging
+log = logging.getLogger(__name__)
+
+
+__all__ = [
+    "SegmentWriter",
+    "segment_files",
+    "iter_segment",
+    "read_segment",
+    "export_csv"
+]
+
+
+MAGIC = b'DHT22TS1'
+RECORD = struct.Struct('<Iffff')
+SEGMENT_EXT = '.dts'
+
+if np is not None:
+    DTYPE = np.dtype([
+        ('time', '<u4'),
+        ('t', '<f4'),
+        ('tavg', '<f4'),
+        ('h', '<f4'),
+        ('havg', '<f4')])
+
+
+def to_epoch(dt):
+    return calendar.timegm(dt.utctimetuple())
+
+
+def segment_name(dt):
+    return dt.strftime('%Y%m%d') + SEGMENT_EXT
+
+
+class SegmentWriter(object):
+    """
+    Appends readings to the segment for the day they were taken on.
+
+    Like :class:`~dht22_controller.recorder.BufferedCsvWriter`, records are
+    buffered and committed (and fsync'd) every ``max_rows`` records or
+    ``max_interval_s`` seconds.
+    """
+
+    def __init__(self, directory, max_rows=60, max_interval_s=60.):
+        self.directory = directory
+        self.max_rows = max_rows
+        self.max_interval_s = max_interval_s
+        self.buffer = bytearray()
+        self.rows = 0
+        self.segment = None
+        self.last_commit = now()
+        self.segfile = None
+
+    def open(self, segment):
+        if self.segment == segment and self.segfile is not None:
+            return
+        self.close_segment()
+
+        if not isdir(self.directory):
+            os.makedirs(self.directory)
+        filename = join(self.directory, segment)
+        size = getsize(filename) if isfile(filename) else 0
+        if size >= len(MAGIC):
+            with open(filename, 'rb') as f:
+                header = f.read(len(MAGIC))
+            if header != MAGIC:
+                # keep it for inspection (without clobbering one moved aside
+                # earlier), and start the day's segment afresh
+                aside = filename + '.corrupt'
+                n = 0
+                while exists(aside):
+                    n += 1
+                    aside = '{}.corrupt.{}'.format(filename, n)
+                log.error("corrupt segment header, moving it aside. "
+                    "filename=%s, header=%r, aside=%s", filename, header, aside)
+                os.rename(filename, aside)
+                size = 0
+        segfile = open(filename, 'ab')
+        if size < len(MAGIC):
+            if size:
+                # a header torn by a crash
+                log.warning(
+                    "truncating partial header. filename=%s, size=%s",
+                    filename, size)
+                segfile.truncate(0)
+            segfile.write(MAGIC)
+        else:
+            # drop a partially written record left behind by a crash
+            whole = len(MAGIC) + \
+                (size - len(MAGIC)) // RECORD.size * RECORD.size
+            if whole != size:
+                log.warning(
+                    "truncating partial record. filename=%s, size=%s",
+                    filename, size)
+                segfile.truncate(whole)
+        self.segfile = segfile
+        self.segment = segment
+
+    def append(self, timestamp, t, tavg, h, havg):
+        """
+        Buffer a reading taken at the (UTC) datetime ``timestamp``.
+        """
+        segment = segment_name(timestamp)
+        if segment != self.segment and self.rows:
+            # keep each day's records in its own segment
+            self.commit()
+        self.open(segment)
+
+        self.buffer += RECORD.pack(to_epoch(timestamp), t, tavg, h, havg)
+        self.rows += 1
+        if self.rows >= self.max_rows or \
+                (now() - self.last_commit).total_seconds() >= self.max_interval_s:
+            self.commit()
+
+    def commit(self):
+        """
+        Write the buffered records and fsync the segment.
+        """
+        self.last_commit = now()
+        if not self.rows:
+            return
+
+        try:
+            self.segfile.write(self.buffer)
+            self.segfile.flush()
+            os.fsync(self.segfile.fileno())
+        except Exception as e:
+            log.exception(
+                "exception occurred. directory=%s, segment=%s, rows=%s",
+                self.directory, self.segment, self.rows)
+            raise
+        del self.buffer[:]
+        self.rows = 0
+
+    def close_segment(self):
+        if self.segfile is not None:
+            self.segfile.close()
+            self.segfile = None
+            self.segment = None
+
+    def close(self):
+        """
+        Commit anything that's buffered and close the segment.
+        """
+        try:
+            self.commit()
+        finally:
+            self.close_segment()
+
+
+def segment_files(directory):
+    """
+    The segment files in ``directory``, oldest first.
+    """
+    return sorted(glob(join(directory, '*' + SEGMENT_EXT)))
+
+
+def _record_count(filename):
+    size = getsize(filename) - len(MAGIC)
+    return max(0, size) // RECORD.size
+
+
+def _check_magic(segfile, filename):
+    if segfile.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a segment file: {}".format(filename))
+
+
+def iter_segment(filename):
+    """
+    Yield ``(time, t, tavg, h, havg)`` tuples from a segment, where ``time``
+    is in epoch seconds.
+    """
+    count = _record_count(filename)
+    with open(filename, 'rb') as segfile:
+        _check_magic(segfile, filename)
+        chunk_records = 4096
+        while count > 0:
+            n = min(count, chunk_records)
+            data = segfile.read(n * RECORD.size)
+            for offset in range(0, n * RECORD.size, RECORD.size):
+                yield RECORD.unpack_from(data, offset)
+            count -= n
+
+
+def read_segment(filename):
+    """
+    Memory map a segment into a read-only NumPy structured array with the
+    fields ``time``, ``t``, ``tavg``, ``h`` and ``havg``. No data is copied.
+    """
+    if np is None:
+        raise ImportError("numpy is required to memory map segments")
+
+    count = _record_count(filename)
+    with open(filename, 'rb') as segfile:
+        _check_magic(segfile, filename)
+    if count == 0:
+        return np.zeros(0, dtype=DTYPE)
+    return np.memmap(filename, dtype=DTYPE, mode='r', offset=len(MAGIC),
+        shape=(count,))
+
+
+def export_csv(paths, out):
+    """
+    Write the readings in the segments (or directories of segments) in
+    ``paths`` to the file object ``out`` in the data.csv format.
+    """
+    writer = csv.writer(out, delimiter=",")
+    for path in paths:
+        files = segment_files(path) if isdir(path) else [path]
+        for filename in files:
+            for time, t, tavg, h, havg in iter_segment(filename):
+                writer.writerow([
+                    datetime.utcfromtimestamp(time).strftime(
+                        '%Y-%m-%dT%H:%M:%S'),
+                    '{:.2f}'.format(t),
+                    '{:.2f}'.format(tavg),
+                    '{:.2f}'.format(h),
+                    '{:.2f}'.format(havg)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Tools for binary sensor data segments.")
+    subparsers = parser.add_subparsers(dest='command')
+    export = subparsers.add_parser(
+        'export', help="export segments to the data.csv format")
+    export.add_argument('paths', nargs='+',
+        help="segment files or directories of segment files")
+    export.add_argument('-o', '--output', default=None,
+        help="csv file to write to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        if args.output is None:
+            export_csv(args.paths, sys.stdout)
+        else:
+            with open(args.output, 'w') as out:
+                export_csv(args.paths, out)
+
+
+if __name__ == '__main__':
+    main()
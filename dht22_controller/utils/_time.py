@@ -1,27 +1,83 @@
-from time import sleep
-from datetime import datetime
+from time import sleep, time
+from datetime import datetime, timedelta
 
 
 __all__ = [
     "set_now",
     "now",
+    "set_clock",
+    "clock",
+    "to_seconds",
+    "from_seconds",
     "set_sleep",
     "sleep"
 ]
 
 
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_seconds(at):
+    """
+    A datetime as float seconds on :func:`clock`'s timeline.
+    """
+    d = at - EPOCH
+    return ((d.days * 86400 + d.seconds) * 1000000 + d.microseconds) / 1e6
+
+
+def from_seconds(seconds):
+    """
+    The first microsecond at or after ``seconds`` (on :func:`clock`'s
+    timeline) as a datetime, so that
+    ``to_seconds(from_seconds(s)) >= s`` always holds.
+    """
+    us = int(seconds * 1e6)
+    while us / 1e6 < seconds:
+        us += 1
+    while (us - 1) / 1e6 >= seconds:
+        us -= 1
+    return EPOCH + timedelta(microseconds=us)
+
+
 NOW = datetime.utcnow
+CLOCK = time
 
 
 def set_now(func):
-    global NOW
+    """
+    Point :func:`now` at ``func``, and :func:`clock` at the same time
+    (pass ``datetime.utcnow`` to go back to the system clock).
+    """
+    global NOW, CLOCK
     NOW = func
+    # bound builtins are new objects on every lookup, so compare with ==
+    if func == datetime.utcnow:
+        CLOCK = time
+    else:
+        CLOCK = lambda: to_seconds(func())
 
 
 def now():
     return NOW()
 
 
+def set_clock(func):
+    """
+    Point :func:`clock` at ``func`` on its own, e.g. a virtual clock that
+    can give float seconds without going through a datetime.
+    """
+    global CLOCK
+    CLOCK = func
+
+
+def clock():
+    """
+    The time :func:`now` returns, as float seconds since 1970. The
+    controllers sample it once per update and compare plain floats.
+    """
+    return CLOCK()
+
+
 SLEEP = sleep
 
 
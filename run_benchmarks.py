@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+from benchmarks.cases import BENCHMARKS
+from benchmarks.harness import compare, load_results, run_benchmarks, \
+    save_results
+
+
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+
+
+def print_results(results):
+    for name in sorted(results['results']):
+        result = results['results'][name]
+        allocations = ' '.join('{}={:.1f}'.format(key, value)
+            for key, value in sorted(result.items()) if key.startswith(
+                ('alloc_net', 'gc_net')))
+        print('{:<26} {:>12.3f} us/op  (median {:.3f})  {}'.format(
+            name, result['per_op_s'] * 1e6, result['median_s'] * 1e6,
+            allocations))
+
+
+def print_comparison(rows):
+    for name, metric, old, new, ratio, regressed in rows:
+        print('{:<26} {:<24} {:>12.4g} -> {:<12.4g} x{:.2f}{}'.format(
+            name, metric, old, new, ratio, '  REGRESSED' if regressed else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the control hot paths.")
+    parser.add_argument('--inc', default='',
+        help="only run benchmarks whose names contain one of these (a,b,...)")
+    parser.add_argument('--exc', default='',
+        help="skip benchmarks whose names contain one of these (a,b,...)")
+    parser.add_argument('--repeat', type=int, default=5,
+        help="timed runs per benchmark (default: %(default)s)")
+    parser.add_argument('--number', type=int, default=None,
+        help="operations per run (default: calibrated)")
+    parser.add_argument('--out', default=None,
+        help="save the results as JSON")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+        help="results to compare against (default: %(default)s)")
+    parser.add_argument('--threshold', type=float, default=None,
+        help="allowed slowdown as a fraction, overriding each benchmark's")
+    parser.add_argument('--save-baseline', action='store_true',
+        help="save the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(BENCHMARKS, repeat=args.repeat,
+        number=args.number,
+        include=[i for i in args.inc.split(',') if i],
+        exclude=[e for e in args.exc.split(',') if e])
+    print_results(results)
+    if args.out:
+        save_results(args.out, results)
+
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print('saved the baseline to {}'.format(args.baseline))
+        return 0
+    if not os.path.isfile(args.baseline):
+        print('no baseline at {} (create one with --save-baseline)'.format(
+            args.baseline))
+        return 0
+
+    rows = compare(results, load_results(args.baseline), args.threshold)
+    print('')
+    print_comparison(rows)
+    regressions = sum(1 for row in rows if row[-1])
+    if regressions:
+        print('{} regression(s)'.format(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
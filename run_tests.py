@@ -3,6 +3,24 @@ import unittest
 from tests import basic
 from tests import temperature
 from tests import humidity
+from tests import capped_queue
+from tests import recorder
+from tests import timeseries
+from tests import query
+from tests import rollup
+from tests import datastore
+from tests import controller
+from tests import hardware
+from tests import simulator
+from tests import sweep
+from tests import replay
+from tests import fleet
+from tests import harness
+from tests import instrumentation
+from tests import exporter
+from tests import profiling
+from tests import config_watcher
+from tests import checkpoint
 from tests.custom_text_test_runner import CustomTextTestRunner
 
 
@@ -58,11 +76,52 @@ if __name__ == '__main__':
     basic_suite = load(basic.BasicTests)
     temp_suite = load(temperature.TemperatureTests)
     humi_suite = load(humidity.HumidityTests)
+    queue_suite = load(capped_queue.CappedQueueTests)
+    recorder_suite = load(recorder.RecorderTests)
+    timeseries_suite = load(timeseries.TimeseriesTests)
+    query_suite = load(query.QueryTests)
+    rollup_suite = load(rollup.RollupTests)
+    datastore_suite = load(datastore.DatastoreTests)
+    controller_suite = load(controller.ControllerTests)
+    scheduler_suite = load(controller.SchedulerTests)
+    sensor_suite = load(controller.SensorReaderTests)
+    hardware_suite = load(hardware.HardwareTests)
+    simulator_suite = load(simulator.SimulatorTests)
+    sweep_suite = load(sweep.SweepTests)
+    replay_suite = load(replay.ReplayTests)
+    fleet_suite = load(fleet.FleetTests)
+    harness_suite = load(harness.HarnessTests)
+    instrumentation_suite = load(
+        instrumentation.InstrumentationTests)
+    exporter_suite = load(exporter.ExporterTests)
+    profiling_suite = load(profiling.ProfilingTests)
+    config_watcher_suite = load(config_watcher.ConfigWatcherTests)
+    checkpoint_suite = load(checkpoint.CheckpointTests)
 
     all_tests = unittest.TestSuite([
         basic_suite,
         temp_suite,
-        humi_suite
+        humi_suite,
+        queue_suite,
+        recorder_suite,
+        timeseries_suite,
+        query_suite,
+        rollup_suite,
+        datastore_suite,
+        controller_suite,
+        scheduler_suite,
+        sensor_suite,
+        hardware_suite,
+        simulator_suite,
+        sweep_suite,
+        replay_suite,
+        fleet_suite,
+        harness_suite,
+        instrumentation_suite,
+        exporter_suite,
+        profiling_suite,
+        config_watcher_suite,
+        checkpoint_suite
     ])
 
     opts = parse_args(sys.argv)
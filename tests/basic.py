@@ -1,5 +1,10 @@
+from datetime import datetime, timedelta
+import random
+import time
 import unittest
 from dht22_controller.config import Config
+from dht22_controller.utils import clock, from_seconds, set_now, to_seconds
+from dht22_controller.utils import _time
 from tests.testbase import TestBase
 
 
@@ -11,6 +16,48 @@ class BasicTests(TestBase):
     def test_nothing(self):
         pass
 
+    def test_snapshot(self):
+        c = Config()
+        c.config['target_temp_f'] = 60
+        c.config['temp_pad'] = 1
+        c.config['simulation'] = {'seed': 1}
+        snapshot = c.snapshot()
+        for name in snapshot.__slots__:
+            self.assertEqual(getattr(c, name), getattr(snapshot, name))
+        self.assertEqual(59, snapshot.min_temp_f)
+        self.assertEqual(61, snapshot.max_temp_f)
+        self.assertIs(snapshot, snapshot.snapshot())
+        self.assertEqual(snapshot, c.snapshot())
+        with self.assertRaises(AttributeError):
+            snapshot.max_temp_f = 70
+
+        # later changes to the dict don't leak into it
+        c.config['target_temp_f'] = 50
+        c.config['simulation']['seed'] = 2
+        self.assertEqual(61, snapshot.max_temp_f)
+        self.assertEqual({'seed': 1}, snapshot.simulation)
+        self.assertNotEqual(snapshot, c.snapshot())
+
+    def test_clock_follows_now(self):
+        at = datetime(2000, 1, 1, 0, 0, 1, 500000)
+        set_now(lambda: at)
+        try:
+            self.assertEqual(946684801.5, clock())
+        finally:
+            set_now(datetime.utcnow)
+        # back on the fast path, not converting utcnow()
+        self.assertIs(time.time, _time.CLOCK)
+        self.assertTrue(abs(clock() - to_seconds(datetime.utcnow())) < 1.)
+
+    def test_from_seconds_rounds_up(self):
+        rng = random.Random(1)
+        for i in range(1000):
+            seconds = 946684800. + rng.uniform(0., 86400. * 365)
+            at = from_seconds(seconds)
+            self.assertTrue(to_seconds(at) >= seconds)
+            self.assertTrue(
+                to_seconds(at - timedelta(microseconds=1)) < seconds)
+
     # # DEPENDS ON CONFIG
     # def test_loads_config(self):
     #     c = Config()
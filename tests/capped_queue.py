@@ -0,0 +1,67 @@
+import random
+import unittest
+from dht22_controller.capped_queue import CappedQueue
+from tests.testbase import TestBase
+
+
+class CappedQueueTests(TestBase):
+
+    def test_holds_last_cap_items(self):
+        q = CappedQueue(cap=3)
+        for i in range(1, 6, 1):
+            q.put(i)
+
+        self.assertEqual([3., 4., 5.], q.tolist())
+        self.assertEqual(3, len(q))
+
+    def test_empty(self):
+        q = CappedQueue(cap=3)
+        self.assertIsNone(q.average())
+        self.assertIsNone(q.median())
+        self.assertIsNone(q.minimum())
+
+    def test_tolist_before_full(self):
+        q = CappedQueue(cap=5)
+        q.put(1)
+        q.put(2)
+
+        self.assertEqual([1., 2.], q.tolist())
+
+    def test_average_is_running(self):
+        q = CappedQueue(cap=4)
+        for i in range(1, 11, 1):
+            q.put(i)
+            l = q.tolist()
+            self.assertAlmostEqual(sum(l) / float(len(l)), q.average())
+
+    def test_average_does_not_drift(self):
+        q = CappedQueue(cap=7)
+        for i in range(100000):
+            q.put(60. + (i % 13) * .01)
+
+        l = q.tolist()
+        self.assertAlmostEqual(sum(l) / float(len(l)), q.average(), places=9)
+
+    def test_window_statistics_match_rescan(self):
+        q = CappedQueue(cap=9)
+        self.assertIsNone(q.minimum())
+        self.assertIsNone(q.maximum())
+        self.assertIsNone(q.median())
+
+        random.seed(22)
+        for i in range(2000):
+            # mix in repeats and long monotonic runs
+            if i % 300 < 100:
+                q.put(float(i))
+            else:
+                q.put(float(random.randint(0, 20)))
+
+            l = sorted(q.tolist())
+            n = len(l)
+            if n % 2:
+                median = l[n // 2]
+            else:
+                median = (l[n // 2 - 1] + l[n // 2]) / 2.
+            self.assertEqual(l[0], q.minimum())
+            self.assertEqual(l[-1], q.maximum())
+            self.assertEqual(median, q.median())
@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller import checkpoint
+from dht22_controller.checkpoint import Checkpointer, warm_start
+from dht22_controller.config import Config
+from dht22_controller.humidity import Humidity
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+
+
+class CheckpointTests(TestBase):
+
+    def setUp(self):
+        super(CheckpointTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'state', 'state.json')
+        self.conf = Config()
+        self.conf.config.update({'target_temp_f': 60, 'temp_pad': 1,
+            'target_humidity': 65, 'humidity_pad': 2, 'data_dir': self.dir})
+        self.time = datetime(2000, 1, 1)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        shutil.rmtree(self.dir)
+        super(CheckpointTests, self).tearDown()
+
+    def checkpointer(self, **kwargs):
+        temperature = Temperature(self.conf, debug=True, has_cooler=True)
+        humidity = Humidity(self.conf, has_dehumidifier=True)
+        return Checkpointer(self.filename, temperature, humidity, **kwargs)
+
+    def test_save_and_restore(self):
+        before = self.checkpointer(interval_s=60.)
+        self.assertFalse(before.restore())
+        for i in range(12):
+            self.time += timedelta(seconds=2)
+            before.temperature.add(60. + i)
+            before.humidity.add(70. + i)
+            before.temperature.update()
+            before.humidity.update()
+        self.assertTrue(before.temperature.cooling_on)
+        self.assertTrue(before.humidity.dehumidifier_on)
+
+        self.assertFalse(before.poll())
+        self.time += timedelta(seconds=40)
+        self.assertTrue(before.poll())
+        self.assertEqual(['state.json'],
+            os.listdir(os.path.dirname(self.filename)))
+
+        # restarted a little later
+        self.time += timedelta(seconds=5)
+        after = self.checkpointer()
+        self.assertTrue(after.restore())
+        for name in ('temperature', 'humidity'):
+            self.assertEqual(getattr(before, name).get_state(),
+                getattr(after, name).get_state())
+        self.assertEqual(before.temperature.queue.median(),
+            after.temperature.queue.median())
+
+        # carries on where it left off
+        self.time += timedelta(seconds=after.temperature.cool_for_s)
+        after.temperature.update()
+        self.assertFalse(after.temperature.cooling_on)
+        self.assertTrue(after.temperature.waiting_for_temp_increase)
+
+    def test_drops_a_stale_window(self):
+        before = self.checkpointer()
+        for i in range(12):
+            self.time += timedelta(seconds=2)
+            before.temperature.add(60. + i)
+            before.temperature.update()
+        self.assertTrue(before.temperature.cooling_on)
+        before.save()
+
+        self.time += timedelta(minutes=10)
+        after = self.checkpointer(window_max_age_s=300.)
+        self.assertTrue(after.restore())
+        self.assertEqual(0, len(after.temperature.queue))
+        self.assertIsNone(after.temperature.last_minimum)
+        self.assertIsNone(after.temperature.start_cool_temp)
+        # the learned and timing state still comes back
+        for name in ('cool_for_s', 'cooling_on', 'cooler_enabled_at',
+                'last_cooling'):
+            self.assertEqual(getattr(before.temperature, name),
+                getattr(after.temperature, name))
+
+    def test_failed_write_does_not_stop_the_loop(self):
+        c = self.checkpointer(interval_s=60.)
+        write_state = checkpoint.write_state
+        def fail(filename, state):
+            raise IOError(28, 'No space left on device')
+        checkpoint.write_state = fail
+        try:
+            self.time += timedelta(seconds=60)
+            self.assertFalse(c.poll())
+            # tried again after another interval, not on every loop
+            self.time += timedelta(seconds=1)
+            self.assertFalse(c.poll())
+            with self.assertRaises(IOError):
+                c.save()
+        finally:
+            checkpoint.write_state = write_state
+        self.time += timedelta(seconds=60)
+        self.assertTrue(c.poll())
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_ignores_stale_and_broken_checkpoints(self):
+        self.checkpointer().save()
+        self.time += timedelta(hours=2)
+        self.assertFalse(self.checkpointer(max_age_s=3600.).restore())
+        self.assertTrue(self.checkpointer(max_age_s=None).restore())
+
+        with open(self.filename, 'w') as f:
+            f.write('{"version": 1, "saved_')
+        self.assertFalse(self.checkpointer(max_age_s=None).restore())
+
+    def test_ignores_a_checkpoint_from_the_future(self):
+        before = self.checkpointer()
+        for i in range(12):
+            self.time += timedelta(seconds=2)
+            before.temperature.add(60. + i)
+            before.temperature.update()
+        self.assertTrue(before.temperature.cooling_on)
+        before.save()
+
+        # rebooted with the clock behind where it was
+        self.time -= timedelta(hours=1)
+        after = self.checkpointer(max_age_s=None)
+        self.assertFalse(after.restore())
+        self.assertEqual(0, len(after.temperature.queue))
+        self.assertFalse(after.temperature.cooling_on)
+
+    def test_warm_start(self):
+        c = self.checkpointer()
+        filename = os.path.join(self.dir, 'data.csv')
+        self.assertEqual(0, warm_start(c.temperature, c.humidity, filename))
+
+        # nothing to decide on yet
+        c.temperature.update()
+        c.humidity.update()
+        self.assertFalse(c.temperature.cooling_on)
+
+        with open(filename, 'w') as f:
+            for i in range(30):
+                at = self.time - timedelta(seconds=2 * (29 - i))
+                f.write('{},{:.2f},0.00,{:.2f},0.00\r\n'.format(
+                    at.strftime('%Y-%m-%dT%H:%M:%S'), 60. + i, 40. + i))
+        self.assertEqual(10, warm_start(c.temperature, c.humidity, filename))
+        self.assertEqual([float(80 + i) for i in range(10)],
+            c.temperature.queue.tolist())
+        self.assertEqual(64.5, c.humidity.average())
+
+        # only the rows that are recent enough
+        c = self.checkpointer()
+        self.time += timedelta(seconds=300 - 5)
+        self.assertEqual(3, warm_start(c.temperature, c.humidity, filename,
+            max_age_s=300.))
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.config import Config
+from dht22_controller.config_watcher import ConfigWatcher, changed_keys
+from dht22_controller.humidity import Humidity
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+
+
+class ConfigWatcherTests(TestBase):
+
+    def setUp(self):
+        super(ConfigWatcherTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.dir, 'config.json')
+        self.time = datetime(2000, 1, 1)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        shutil.rmtree(self.dir)
+        super(ConfigWatcherTests, self).tearDown()
+
+    def write(self, **settings):
+        settings.setdefault('data_dir', self.dir)
+        with open(self.filepath, 'w') as f:
+            json.dump(settings, f)
+        # make sure the mtime moves even on coarse filesystems
+        mtime = os.stat(self.filepath).st_mtime + 10
+        os.utime(self.filepath, (mtime, mtime))
+
+    def test_changed_keys(self):
+        self.assertEqual(['a', 'c', 'd'], changed_keys(
+            {'a': 1, 'b': 2, 'c': 3}, {'a': 2, 'b': 2, 'd': None}))
+
+    def test_reload(self):
+        self.write(target_temp_f=60, temp_pad=1)
+        conf = Config()
+        conf.load(self.filepath)
+        t = Temperature(conf)
+        h = Humidity(conf)
+        watcher = ConfigWatcher(conf, [t, h], interval_s=5.)
+
+        # unchanged
+        self.time += timedelta(seconds=10)
+        self.assertFalse(watcher.poll())
+
+        # not checked again until the interval has passed
+        self.write(target_temp_f=58, temp_pad=1)
+        self.time += timedelta(seconds=1)
+        self.assertFalse(watcher.poll())
+        self.assertEqual(61, t.config.max_temp_f)
+        self.time += timedelta(seconds=5)
+        self.assertTrue(watcher.poll())
+        self.assertIs(t.config, h.config)
+        self.assertEqual(59, t.config.max_temp_f)
+        self.assertEqual(58, watcher.config.target_temp_f)
+
+        # invalid settings and broken json are ignored
+        self.write(target_temp_f='cold', temp_pad=1)
+        self.time += timedelta(seconds=5)
+        self.assertFalse(watcher.poll())
+        with open(self.filepath, 'w') as f:
+            f.write('{"target_temp_f": ')
+        self.time += timedelta(seconds=5)
+        self.assertFalse(watcher.poll())
+        self.assertEqual(59, t.config.max_temp_f)
+
+    def test_failed_target_keeps_the_old_config(self):
+        self.write(target_temp_f=60, temp_pad=1)
+        conf = Config()
+        conf.load(self.filepath)
+        t = Temperature(conf)
+        h = Humidity(conf)
+
+        class Broken(object):
+            fail = True
+            def prepare_config(self, config):
+                if self.fail:
+                    raise IOError("learn file unreadable")
+                return lambda: None
+        broken = Broken()
+        watcher = ConfigWatcher(conf, [t, broken, h], interval_s=5.)
+
+        self.write(target_temp_f=58, temp_pad=1)
+        self.time += timedelta(seconds=5)
+        self.assertFalse(watcher.poll())
+        self.assertIs(conf, t.config)
+        self.assertIs(conf, h.config)
+        self.assertIs(conf, watcher.config)
+        self.assertEqual(61, t.settings.max_temp_f)
+
+        # the same file is tried again once the target recovers
+        broken.fail = False
+        self.time += timedelta(seconds=5)
+        self.assertTrue(watcher.poll())
+        self.assertEqual(59, t.settings.max_temp_f)
+        self.assertIs(t.config, h.config)
@@ -0,0 +1,156 @@
+import unittest
+from dht22_controller.config import Config
+from dht22_controller.controller import Controller
+from dht22_controller.humidity import Humidity
+from dht22_controller.scheduler import Scheduler
+from dht22_controller.sensor import SensorReader
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import from_seconds, set_now
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+c = Config()
+c.config['target_temp_f'] = 60
+c.config['temp_pad'] = 1
+
+
+def failing_sensor():
+    return (None, None)
+
+
+class ControllerTests(TestBase):
+
+    def setUp(self):
+        super(ControllerTests, self).setUp()
+        self.time = datetime(2000, 1, 1, 0, 0, 0)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(ControllerTests, self).tearDown()
+
+    def controller(self):
+        return Controller(
+            Temperature(c, debug=True, has_cooler=True, cool_for_s=20.),
+            Humidity(c, debug=True),
+            failing_sensor)
+
+    def test_no_tick_before_first_reading(self):
+        controller = self.controller()
+        controller.tick()
+        self.assertFalse(controller.temperature.cooling_on)
+
+    def test_shuts_off_while_sensor_is_failing(self):
+        controller = self.controller()
+        self.time += timedelta(seconds=1)
+        controller.sensor.publish(70., 65.)
+        controller.tick()
+        self.assertTrue(controller.temperature.cooling_on)
+        cool_for_s = controller.temperature.cool_for_s
+
+        # no more readings arrive, but ticks keep running
+        self.time += timedelta(seconds=cool_for_s - 1)
+        controller.tick()
+        self.assertTrue(controller.temperature.cooling_on)
+        self.time += timedelta(seconds=1)
+        controller.tick()
+        self.assertFalse(controller.temperature.cooling_on)
+
+    def test_schedules_exact_shutoff(self):
+        controller = self.controller()
+        self.time += timedelta(seconds=1)
+        controller.sensor.publish(70., 65.)
+        controller.tick()
+        temperature = controller.temperature
+        self.assertTrue(temperature.cooling_on)
+
+        deadline = from_seconds(
+            temperature.cooler_enabled_at + temperature.cool_for_s)
+        self.assertEqual(deadline, controller.scheduler.next_deadline())
+        controller.tick_s = 600.
+        self.assertEqual(deadline, controller.next_wakeup())
+
+        self.time = deadline - timedelta(microseconds=1)
+        self.assertEqual(0, controller.scheduler.run_due(self.time))
+        self.assertTrue(temperature.cooling_on)
+        self.time = deadline
+        self.assertEqual(1, controller.scheduler.run_due(self.time))
+        self.assertFalse(temperature.cooling_on)
+        self.assertIsNone(controller.scheduler.next_deadline())
+
+
+class SchedulerTests(TestBase):
+
+    def test_runs_in_deadline_order(self):
+        s = Scheduler()
+        ran = []
+        s.schedule(3, ran.append, 'c')
+        s.schedule(1, ran.append, 'a')
+        s.schedule(2, ran.append, 'b')
+        s.schedule(1, ran.append, 'a2')
+
+        self.assertEqual(1, s.next_deadline())
+        self.assertEqual(3, s.run_due(2))
+        self.assertEqual(['a', 'a2', 'b'], ran)
+        self.assertEqual(3, s.next_deadline())
+
+    def test_cancel(self):
+        s = Scheduler()
+        ran = []
+        timer = s.schedule(1, ran.append, 'a')
+        s.schedule(2, ran.append, 'b')
+        s.cancel(timer)
+
+        self.assertEqual(2, s.next_deadline())
+        self.assertEqual(1, len(s))
+        self.assertEqual(1, s.run_due(5))
+        self.assertEqual(['b'], ran)
+        self.assertIsNone(s.next_deadline())
+
+
+class SensorReaderTests(TestBase):
+
+    def setUp(self):
+        super(SensorReaderTests, self).setUp()
+        self.time = datetime(2000, 1, 1, 0, 0, 0)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(SensorReaderTests, self).tearDown()
+
+    def test_latest_and_stats(self):
+        results = [(None, None), (70., 65.), (None, None)]
+        reader = SensorReader(lambda: results.pop(0))
+        self.assertIsNone(reader.latest)
+        self.assertIsNone(reader.staleness_s())
+
+        self.assertFalse(reader.read_once())
+        self.assertTrue(reader.read_once())
+        self.assertEqual((70., 65., self.time), reader.latest)
+        self.assertTrue(reader.fresh.is_set())
+        self.assertFalse(reader.read_once())
+        self.assertEqual((70., 65., self.time), reader.latest)
+
+        self.time += timedelta(seconds=30)
+        stats = reader.stats()
+        self.assertEqual(3, stats['reads'])
+        self.assertEqual(2, stats['failures'])
+        self.assertEqual(30., stats['staleness_s'])
+
+    def test_backs_off_on_failure(self):
+        reader = SensorReader(lambda: (None, None), min_interval_s=2.,
+            max_backoff_s=10.)
+        backoff = []
+        for i in range(5):
+            reader.read_once()
+            backoff.append(reader.backoff_s())
+        self.assertEqual([2., 4., 8., 10., 10.], backoff)
+
+    def test_sensor_exception_is_a_failure(self):
+        def read():
+            raise IOError("sensor unplugged")
+        reader = SensorReader(read)
+        self.assertFalse(reader.read_once())
+        self.assertEqual(1, reader.failures)
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.datastore import load, save, index_filename
+from dht22_controller.compact import compact, maybe_compact, history_filename
+from tests.testbase import TestBase
+
+
+class DatastoreTests(TestBase):
+
+    def setUp(self):
+        super(DatastoreTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'lcool.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(DatastoreTests, self).tearDown()
+
+    def test_missing_file_uses_default(self):
+        self.assertEqual(45., load(self.filename, 45., 63.))
+
+    def test_latest_row_per_target(self):
+        save(self.filename, 65., 63., 62.5, 20.)
+        save(self.filename, 65., 59., 58.5, 30.)
+        save(self.filename, 65., 63., 62.9, 25.)
+
+        self.assertTrue(os.path.isfile(index_filename(self.filename)))
+        self.assertEqual(25., load(self.filename, 45., 63))
+        self.assertEqual(30., load(self.filename, 45., 59.))
+        self.assertEqual(45., load(self.filename, 45., 61.))
+
+    def test_catches_up_on_rows_written_elsewhere(self):
+        save(self.filename, 65., 63., 62.5, 20.)
+        with open(self.filename, 'a') as f:
+            f.write('2000-01-01T00:00:00,65.0,63.0,62.80,22.0\n')
+        self.assertEqual(22., load(self.filename, 45., 63.))
+
+    def test_rebuilds_after_file_shrinks(self):
+        save(self.filename, 65., 63., 62.5, 20.)
+        save(self.filename, 65., 63., 62.5, 21.)
+        with open(self.filename, 'w') as f:
+            f.write('2000-01-01T00:00:00,65.0,59.0,58.80,12.0\n')
+        self.assertEqual(45., load(self.filename, 45., 63.))
+        self.assertEqual(12., load(self.filename, 45., 59.))
+
+    def test_rebuilds_corrupt_index(self):
+        save(self.filename, 65., 63., 62.5, 20.)
+        with open(index_filename(self.filename), 'w') as f:
+            f.write('{not json')
+        self.assertEqual(20., load(self.filename, 45., 63.))
+
+    def test_compact_keeps_newest_rows_per_target(self):
+        for i in range(10):
+            save(self.filename, 65., 63., 62.5, 20. + i)
+            save(self.filename, 65., 59., 58.5, 40. + i)
+
+        self.assertEqual(16, compact(self.filename, keep=2))
+        with open(self.filename) as f:
+            self.assertEqual(
+                ['28.0', '48.0', '29.0', '49.0'],
+                [line.rstrip().split(',')[4] for line in f])
+        self.assertEqual(29., load(self.filename, 45., 63.))
+        self.assertEqual(49., load(self.filename, 45., 59.))
+
+        with open(history_filename(self.filename)) as f:
+            history = [line.rstrip().split(',') for line in f]
+        self.assertEqual(['59.0', '63.0'], [h[0] for h in history])
+        self.assertEqual(['8', '8'], [h[3] for h in history])
+        self.assertEqual('23.50', history[1][6])
+
+        # compacting again folds into the existing summary
+        save(self.filename, 65., 63., 62.5, 30.)
+        self.assertEqual(1, compact(self.filename, keep=2))
+        with open(history_filename(self.filename)) as f:
+            history = [line.rstrip().split(',') for line in f]
+        self.assertEqual('9', history[1][3])
+        self.assertEqual(30., load(self.filename, 45., 63.))
+
+    def test_interrupted_compaction_counts_rows_once(self):
+        for i in range(10):
+            save(self.filename, 65., 63., 62.5, 20. + i)
+
+        def history():
+            with open(history_filename(self.filename)) as f:
+                return [line.rstrip().split(',')[3] for line in f]
+
+        rename = os.rename
+        def crash_renaming(name):
+            def crash(src, dst):
+                if src == name + '.tmp':
+                    raise OSError(5, 'Input/output error')
+                rename(src, dst)
+            return crash
+
+        # crashed before the learn file was replaced: nothing happened yet
+        os.rename = crash_renaming(self.filename)
+        try:
+            with self.assertRaises(OSError):
+                compact(self.filename, keep=2)
+        finally:
+            os.rename = rename
+        self.assertFalse(os.path.exists(history_filename(self.filename)))
+        self.assertEqual(8, compact(self.filename, keep=2))
+        self.assertEqual(['8'], history())
+
+        # crashed after the learn file was replaced, before the history was:
+        # the history is swapped in later and the rows aren't folded twice
+        save(self.filename, 65., 63., 62.5, 30.)
+        os.rename = crash_renaming(history_filename(self.filename))
+        try:
+            with self.assertRaises(OSError):
+                compact(self.filename, keep=2)
+        finally:
+            os.rename = rename
+        self.assertEqual(['8'], history())
+        self.assertEqual(0, compact(self.filename, keep=2))
+        self.assertEqual(['9'], history())
+        self.assertEqual(30., load(self.filename, 45., 63.))
+
+    def test_maybe_compact_respects_threshold(self):
+        for i in range(5):
+            save(self.filename, 65., 63., 62.5, 20. + i)
+        size = os.path.getsize(self.filename)
+        self.assertEqual(0, maybe_compact(self.filename, size, keep=1))
+        self.assertEqual(4, maybe_compact(self.filename, size - 1, keep=1))
+
+    def test_maybe_compact_failure_is_not_raised(self):
+        for i in range(5):
+            save(self.filename, 65., 63., 62.5, 20. + i)
+        # keep=0 makes compact() raise
+        self.assertEqual(0, maybe_compact(self.filename, 1, keep=0))
+        self.assertEqual(24., load(self.filename, 45., 63.))
@@ -0,0 +1,121 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+import urllib2
+from dht22_controller.config import Config
+from dht22_controller.controller import Controller, InlineSink
+from dht22_controller.exporter import MetricsExporter, parse_address
+from dht22_controller.humidity import Humidity
+from dht22_controller.instrumentation import Instruments
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+c = Config()
+c.config['target_temp_f'] = 60
+c.config['temp_pad'] = 1
+
+
+def metric(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split(' ', 1)[1])
+    return None
+
+
+class ExporterTests(TestBase):
+
+    def setUp(self):
+        super(ExporterTests, self).setUp()
+        self.time = datetime(2000, 1, 1)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(ExporterTests, self).tearDown()
+
+    def controller(self, instruments=None):
+        controller = Controller(
+            Temperature(c, debug=True, has_cooler=True, cool_for_s=20.),
+            Humidity(c, debug=True),
+            lambda: (65., 70.),
+            instruments=instruments)
+        exporter = MetricsExporter(controller, '127.0.0.1:0', instruments)
+        controller.on_tick.append(InlineSink('metrics', exporter.update))
+        return controller, exporter
+
+    def test_parse_address(self):
+        self.assertEqual(('tcp', ('127.0.0.1', 9122)), parse_address('9122'))
+        self.assertEqual(('tcp', ('127.0.0.1', 9122)), parse_address(9122))
+        self.assertEqual(('tcp', ('0.0.0.0', 80)), parse_address('0.0.0.0:80'))
+        self.assertEqual(('unix', '/run/dht22.sock'),
+            parse_address('unix:/run/dht22.sock'))
+
+    def test_render(self):
+        instruments = Instruments()
+        controller, exporter = self.controller(instruments)
+        text = exporter.render()
+        # nothing read yet
+        self.assertIsNone(metric(text, 'dht22_temperature_f'))
+        self.assertEqual(20., metric(text, 'dht22_cool_for_seconds'))
+
+        self.time += timedelta(seconds=1)
+        controller.sensor.read_once()
+        controller.tick()
+        text = exporter.render()
+        self.assertEqual(70., metric(text, 'dht22_temperature_f'))
+        self.assertEqual(65., metric(text, 'dht22_humidity_average_percent'))
+        self.assertEqual(1., metric(text, 'dht22_cooling_on'))
+        self.assertEqual(0., metric(text, 'dht22_dehumidifier_on'))
+        self.assertEqual(1., metric(text, 'dht22_sensor_reads_total'))
+        self.assertEqual(0., metric(text, 'dht22_sensor_failures_total'))
+        self.assertEqual(1., metric(text,
+            'dht22_phase_seconds_count{phase="tick"}'))
+        self.assertIn('# TYPE dht22_phase_seconds summary', text)
+        self.assertIsNotNone(metric(text,
+            'dht22_phase_seconds{phase="update",quantile="0.99"}'))
+
+    def test_serves_over_tcp(self):
+        controller, exporter = self.controller()
+        exporter.start()
+        try:
+            port = exporter.server.server_address[1]
+            response = urllib2.urlopen(
+                'http://127.0.0.1:{}/metrics'.format(port), timeout=5)
+            self.assertTrue(
+                response.info()['Content-Type'].startswith('text/plain'))
+            self.assertEqual(20., metric(
+                response.read(), 'dht22_cool_for_seconds'))
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen,
+                'http://127.0.0.1:{}/'.format(port), timeout=5)
+        finally:
+            exporter.stop()
+
+    def test_serves_over_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'metrics.sock')
+        controller, exporter = self.controller()
+        exporter.address = 'unix:' + path
+        exporter.start()
+        try:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.settimeout(5)
+            client.connect(path)
+            client.sendall(b'GET /metrics HTTP/1.0\r\n\r\n')
+            response = b''
+            while True:
+                data = client.recv(4096)
+                if not data: break
+                response += data
+            client.close()
+            head, body = response.split(b'\r\n\r\n', 1)
+            self.assertIn(b'200', head.splitlines()[0])
+            self.assertEqual(20., metric(body, 'dht22_cool_for_seconds'))
+        finally:
+            exporter.stop()
+            self.assertFalse(os.path.exists(path))
+            shutil.rmtree(directory)
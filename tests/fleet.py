@@ -0,0 +1,129 @@
+import random
+import unittest
+from dht22_controller import fleet
+from dht22_controller.config import Config
+from dht22_controller.fleet import Fleet, HumidityFleet, TemperatureFleet, \
+    WindowArray
+from dht22_controller.capped_queue import CappedQueue
+from dht22_controller.humidity import Humidity
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+def config(target_temp_f, temp_pad, target_humidity, humidity_pad):
+    c = Config()
+    c.config['target_temp_f'] = target_temp_f
+    c.config['temp_pad'] = temp_pad
+    c.config['target_humidity'] = target_humidity
+    c.config['humidity_pad'] = humidity_pad
+    return c
+
+
+@unittest.skipIf(fleet.np is None, "numpy is not installed")
+class FleetTests(TestBase):
+
+    def setUp(self):
+        super(FleetTests, self).setUp()
+        self.time = datetime(2000, 1, 1)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(FleetTests, self).tearDown()
+
+    def test_window_matches_capped_queue(self):
+        rng = random.Random(1)
+        window = WindowArray(3, cap=4)
+        queues = [CappedQueue(cap=4) for i in range(3)]
+        for step in range(50):
+            values = [rng.uniform(50., 70.) for queue in queues]
+            mask = [rng.random() < .7 for queue in queues]
+            window.put(values, mask)
+            for queue, value, add in zip(queues, values, mask):
+                if add: queue.put(value)
+            for i, queue in enumerate(queues):
+                if len(queue):
+                    self.assertEqual(queue.average(), window.average()[i])
+
+    def test_decisions_match_scalar_classes(self):
+        rng = random.Random(2)
+        n = 12
+        configs = [config(rng.choice([55, 60, 65]), rng.choice([.5, 1, 2]),
+            rng.choice([60, 65, 70]), rng.choice([1, 2, 3])) for i in range(n)]
+        settings = [dict(
+            cool_for_s=rng.uniform(10., 60.),
+            heat_for_s=rng.uniform(10., 60.),
+            has_cooler=rng.random() < .8,
+            has_heater=rng.random() < .5,
+            recently_minutes=rng.choice([2., 5.]),
+            learn_multiplier=rng.choice([2., 3.])) for i in range(n)]
+        humidifiers = [dict(
+            has_humidifier=rng.random() < .5,
+            has_dehumidifier=rng.random() < .8,
+            recently_minutes=rng.choice([2., 5.])) for i in range(n)]
+
+        temperatures = [Temperature(c, debug=True, **kwargs)
+            for c, kwargs in zip(configs, settings)]
+        humidities = [Humidity(c, debug=True, **kwargs)
+            for c, kwargs in zip(configs, humidifiers)]
+        zones = Fleet(
+            TemperatureFleet(n, configs,
+                **dict((key, [s[key] for s in settings])
+                    for key in settings[0])),
+            HumidityFleet(n, configs,
+                **dict((key, [s[key] for s in humidifiers])
+                    for key in humidifiers[0])))
+
+        # a toy chamber per zone, drifting and driven by the actuators
+        t = [c.target_temp_f + rng.uniform(-4., 4.) for c in configs]
+        h = [c.target_humidity + rng.uniform(-6., 6.) for c in configs]
+        drift = [rng.uniform(-.01, .01) for i in range(n)]
+
+        switches = 0
+        for step in range(3000):
+            # sub-second steps too, so the times aren't whole seconds
+            dt = round(rng.choice([0., 1., 2., 2., 2., 5., 30.]) +
+                rng.uniform(0., 1.), 6)
+            self.time += timedelta(seconds=dt)
+            read = [rng.random() < .9 for i in range(n)]
+            for i in range(n):
+                temperature, humidity = temperatures[i], humidities[i]
+                t[i] += dt * (drift[i] - .03 * temperature.cooling_on +
+                    .03 * temperature.heating_on) + rng.gauss(0., .05)
+                h[i] += dt * (.01 - .03 * humidity.dehumidifier_on +
+                    .03 * humidity.humidifier_on) + rng.gauss(0., .1)
+                if read[i]:
+                    humidity.add(h[i])
+                    temperature.add(t[i])
+
+            zones.add(h, t, read)
+            for temperature, humidity in zip(temperatures, humidities):
+                if len(temperature.queue) and len(humidity.queue):
+                    humidity.update()
+                    temperature.update()
+            zones.tick()
+
+            before = switches
+            for i in range(n):
+                state = (temperatures[i].cooling_on,
+                    temperatures[i].heating_on,
+                    humidities[i].humidifier_on,
+                    humidities[i].dehumidifier_on,
+                    temperatures[i].cool_for_s,
+                    temperatures[i].heat_for_s)
+                vector = (zones.temperature.cooling_on[i],
+                    zones.temperature.heating_on[i],
+                    zones.humidity.humidifier_on[i],
+                    zones.humidity.dehumidifier_on[i],
+                    zones.temperature.cool_for_s[i],
+                    zones.temperature.heat_for_s[i])
+                self.assertEqual(state, vector,
+                    "zone {} diverged at step {}".format(i, step))
+                switches += sum(state[:4])
+
+        # the chambers actually exercised the rules
+        self.assertGreater(switches, 1000)
+        self.assertTrue(any(tf.cool_for_s != s['cool_for_s']
+            for tf, s in zip(temperatures, settings)))
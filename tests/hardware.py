@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.config import Config
+from dht22_controller.hardware import ReplaySensor, SimulatedRelay, \
+    SimulatedSensor, create_backends
+from dht22_controller.model import ChamberModel
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+class HardwareTests(TestBase):
+
+    def setUp(self):
+        super(HardwareTests, self).setUp()
+        self.time = datetime(2000, 1, 1, 0, 0, 0)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(HardwareTests, self).tearDown()
+
+    def test_model_relaxes_to_ambient(self):
+        model = ChamberModel(temp_f=40., ambient_f=70., leak_s=600.,
+            noise_f=0., noise_humidity=0.)
+        model.advance()
+        self.time += timedelta(hours=3)
+        h, t = model.read()
+        self.assertAlmostEqual(70., t, places=3)
+
+    def test_cooler_cools_and_lags(self):
+        model = ChamberModel(temp_f=70., ambient_f=70., noise_f=0.,
+            noise_humidity=0.)
+        sensor = SimulatedSensor(model)
+        relay = SimulatedRelay(model, 'cooling')
+        sensor()
+        relay.set(True)
+        self.time += timedelta(minutes=5)
+        h, cooled = sensor()
+        self.assertLess(cooled, 70.)
+        relay.set(False)
+        # keeps cooling for a bit after being switched off
+        self.time += timedelta(seconds=30)
+        h, after = sensor()
+        self.assertLess(after, cooled)
+
+    def test_large_steps_match_small_steps(self):
+        big = ChamberModel(noise_f=0., noise_humidity=0.)
+        small = ChamberModel(noise_f=0., noise_humidity=0.)
+        start = self.time
+        big.advance(start)
+        small.advance(start)
+        big.cooling = small.cooling = True
+        for i in range(1, 601):
+            small.advance(start + timedelta(seconds=i))
+        big.advance(start + timedelta(seconds=600))
+        self.assertAlmostEqual(small.temp_f, big.temp_f, places=6)
+
+    def test_replay_sensor(self):
+        d = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(d, 'data.csv')
+            with open(filename, 'w') as f:
+                f.write('2000-01-01T00:00:00,60.00,60.00,70.00,70.00\n')
+                f.write('2000-01-01T00:00:02,61.00,60.50,71.00,70.50\n')
+            sensor = ReplaySensor(filename)
+            self.assertEqual((70., 60.), sensor())
+            self.assertEqual((71., 61.), sensor())
+            self.assertEqual((None, None), sensor())
+
+            sensor = ReplaySensor(filename, loop=True)
+            sensor()
+            sensor()
+            self.assertEqual((70., 60.), sensor())
+        finally:
+            shutil.rmtree(d)
+
+    def test_create_simulated_backends(self):
+        c = Config()
+        c.config.update({
+            'sensor_backend': 'simulated',
+            'relay_backend': 'simulated',
+            'cool_pin': 17,
+            'simulation': {'temp_f': 50., 'noise_f': 0.}})
+        sensor, cool, dehumidify = create_backends(c)
+        self.assertIsNone(dehumidify)
+        self.assertEqual(50., sensor()[1])
+        cool.set(True)
+        self.assertTrue(cool.model.cooling)
+        self.assertIs(cool.model, sensor.model)
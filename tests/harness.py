@@ -0,0 +1,46 @@
+import unittest
+from benchmarks.harness import Benchmark, compare, measure
+from tests.testbase import TestBase
+
+
+def results(**per_op_s):
+    return {'results': dict(
+        (name, {'per_op_s': value, 'gc_net_objects_per_op': 0.,
+            'threshold': .25})
+        for name, value in per_op_s.items())}
+
+
+class HarnessTests(TestBase):
+
+    def test_measure(self):
+        calls = []
+
+        def run(state, n):
+            state.extend(range(n))
+
+        result = measure(Benchmark('append', run, setup=lambda: calls,
+            teardown=lambda state: calls.append('done'), number=100),
+            repeat=3)
+        self.assertEqual(100, result['ops'])
+        self.assertEqual(3, result['repeat'])
+        self.assertGreater(result['per_op_s'], 0.)
+        self.assertLessEqual(result['per_op_s'], result['median_s'])
+        # 3 timed runs, one to count allocations, then the teardown
+        self.assertEqual(400, len(calls) - 1)
+        self.assertEqual('done', calls[-1])
+
+    def test_compare(self):
+        baseline = results(fast=1e-6, slow=1e-3, gone=1.)
+        current = results(fast=1.2e-6, slow=1.3e-3, new=1.)
+        rows = compare(current, baseline)
+        regressed = dict(((name, metric), flag)
+            for name, metric, old, new, ratio, flag in rows)
+        self.assertEqual({
+            ('fast', 'per_op_s'): False,
+            ('fast', 'gc_net_objects_per_op'): False,
+            ('slow', 'per_op_s'): True,
+            ('slow', 'gc_net_objects_per_op'): False,
+        }, regressed)
+        # an explicit threshold overrides the benchmarks'
+        self.assertFalse(any(row[-1] for row in compare(
+            current, baseline, threshold=.5)))
@@ -10,9 +10,6 @@ c.config['target_humidity'] = 62
 c.config['humidity_pad'] = 2
 
 
-set_now(lambda: datetime(2000, 1, 1, 0, 0, 0))
-
-
 def humidity_gen(last, increase=False, amount=.01):
     n = last + (amount if increase else -amount)
     # increase the time by the same amount as the temp. this way it takes
@@ -24,6 +21,14 @@ def humidity_gen(last, increase=False, amount=.01):
 
 class HumidityTests(TestBase):
 
+    def setUp(self):
+        super(HumidityTests, self).setUp()
+        set_now(lambda: datetime(2000, 1, 1, 0, 0, 0))
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(HumidityTests, self).tearDown()
+
     def test_humidity_avg(self):
         h = Humidity(c, debug=True)
         for i in range(1, 11, 1):
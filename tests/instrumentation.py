@@ -0,0 +1,90 @@
+import unittest
+from dht22_controller.config import Config
+from dht22_controller.controller import Controller, Sink
+from dht22_controller.humidity import Humidity
+from dht22_controller.instrumentation import Instruments, RollingHistogram
+from dht22_controller.temperature import Temperature
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+c = Config()
+c.config['target_temp_f'] = 60
+c.config['temp_pad'] = 1
+
+
+class InstrumentationTests(TestBase):
+
+    def setUp(self):
+        super(InstrumentationTests, self).setUp()
+        self.time = datetime(2000, 1, 1)
+        set_now(lambda: self.time)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(InstrumentationTests, self).tearDown()
+
+    def test_histogram(self):
+        histogram = RollingHistogram(size=100)
+        self.assertIsNone(histogram.summary()['p50'])
+        for i in range(1, 101):
+            histogram.add(i / 1000.)
+        summary = histogram.summary()
+        self.assertEqual(.05, summary['p50'])
+        self.assertEqual(.095, summary['p95'])
+        self.assertEqual(.099, summary['p99'])
+        self.assertEqual(.1, summary['max'])
+
+        # only the window counts, apart from the totals
+        for i in range(100):
+            histogram.add(.001)
+        summary = histogram.summary()
+        self.assertEqual(.001, summary['p99'])
+        self.assertEqual(.001, summary['max'])
+        self.assertEqual(.1, summary['max_ever'])
+        self.assertEqual(200, summary['count'])
+
+    def test_dumps_periodically_and_on_request(self):
+        instruments = Instruments(dump_interval_s=60.)
+        instruments.record('tick', .001)
+        self.assertFalse(instruments.maybe_dump())
+        instruments.request_dump()
+        self.assertTrue(instruments.maybe_dump())
+        self.assertFalse(instruments.maybe_dump())
+        self.time += timedelta(seconds=60)
+        self.assertTrue(instruments.maybe_dump())
+
+    def test_controller_phases(self):
+        instruments = Instruments()
+        outputs = []
+        sink = Sink('gpio', outputs.append, instruments)
+        controller = Controller(
+            Temperature(c, debug=True, has_cooler=True, cool_for_s=20.),
+            Humidity(c, debug=True),
+            lambda: (65., 70.),
+            on_tick=[sink],
+            instruments=instruments)
+
+        self.time += timedelta(seconds=1)
+        controller.sensor.read_once()
+        controller.tick()
+        self.assertTrue(controller.temperature.cooling_on)
+        # the shutoff runs half a second late
+        self.time = controller.scheduler.next_deadline() + \
+            timedelta(seconds=.5)
+        controller.scheduler.run_due(self.time)
+        self.assertFalse(controller.temperature.cooling_on)
+
+        sink.start()
+        sink.stop()
+        sink.join(5.)
+        self.assertEqual(2, len(outputs))
+
+        summary = instruments.summary()
+        self.assertEqual(1, summary['sensor_read']['count'])
+        self.assertEqual(2, summary['tick']['count'])
+        self.assertEqual(2, summary['update']['count'])
+        self.assertEqual(.5, summary['shutoff_late']['max'])
+        self.assertEqual(2, summary['sink.gpio']['count'])
+        self.assertEqual(2, summary['lag.gpio']['count'])
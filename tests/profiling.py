@@ -0,0 +1,65 @@
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from dht22_controller.capped_queue import CappedQueue
+from dht22_controller.profiling import Profiler
+from tests.testbase import TestBase
+
+
+class ProfilingTests(TestBase):
+
+    def setUp(self):
+        super(ProfilingTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(ProfilingTests, self).tearDown()
+
+    def test_start_and_dump(self):
+        profiler = Profiler(os.path.join(self.dir, 'profiles'))
+        self.assertIsNone(profiler.dump())
+
+        profiler.request_start()
+        self.assertFalse(profiler.running)
+        profiler.poll()
+        self.assertTrue(profiler.running)
+
+        queues = [CappedQueue(cap=10) for i in range(100)]
+        for queue in queues:
+            for i in range(20):
+                queue.put(i)
+
+        profiler.request_dump()
+        profiler.poll()
+        self.assertFalse(profiler.running)
+
+        names = sorted(os.listdir(os.path.join(self.dir, 'profiles')))
+        self.assertEqual(3, len(names))
+        self.assertTrue(names[0].startswith('memory-'))
+        stats = os.path.join(self.dir, 'profiles',
+            [name for name in names if name.endswith('.pstats')][0])
+        functions = [function for filename, line, function in
+            pstats.Stats(stats).stats]
+        self.assertIn('put', functions)
+        with open(os.path.join(self.dir, 'profiles', names[0])) as report:
+            self.assertIn('CappedQueue', report.read())
+
+    def test_failed_dump_does_not_stop_the_loop(self):
+        blocker = os.path.join(self.dir, 'file')
+        open(blocker, 'w').close()
+        profiler = Profiler(os.path.join(blocker, 'profiles'))
+        profiler.request_start()
+        profiler.poll()
+        profiler.request_dump()
+        profiler.poll()
+        self.assertFalse(profiler.running)
+
+        # and it can be started and written again once the directory's fixed
+        profiler.request_start()
+        profiler.poll()
+        self.assertTrue(profiler.running)
+        profiler.directory = os.path.join(self.dir, 'profiles')
+        self.assertEqual(3, len(profiler.dump()))
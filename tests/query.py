@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.query import read_range, tail_rows
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+START = datetime(2000, 1, 1, 0, 0, 0)
+
+
+class QueryTests(TestBase):
+
+    def setUp(self):
+        super(QueryTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'data.csv')
+        with open(self.filename, 'w') as f:
+            # two readings every 10 seconds, with a gap in the middle
+            for i in range(0, 5000, 5):
+                if 2000 <= i < 3000: continue
+                f.write('{},{:.2f},60.00,70.00,70.00\n'.format(
+                    (START + timedelta(seconds=i * 2)).strftime(
+                        '%Y-%m-%dT%H:%M:%S'),
+                    i / 100.))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(QueryTests, self).tearDown()
+
+    def scan(self, start, end):
+        rows = []
+        with open(self.filename) as f:
+            for line in f:
+                ts = datetime.strptime(line[:19], '%Y-%m-%dT%H:%M:%S')
+                if (start is None or ts >= start) and (end is None or ts < end):
+                    rows.append(line)
+        return rows
+
+    def test_matches_full_scan(self):
+        bounds = [None, START - timedelta(days=1), START,
+            START + timedelta(seconds=3), START + timedelta(seconds=4000),
+            START + timedelta(seconds=4500), START + timedelta(seconds=9990),
+            START + timedelta(days=1)]
+        for start in bounds:
+            for end in bounds:
+                self.assertEqual(
+                    self.scan(start, end),
+                    list(read_range(self.filename, start, end, parse=False)),
+                    msg='start={} end={}'.format(start, end))
+
+    def test_parses_rows(self):
+        rows = list(read_range(
+            self.filename, START + timedelta(seconds=10),
+            START + timedelta(seconds=20)))
+        self.assertEqual(
+            [(START + timedelta(seconds=10), .05, 60., 70., 70.)], rows)
+
+    def test_tail_rows(self):
+        lines = self.scan(None, None)
+        for count in (0, 1, 7, 400, 10000):
+            for block_bytes in (1, 10, 4096):
+                self.assertEqual(
+                    lines[-count:] if count else [],
+                    tail_rows(self.filename, count, block_bytes, parse=False),
+                    msg='count={} block_bytes={}'.format(count, block_bytes))
+        self.assertEqual(
+            list(read_range(self.filename, START + timedelta(seconds=9980))),
+            tail_rows(self.filename, 2))
+
+        # a row torn by a crash mid-write is skipped
+        with open(self.filename, 'a') as f:
+            f.write('2000-01-01T02:46:40,1')
+        self.assertEqual(lines[-3:],
+            tail_rows(self.filename, 3, 16, parse=False))
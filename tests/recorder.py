@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.recorder import BufferedCsvWriter
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+class RecorderTests(TestBase):
+
+    def setUp(self):
+        super(RecorderTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'data.csv')
+        self.start = datetime(2000, 1, 1, 0, 0, 0)
+        set_now(lambda: self.start)
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        shutil.rmtree(self.dir)
+        super(RecorderTests, self).tearDown()
+
+    def lines(self):
+        if not os.path.isfile(self.filename):
+            return []
+        with open(self.filename) as f:
+            return f.read().splitlines()
+
+    def test_commits_on_row_count(self):
+        w = BufferedCsvWriter(self.filename, max_rows=3, max_interval_s=600.)
+        w.writerow(['a', '1'])
+        w.writerow(['b', '2'])
+        self.assertEqual([], self.lines())
+        w.writerow(['c', '3'])
+        self.assertEqual(['a,1', 'b,2', 'c,3'], self.lines())
+        w.close()
+
+    def test_commits_on_interval(self):
+        w = BufferedCsvWriter(self.filename, max_rows=100, max_interval_s=60.)
+        w.writerow(['a', '1'])
+        self.assertEqual([], self.lines())
+        set_now(lambda: self.start + timedelta(seconds=60))
+        w.writerow(['b', '2'])
+        self.assertEqual(['a,1', 'b,2'], self.lines())
+        w.close()
+
+    def test_close_flushes(self):
+        w = BufferedCsvWriter(self.filename, max_rows=100, max_interval_s=600.)
+        w.writerow(['a', '1'])
+        w.close()
+        self.assertEqual(['a,1'], self.lines())
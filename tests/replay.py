@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.config import Config
+from dht22_controller.query import read_chunks
+from dht22_controller.replay import Replay
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+START = datetime(2000, 1, 1)
+
+c = Config()
+c.config['target_temp_f'] = 60
+c.config['temp_pad'] = 1
+c.config['target_humidity'] = 65
+c.config['humidity_pad'] = 2
+
+
+class ReplayTests(TestBase):
+
+    def setUp(self):
+        super(ReplayTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'data.csv')
+        with open(self.filename, 'w') as f:
+            # a reading every 2 seconds for 6 hours, the temperature drifting
+            # up and down through the band every half hour
+            for i in range(0, 6 * 3600, 2):
+                phase = (i % 1800) / 1800.
+                t = 58. + 5. * (phase * 2 if phase < .5 else 2 - phase * 2)
+                f.write('{},{:.2f},{:.2f},{:.2f},{:.2f}\n'.format(
+                    (START + timedelta(seconds=i)).strftime(
+                        '%Y-%m-%dT%H:%M:%S'), t, t, 65., 65.))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(ReplayTests, self).tearDown()
+
+    def replay(self, **kwargs):
+        trace = []
+        replay = Replay(c, trace=lambda *args: trace.append(args), **kwargs)
+        return replay, trace
+
+    def test_read_chunks(self):
+        chunks = list(read_chunks(self.filename, chunk_bytes=4096))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(3 * 3600, sum(len(chunk) for chunk in chunks))
+
+        chunks = list(read_chunks(self.filename,
+            START + timedelta(hours=1), START + timedelta(hours=2),
+            chunk_bytes=4096))
+        rows = [row for chunk in chunks for row in chunk]
+        self.assertEqual(1800, len(rows))
+        self.assertEqual(START + timedelta(hours=1), rows[0][0])
+        self.assertEqual(START + timedelta(hours=2, seconds=-2), rows[-1][0])
+
+    def test_traces_decisions(self):
+        replay, trace = self.replay()
+        result = replay.run(self.filename)
+        self.assertEqual(3 * 3600, result['rows'])
+        self.assertAlmostEqual(6. / 24., result['span_days'], places=3)
+
+        cooling = [(at, on) for at, actuator, on, tavg, havg in trace
+            if actuator == 'cooling']
+        self.assertGreater(len(cooling), 4)
+        # only switches are traced, so on and off alternate
+        for (at, on), (next_at, next_on) in zip(cooling, cooling[1:]):
+            self.assertNotEqual(on, next_on)
+            self.assertLess(at, next_at)
+        for at, actuator, on, tavg, havg in trace:
+            if actuator == 'cooling' and on:
+                self.assertGreaterEqual(tavg, c.max_temp_f)
+        self.assertEqual(
+            sum(1 for at, on in cooling if on), result['cycles']['cooling'])
+        self.assertTrue(0. < result['duty']['cooling'] < 1.)
+        self.assertEqual(0, result['cycles']['heating'])
+
+    def test_chunking_and_resuming(self):
+        whole, whole_trace = self.replay()
+        whole.run(self.filename)
+
+        # tiny chunks, and stopping and continuing part way through, decide
+        # the same
+        parts, parts_trace = self.replay(chunk_bytes=512)
+        middle = START + timedelta(hours=2, minutes=7)
+        parts.run(self.filename, end=middle)
+        parts.run(self.filename, start=middle)
+        self.assertEqual(whole_trace, parts_trace)
+        self.assertEqual(whole.summary(), parts.summary())
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.rollup import Rollups, read_rollups
+from dht22_controller.timeseries import to_epoch
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+START = datetime(2000, 1, 1, 0, 0, 0)
+
+
+class RollupTests(TestBase):
+
+    def setUp(self):
+        super(RollupTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(RollupTests, self).tearDown()
+
+    def read(self, name):
+        return list(read_rollups(os.path.join(self.dir, name + '.roll')))
+
+    def test_buckets(self):
+        r = Rollups(self.dir)
+        # one reading every 10 seconds for 3 minutes
+        for i in range(18):
+            r.add(START + timedelta(seconds=i * 10), 60. + i, 70. - i)
+        r.close()
+
+        minutes = self.read('1min')
+        self.assertEqual(3, len(minutes))
+        first = minutes[0]
+        self.assertEqual(to_epoch(START), first.start)
+        self.assertEqual(6, first.count)
+        self.assertEqual(sum(60. + i for i in range(6)), first.t_sum)
+        self.assertEqual((60., 65.), (first.t_min, first.t_max))
+        self.assertEqual((65., 70.), (first.h_min, first.h_max))
+
+        days = self.read('1day')
+        self.assertEqual(1, len(days))
+        self.assertEqual(18, days[0].count)
+
+    def test_restart_within_bucket_merges(self):
+        r = Rollups(self.dir)
+        r.add(START, 60., 70.)
+        r.close()
+        r = Rollups(self.dir)
+        r.add(START + timedelta(seconds=30), 62., 72.)
+        r.close()
+
+        minutes = self.read('1min')
+        self.assertEqual(1, len(minutes))
+        self.assertEqual(2, minutes[0].count)
+        self.assertEqual((60., 62.), (minutes[0].t_min, minutes[0].t_max))
+
+    def test_partial_bucket_is_truncated(self):
+        r = Rollups(self.dir)
+        r.add(START, 60., 70.)
+        r.close()
+        # a crash part way through appending a bucket
+        with open(os.path.join(self.dir, '1min.roll'), 'ab') as f:
+            f.write(b'\x01\x02\x03')
+        r = Rollups(self.dir)
+        r.add(START + timedelta(minutes=1), 62., 72.)
+        r.close()
+
+        minutes = self.read('1min')
+        self.assertEqual([to_epoch(START), to_epoch(START) + 60],
+            [m.start for m in minutes])
+        self.assertEqual((62., 62.), (minutes[1].t_min, minutes[1].t_max))
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.config import Config
+from dht22_controller.model import ChamberModel
+from dht22_controller.simulator import Simulator, VirtualClock
+from dht22_controller.utils import _time, clock, now, sleep
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+c = Config()
+c.config['target_temp_f'] = 60
+c.config['temp_pad'] = 1
+c.config['target_humidity'] = 65
+c.config['humidity_pad'] = 2
+
+
+class SimulatorTests(TestBase):
+
+    def test_virtual_clock(self):
+        before = (_time.NOW, _time.CLOCK, _time.SLEEP)
+        clock = VirtualClock(datetime(2000, 1, 1))
+        clock.install()
+        try:
+            clock.sleep(90)
+            self.assertEqual(datetime(2000, 1, 1, 0, 1, 30), now())
+        finally:
+            clock.uninstall()
+        self.assertNotEqual(datetime(2000, 1, 1, 0, 1, 30), now())
+        # the hooks that were there before are put back
+        self.assertEqual(before, (_time.NOW, _time.CLOCK, _time.SLEEP))
+
+    def test_nested_virtual_clocks(self):
+        before = (_time.NOW, _time.CLOCK, _time.SLEEP)
+        outer = VirtualClock(datetime(2000, 1, 1))
+        inner = VirtualClock(datetime(2010, 1, 1))
+        outer.install()
+        try:
+            inner.install()
+            self.assertEqual(datetime(2010, 1, 1), now())
+            inner.uninstall()
+            # back on the outer clock, not the system one
+            self.assertEqual(datetime(2000, 1, 1), now())
+            self.assertEqual(946684800., clock())
+            sleep(5)
+            self.assertEqual(datetime(2000, 1, 1, 0, 0, 5), outer.time)
+
+            # installed again while already installed (Simulator.run() does
+            # this under the benchmarks' own install)
+            outer.install()
+            outer.uninstall()
+            self.assertEqual(datetime(2000, 1, 1, 0, 0, 5), now())
+        finally:
+            outer.uninstall()
+        self.assertEqual(before, (_time.NOW, _time.CLOCK, _time.SLEEP))
+
+    def test_holds_temperature_and_humidity(self):
+        model = ChamberModel(temp_f=66., ambient_f=68., humidity=70.,
+            ambient_humidity=75., seed=1)
+        temps = []
+        sim = Simulator(c, model=model,
+            on_tick=[lambda state: temps.append((now(), state.tavg))])
+        result = sim.run(.5)
+
+        self.assertEqual(.5, result['days'])
+        self.assertGreater(result['events'], 0)
+        # time on the virtual clock matches the simulated days
+        self.assertEqual(sim.clock.time, datetime(2000, 1, 1, 12))
+
+        # ignore the first couple of hours while it pulls down to target
+        settled = [tavg for at, tavg in temps
+            if at >= datetime(2000, 1, 1, 2)]
+        self.assertGreater(min(settled), c.min_temp_f - 1.5)
+        self.assertLess(max(settled), c.max_temp_f + 1.5)
+        self.assertLess(model.humidity, c.max_humidity + 1.5)
+
+    def test_leaves_the_data_dir_alone(self):
+        data_dir = tempfile.mkdtemp()
+        try:
+            conf = Config()
+            conf.config.update(c.config)
+            conf.config['data_dir'] = data_dir
+            # a learned heat time for the band's top, 61F
+            with open(os.path.join(data_dir, 'lheat.csv'), 'w') as f:
+                f.write('2000-01-01T00:00:00,58.0,61.0,61.00,120.0\n')
+            before = [(name, os.stat(os.path.join(data_dir, name)).st_mtime)
+                for name in sorted(os.listdir(data_dir))]
+
+            sim = Simulator(conf, model=ChamberModel(temp_f=66., seed=1))
+            sim.run(.1)
+
+            # nothing learned was loaded, and no index or learn rows written
+            self.assertEqual(20., sim.controller.temperature.heat_for_s)
+            self.assertEqual(before,
+                [(name, os.stat(os.path.join(data_dir, name)).st_mtime)
+                    for name in sorted(os.listdir(data_dir))])
+        finally:
+            shutil.rmtree(data_dir)
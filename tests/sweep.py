@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dht22_controller.sweep import grid, random_search, route_params, sweep, \
+    write_results
+from tests.testbase import TestBase
+
+
+config = {
+    'target_temp_f': 60,
+    'temp_pad': 1,
+    'target_humidity': 65,
+    'humidity_pad': 2,
+    'simulation': {'temp_f': 62., 'ambient_f': 68., 'humidity': 70.,
+        'ambient_humidity': 75.}
+}
+
+
+class SweepTests(TestBase):
+
+    def test_route_params(self):
+        routed = route_params({
+            'temp_pad': 1.5,
+            'learn_multiplier': 2.,
+            'humidity.recently_minutes': 3.,
+            'leak_s': 1800.})
+        self.assertEqual({'temp_pad': 1.5}, routed['config'])
+        self.assertEqual({'learn_multiplier': 2.}, routed['temperature'])
+        self.assertEqual({'recently_minutes': 3.}, routed['humidity'])
+        self.assertEqual({'leak_s': 1800.}, routed['model'])
+        self.assertRaises(ValueError, route_params, {'nope': 1})
+        for name in ('min_temp_f', 'config.max_humidity', 'load', 'snapshot',
+                'temperature.nope'):
+            self.assertRaises(ValueError, route_params, {name: 1})
+
+    def test_grid_and_random_search(self):
+        points = grid({'temp_pad': [1, 2], 'learn_multiplier': [2., 3., 4.]})
+        self.assertEqual(6, len(points))
+        self.assertIn({'temp_pad': 2, 'learn_multiplier': 3.}, points)
+
+        points = random_search(
+            {'temp_pad': (.5, 2.), 'learn_multiplier': [2., 3.]}, 20, seed=1)
+        self.assertEqual(20, len(points))
+        for point in points:
+            self.assertTrue(.5 <= point['temp_pad'] <= 2.)
+            self.assertIn(point['learn_multiplier'], [2., 3.])
+
+    def test_sweep(self):
+        points = [{'temp_pad': 1}, {'temp_pad': 2}, {'nope': 1}]
+        rows = sweep(points, config, days=.1, warmup_s=3600., processes=2)
+        self.assertEqual([0, 1, 2], [row['index'] for row in rows])
+        for row in rows[:2]:
+            self.assertNotIn('error', row)
+            self.assertTrue(0. <= row['in_band'] <= 1.)
+            self.assertTrue(0. < row['cool_duty'] < 1.)
+            self.assertGreater(row['cool_cycles_per_day'], 0)
+            self.assertAlmostEqual(.1 * 86400. - 3600., row['scored_s'],
+                delta=120.)
+        self.assertIn('error', rows[2])
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'sweep.csv')
+            write_results(filename, rows)
+            with open(filename) as csvfile:
+                header = csvfile.readline().strip().split(',')
+            self.assertEqual(['index', 'nope', 'temp_pad'], header[:3])
+            self.assertIn('in_band', header)
+        finally:
+            shutil.rmtree(directory)
@@ -13,9 +13,6 @@ c.config['target_temp_f'] = 60
 c.config['temp_pad'] = 1
 
 
-set_now(lambda: datetime(2000, 1, 1, 0, 0, 0))
-
-
 optimal_time_s = 15
 def temp_by_s(seconds):
     # exponential
@@ -35,6 +32,14 @@ def temp_gen(last, increase=False, amount=.01):
 
 class TemperatureTests(TestBase):
 
+    def setUp(self):
+        super(TemperatureTests, self).setUp()
+        set_now(lambda: datetime(2000, 1, 1, 0, 0, 0))
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        super(TemperatureTests, self).tearDown()
+
     def test_temp_avg(self):
         t = Temperature(c, debug=True)
         for i in range(1, 11, 1):
@@ -60,7 +65,7 @@ class TemperatureTests(TestBase):
             elif increasing and t.temperature_average_f() >= c.max_temp_f:
                 self.assertTrue(t.cooling_on)
                 increasing = False
-            elif not increasing and (now() - t.cooler_enabled_at) >= timedelta(seconds=t.cool_for_s):
+            elif not increasing and clock() >= t.cooler_enabled_at + t.cool_for_s:
                 self.assertFalse(t.cooling_on)
                 break
 
@@ -98,7 +103,7 @@ class TemperatureTests(TestBase):
             elif not increasing and t.temperature_average_f() <= c.min_temp_f:
                 self.assertTrue(t.heating_on)
                 increasing = True
-            elif increasing and (now() - t.heater_enabled_at) >= timedelta(seconds=t.heat_for_s):
+            elif increasing and clock() >= t.heater_enabled_at + t.heat_for_s:
                 self.assertFalse(t.heating_on)
                 break
 
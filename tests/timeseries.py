@@ -0,0 +1,101 @@
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+from dht22_controller import timeseries
+from dht22_controller.timeseries import SegmentWriter, segment_files, \
+    iter_segment, read_segment, export_csv
+from dht22_controller.utils import set_now
+from tests.testbase import TestBase
+from datetime import datetime, timedelta
+
+
+class TimeseriesTests(TestBase):
+
+    def setUp(self):
+        super(TimeseriesTests, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        set_now(lambda: datetime(2000, 1, 1, 0, 0, 0))
+
+    def tearDown(self):
+        set_now(datetime.utcnow)
+        shutil.rmtree(self.dir)
+        super(TimeseriesTests, self).tearDown()
+
+    def write(self, start, n, max_rows=60):
+        w = SegmentWriter(self.dir, max_rows=max_rows, max_interval_s=600.)
+        for i in range(n):
+            w.append(start + timedelta(seconds=i), 60. + i, 61., 70.5, 71.25)
+        w.close()
+
+    def test_round_trip(self):
+        start = datetime(2000, 1, 1, 12, 0, 0)
+        self.write(start, 5, max_rows=2)
+
+        files = segment_files(self.dir)
+        self.assertEqual(1, len(files))
+        rows = list(iter_segment(files[0]))
+        self.assertEqual(5, len(rows))
+        self.assertEqual(timeseries.to_epoch(start) + 4, rows[4][0])
+        self.assertEqual((64., 61., 70.5, 71.25), rows[4][1:])
+
+    def test_segment_per_day(self):
+        self.write(datetime(2000, 1, 1, 23, 59, 58), 4)
+        self.assertEqual(
+            ['20000101.dts', '20000102.dts'],
+            [os.path.basename(f) for f in segment_files(self.dir)])
+
+    def test_ignores_partial_record(self):
+        start = datetime(2000, 1, 1, 12, 0, 0)
+        self.write(start, 3)
+        filename = segment_files(self.dir)[0]
+        with open(filename, 'ab') as f:
+            f.write(b'\x00\x01\x02')
+        self.assertEqual(3, len(list(iter_segment(filename))))
+
+        # appending again truncates the partial record first
+        self.write(start + timedelta(seconds=3), 1)
+        self.assertEqual(4, len(list(iter_segment(filename))))
+
+    def test_repairs_header(self):
+        start = datetime(2000, 1, 1, 12, 0, 0)
+        filename = os.path.join(self.dir, '20000101.dts')
+
+        # torn by a crash
+        with open(filename, 'wb') as f:
+            f.write(timeseries.MAGIC[:3])
+        self.write(start, 2)
+        self.assertEqual(2, len(list(iter_segment(filename))))
+
+        # present but corrupt
+        with open(filename, 'r+b') as f:
+            f.write(b'NOTMAGIC')
+        self.write(start + timedelta(seconds=2), 1)
+        self.assertEqual(1, len(list(iter_segment(filename))))
+        self.assertTrue(os.path.exists(filename + '.corrupt'))
+        self.assertEqual([filename], segment_files(self.dir))
+
+        # again, without losing the first one moved aside
+        with open(filename, 'r+b') as f:
+            f.write(b'NOTMAGIC')
+        self.write(start + timedelta(seconds=3), 1)
+        self.assertEqual(1, len(list(iter_segment(filename))))
+        self.assertTrue(os.path.exists(filename + '.corrupt'))
+        self.assertTrue(os.path.exists(filename + '.corrupt.1'))
+        self.assertEqual([filename], segment_files(self.dir))
+
+    def test_export_csv(self):
+        self.write(datetime(2000, 1, 1, 12, 0, 0), 2)
+        out = StringIO.StringIO()
+        export_csv([self.dir], out)
+        self.assertEqual(
+            ['2000-01-01T12:00:00,60.00,61.00,70.50,71.25',
+             '2000-01-01T12:00:01,61.00,61.00,70.50,71.25'],
+            out.getvalue().splitlines())
+
+    @unittest.skipIf(timeseries.np is None, "numpy is not installed")
+    def test_read_segment(self):
+        self.write(datetime(2000, 1, 1, 12, 0, 0), 3)
+        data = read_segment(segment_files(self.dir)[0])
+        self.assertEqual([60., 61., 62.], data['t'].tolist())